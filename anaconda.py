@@ -878,6 +878,11 @@ if __name__ == "__main__":
     flags.selinux = opts.selinux
     flags.eject = opts.eject
     flags.kexec = opts.kexec
+    flags.prefetch = opts.prefetch
+    flags.pkgcache = opts.pkgcache
+    flags.blockdeploy = opts.blockdeploy
+    flags.initrdjobs = opts.initrdjobs
+    flags.chrootserver = opts.chrootserver
 
     # Switch to tty1 on exception in case something goes wrong during X start.
     # This way if, for example, metacity doesn't start, we switch back to a
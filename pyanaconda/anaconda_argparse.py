@@ -412,6 +412,16 @@ def getArgumentParser(version_string, boot_cmdline=None):
                     help=help_parser.help_text("armplatform"))
     ap.add_argument("--multilib", dest="multiLib", action="store_true", default=False,
                     help=help_parser.help_text("multilib"))
+    ap.add_argument("--prefetch", action="store_true", default=False,
+                    help=help_parser.help_text("prefetch"))
+    ap.add_argument("--pkgcache", dest="pkgcache", default=None, metavar="PKGCACHE_PATH",
+                    help=help_parser.help_text("pkgcache"))
+    ap.add_argument("--blockdeploy", action="store_true", default=False,
+                    help=help_parser.help_text("blockdeploy"))
+    ap.add_argument("--initrdjobs", type=int, default=0, metavar="JOBS",
+                    help=help_parser.help_text("initrdjobs"))
+    ap.add_argument("--chrootserver", action="store_true", default=False,
+                    help=help_parser.help_text("chrootserver"))
 
     ap.add_argument("-m", "--method", dest="method", default=None, metavar="METHOD",
                     help=help_parser.help_text("method"))
@@ -0,0 +1,203 @@
+# chrootserver.py
+# A helper process running commands in the target system.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""
+    Running commands in a chroot through a long-lived helper.
+
+    Every command anaconda runs in the target system is otherwise started
+    by forking the whole anaconda process and calling chroot in the child.
+    The helper is a small python process started once, by running this
+    file, that chroots into the target system and then runs the commands
+    it is sent over its stdin, writing their return codes and output back
+    to its stdout.
+
+    The helper says it is ready once it has chrooted. A message is a line
+    of JSON, followed by the number of bytes of data given in its "size"
+    field if it has one. A request has the argv, the environment and
+    whether stderr is kept apart. The output of the command is streamed
+    back as it comes, a message with the stream ("out" or "err") and the
+    size of every line or piece of a long line, and the last message has
+    the return code or the error starting the command.
+
+    Only the standard library may be used here, the helper can't import
+    anything from anaconda.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+
+# Longest piece of output sent at once, longer lines are split
+_OUTPUT_CHUNK_SIZE = 64 * 1024
+
+class ChrootServerError(Exception):
+    pass
+
+def _write_message(f, header, data=b""):
+    f.write(json.dumps(header).encode("utf-8") + b"\n")
+    f.write(data)
+    f.flush()
+
+def _read_message(f):
+    line = f.readline()
+    if not line:
+        raise ChrootServerError("the connection was closed")
+    return json.loads(line.decode("utf-8"))
+
+def _read_data(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ChrootServerError("the connection was closed")
+    return data
+
+def _send_output(pipe, stream, outfile, lock):
+    """ Send the output from pipe until it's closed. """
+    for data in iter(lambda: pipe.readline(_OUTPUT_CHUNK_SIZE), b""):
+        with lock:
+            _write_message(outfile, {"stream": stream, "size": len(data)}, data)
+    pipe.close()
+
+def serve(root, infile, outfile):
+    """ Chroot into root and run the commands requested on infile.
+
+        :param str root: the directory to chroot into
+        :param infile: binary file to read the requests from
+        :param outfile: binary file to write the replies to
+    """
+    # the chroot may not have a /dev/null
+    devnull = open(os.devnull, "rb")
+    os.chroot(root)
+    os.chdir("/")
+    _write_message(outfile, {"ready": True})
+
+    while True:
+        line = infile.readline()
+        if not line:
+            break
+        request = json.loads(line.decode("utf-8"))
+
+        stderr = subprocess.PIPE if request["filter_stderr"] else subprocess.STDOUT
+        try:
+            proc = subprocess.Popen(request["argv"], stdin=devnull,
+                                    stdout=subprocess.PIPE, stderr=stderr,
+                                    env=request["env"], close_fds=True, restore_signals=True)
+        except OSError as e:
+            _write_message(outfile, {"errno": e.errno, "strerror": e.strerror})
+            continue
+
+        # stdout and stderr are sent as they come, one message at a time
+        lock = threading.Lock()
+        err_sender = None
+        if request["filter_stderr"]:
+            err_sender = threading.Thread(target=_send_output,
+                                          args=(proc.stderr, "err", outfile, lock))
+            err_sender.daemon = True
+            err_sender.start()
+        _send_output(proc.stdout, "out", outfile, lock)
+        if err_sender:
+            err_sender.join()
+        _write_message(outfile, {"rc": proc.wait()})
+
+class ChrootClient(object):
+    """ The anaconda end of a running helper. """
+
+    def __init__(self, proc, root):
+        """
+            :param proc: the helper process started with stdin and stdout
+                         being pipes
+            :type proc: subprocess.Popen
+            :param str root: the directory the helper chrooted into
+        """
+        self.proc = proc
+        self.root = root
+
+    def wait_ready(self):
+        """ Wait for the helper to chroot.
+
+            :raises: ChrootServerError if it failed
+        """
+        try:
+            _read_message(self.proc.stdout)
+        except (IOError, ValueError) as e:
+            raise ChrootServerError("chroot server failed to start: %s" % e)
+
+    @property
+    def alive(self):
+        return self.proc.poll() is None
+
+    def run(self, argv, env, out_callback, err_callback=None):
+        """ Run a command in the chroot.
+
+            The callbacks are called with every line or piece of a long
+            line of the output as it comes. If one of them raises, the rest
+            of the output is thrown away and the exception is raised once
+            the command has finished.
+
+            :param argv: the command and its arguments
+            :param dict env: environment of the command
+            :param out_callback: function called with the stdout data
+            :param err_callback: function called with the stderr data,
+                                 stderr goes to out_callback if None
+            :returns: the return code of the command
+            :rtype: int
+            :raises: OSError if the command couldn't be started,
+                     ChrootServerError if the helper failed
+        """
+        callbacks = {"out": out_callback, "err": err_callback}
+        error = None
+        try:
+            _write_message(self.proc.stdin, {"argv": list(argv), "env": env,
+                                             "filter_stderr": err_callback is not None})
+            reply = _read_message(self.proc.stdout)
+            while "stream" in reply:
+                data = _read_data(self.proc.stdout, reply["size"])
+                if error is None:
+                    try:
+                        callbacks[reply["stream"]](data)
+                    except Exception as e:  # pylint: disable=broad-except
+                        # the helper is only usable again once the command is done
+                        error = e
+                reply = _read_message(self.proc.stdout)
+        except (IOError, ValueError, KeyError) as e:
+            raise ChrootServerError("chroot server failed: %s" % e)
+
+        if error is not None:
+            raise error
+        if "errno" in reply:
+            raise OSError(reply["errno"], reply["strerror"])
+        return reply["rc"]
+
+    def close(self):
+        """ Stop the helper. """
+        try:
+            self.proc.stdin.close()
+        except IOError:
+            pass
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc.stdout.close()
+
+if __name__ == "__main__":
+    serve(sys.argv[1], sys.stdin.buffer, sys.stdout.buffer)
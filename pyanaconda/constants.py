@@ -98,6 +98,8 @@ THREAD_EXCEPTION_HANDLING_TEST = "AnaExceptionHandlingTest"
 THREAD_LIVE_PROGRESS = "AnaLiveProgressThread"
 THREAD_SOFTWARE_WATCHER = "AnaSoftwareWatcher"
 THREAD_CHECK_SOFTWARE = "AnaCheckSoftwareThread"
+THREAD_PACKAGE_PREFETCH = "AnaPackagePrefetchThread"
+THREAD_FILE_COUNT_INDEX = "AnaFileCountIndexThread"
 THREAD_SOURCE_WATCHER = "AnaSourceWatcher"
 THREAD_INSTALL = "AnaInstallThread"
 THREAD_CONFIGURATION = "AnaConfigurationThread"
@@ -154,7 +156,7 @@ NOTICEABLE_FREEZE = 0.1
 PW_ASCII_CHARS = string.digits + string.ascii_letters + string.punctuation + " "
 
 # Recognizing a tarfile
-TAR_SUFFIX = (".tar", ".tbz", ".tgz", ".txz", ".tar.bz2", "tar.gz", "tar.xz")
+TAR_SUFFIX = (".tar", ".tbz", ".tgz", ".txz", ".tar.bz2", "tar.gz", "tar.xz", ".tar.zst")
 
 # screenshots
 SCREENSHOTS_DIRECTORY = "/tmp/anaconda-screenshots"
@@ -189,6 +191,7 @@ X_DISPLAY_NUMBER = 1
 PAYLOAD_STATUS_PROBING_STORAGE = N_("Probing storage...")
 PAYLOAD_STATUS_PACKAGE_MD = N_("Downloading package metadata...")
 PAYLOAD_STATUS_GROUP_MD = N_("Downloading group metadata...")
+PAYLOAD_STATUS_REPO_MD = N_("Downloading metadata (%(done)d of %(total)d repositories)...")
 
 # Window title text
 WINDOW_TITLE_TEXT = N_("Anaconda Installer")
@@ -71,6 +71,11 @@ class Flags(object):
         self.rescue_mode = False
         self.noefi = False
         self.kexec = False
+        self.prefetch = False
+        self.pkgcache = None
+        self.blockdeploy = False
+        self.initrdjobs = 0
+        self.chrootserver = False
         # nosave options
         self.nosave_input_ks = False
         self.nosave_output_ks = False
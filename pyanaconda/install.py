@@ -25,6 +25,10 @@ from blivet.osinstall import turnOnFilesystems
 from blivet.devices import BTRFSDevice
 from pyanaconda.bootloader import writeBootLoader
 from pyanaconda.progress import progress_report, progress_message, progress_step, progress_complete, progress_init
+from pyanaconda.progress import progress_model_init, progress_phase, progress_advance
+from pyanaconda.progressmodel import ProgressModel, hardware_id, load_calibration, record_calibration
+from pyanaconda.progressmodel import PROGRESS_CALIBRATION_RECORD
+from pyanaconda.progressmodel import UNIT_STEPS, UNIT_FORMATS, UNIT_FORMAT_BYTES, UNIT_KERNELS
 from pyanaconda.users import Users
 from pyanaconda import flags
 from pyanaconda import iutil
@@ -35,6 +39,11 @@ from pyanaconda.threads import threadMgr
 from pyanaconda.ui.lib.entropy import wait_for_entropy
 from pyanaconda.kickstart import runPostScripts, runPreInstallScripts
 from pyanaconda.kexec import setup_kexec
+from pyanaconda.taskgraph import Step, run_steps
+from pyanaconda.timeline import timeline, TIMELINE_FILE, SPAN_PAYLOAD, SPAN_STORAGE
+from pykickstart.constants import KS_SCRIPT_POST
+import os
+import shutil
 import logging
 log = logging.getLogger("anaconda")
 
@@ -51,7 +60,86 @@ def _writeKS(ksdata):
     with iutil.open_with_perm(path, "w", 0o600) as f:
         f.write(str(ksdata))
 
+def _writeRecords():
+    """ Write the timeline and save it and the progress calibration to the
+        installed system. The logs were copied there by a post script already.
+    """
+    timeline.write(TIMELINE_FILE)
+
+    if flags.flags.nosave_logs:
+        return
+    log_dir = iutil.getSysroot() + "/var/log/anaconda"
+    try:
+        iutil.mkdirChain(log_dir)
+        for path in (TIMELINE_FILE, PROGRESS_CALIBRATION_RECORD):
+            if os.path.exists(path):
+                dest = os.path.join(log_dir, os.path.basename(path))
+                shutil.copyfile(path, dest)
+                os.chmod(dest, 0o600)
+    except OSError as e:
+        log.warning("failed to save the installation records to %s: %s", log_dir, e)
+
+def _startProgressModel(phases):
+    """ Make the progress bar follow a model of the phases.
+
+        :param phases: names of the phases and dicts of the amounts of work
+                       they have to do, in the order they run
+        :returns: the model and the id of the hardware it is calibrated for
+    """
+    hwid = hardware_id()
+    model = ProgressModel(load_calibration(hwid))
+    for (name, units) in phases:
+        model.add_phase(name, **units)
+    progress_model_init(model)
+    return (model, hwid)
+
+def _finishProgressModel(model, hwid):
+    """ Stop the progress model and record how long its phases took. """
+    progress_model_init(None)
+    record_calibration(hwid, model.measured_factors())
+
+# Files of the installed system (and other resources) read and written by
+# the kickstart commands configuring it. Everything that enables or
+# disables units writes /etc/systemd, so those steps keep their order.
+CONFIGURATION_STEPS = (
+    ("authconfig", ("/usr/sbin/authconfig", "/lib/security", "/lib64/security"),
+                   ("/etc/pam.d", "/etc/nsswitch.conf", "/etc/sysconfig/authconfig",
+                    "/etc/sysconfig/network", "/etc/sssd", "/etc/krb5.conf",
+                    "/etc/openldap", "/etc/security", "/etc/systemd")),
+    ("selinux", (), ("/etc/selinux/config",)),
+    ("firstboot", ("/lib/systemd/system",), ("/etc/reconfigSys", "/etc/systemd")),
+    ("services", ("/lib/systemd/system",), ("/etc/systemd",)),
+    ("keyboard", (), ("/etc/vconsole.conf", "/etc/X11/xorg.conf.d", "localed")),
+    ("timezone", ("/usr/share/zoneinfo",), ("/etc/localtime", "/etc/adjtime", "/etc/chrony.conf")),
+    ("lang", (), ("/etc/locale.conf",)),
+    ("firewall", ("/usr/bin/firewall-offline-cmd",),
+                 ("/etc/firewalld", "/etc/sysconfig/system-config-firewall", "/etc/systemd")),
+    ("xconfig", ("/lib/systemd/system",), ("/etc/sysconfig/desktop", "/etc/systemd")),
+    ("skipx", ("/lib/systemd/system",), ("/etc/sysconfig/desktop", "/etc/systemd")),
+)
+
+def _configurationSteps(storage, ksdata, instClass):
+    """ Return the steps running the execute methods of the kickstart
+        commands configuring the installed system.
+    """
+    steps = []
+    for (name, reads, writes) in CONFIGURATION_STEPS:
+        command = getattr(ksdata, name)
+        func = lambda command=command: command.execute(storage, ksdata, instClass)
+        steps.append(Step(name, func, reads, writes))
+    return steps
+
 def doConfiguration(storage, payload, ksdata, instClass):
+    # With inst.chrootserver the commands run in the installed system go
+    # through long-lived chrooted helpers instead of forking anaconda
+    if flags.flags.chrootserver:
+        iutil.start_chroot_server()
+    try:
+        _doConfiguration(storage, payload, ksdata, instClass)
+    finally:
+        iutil.stop_chroot_server()
+
+def _doConfiguration(storage, payload, ksdata, instClass):
     willWriteNetwork = not flags.flags.imageInstall and not flags.flags.dirInstall
     willRunRealmd = ksdata.realm.discovered
 
@@ -70,37 +158,41 @@ def doConfiguration(storage, payload, ksdata, instClass):
 
     progress_init(step_count)
 
+    phases = [("configuration", {UNIT_STEPS: 2})]
+    if willWriteNetwork:
+        phases.append(("network", {UNIT_STEPS: 1}))
+    phases += [("users", {UNIT_STEPS: 1}),
+               ("addons", {UNIT_STEPS: 1}),
+               ("initramfs", {UNIT_KERNELS: len(payload.kernelVersionList)})]
+    if willRunRealmd:
+        phases.append(("realm-join", {UNIT_STEPS: 2}))
+    post_scripts = [script for script in ksdata.scripts if script.type == KS_SCRIPT_POST]
+    phases.append(("post-scripts", {UNIT_STEPS: 1 + len(post_scripts)}))
+    (model, hwid) = _startProgressModel(phases)
+
     # Now run the execute methods of ksdata that require an installed system
     # to be present first.
-    with progress_report(N_("Configuring installed system")):
-        ksdata.authconfig.execute(storage, ksdata, instClass)
-        ksdata.selinux.execute(storage, ksdata, instClass)
-        ksdata.firstboot.execute(storage, ksdata, instClass)
-        ksdata.services.execute(storage, ksdata, instClass)
-        ksdata.keyboard.execute(storage, ksdata, instClass)
-        ksdata.timezone.execute(storage, ksdata, instClass)
-        ksdata.lang.execute(storage, ksdata, instClass)
-        ksdata.firewall.execute(storage, ksdata, instClass)
-        ksdata.xconfig.execute(storage, ksdata, instClass)
-        ksdata.skipx.execute(storage, ksdata, instClass)
+    with progress_report(N_("Configuring installed system")), progress_phase("configuration"):
+        run_steps(_configurationSteps(storage, ksdata, instClass))
 
     if willWriteNetwork:
-        with progress_report(N_("Writing network configuration")):
+        with progress_report(N_("Writing network configuration")), progress_phase("network"):
             ksdata.network.execute(storage, ksdata, instClass)
 
     # Creating users and groups requires some pre-configuration.
-    with progress_report(N_("Creating users")):
+    with progress_report(N_("Creating users")), progress_phase("users"):
         u = Users()
         ksdata.rootpw.execute(storage, ksdata, instClass, u)
         ksdata.group.execute(storage, ksdata, instClass, u)
         ksdata.user.execute(storage, ksdata, instClass, u)
         ksdata.sshkey.execute(storage, ksdata, instClass, u)
 
-    with progress_report(N_("Configuring addons")):
+    with progress_report(N_("Configuring addons")), progress_phase("addons"):
         ksdata.addons.execute(storage, ksdata, instClass, u)
 
-    with progress_report(N_("Generating initramfs")):
-        payload.recreateInitrds()
+    with progress_report(N_("Generating initramfs")), progress_phase("initramfs"):
+        with timeline.span("recreateInitrds", SPAN_PAYLOAD):
+            payload.recreateInitrds()
 
     # Work around rhbz#1200539, grubby doesn't handle grub2 missing initrd with /boot on btrfs
     # So rerun writing the bootloader if this is live and /boot is on btrfs
@@ -110,12 +202,15 @@ def doConfiguration(storage, payload, ksdata, instClass):
         writeBootLoader(storage, payload, instClass, ksdata)
 
     if willRunRealmd:
-        with progress_report(N_("Joining realm: %s") % ksdata.realm.discovered):
+        with progress_report(N_("Joining realm: %s") % ksdata.realm.discovered), \
+             progress_phase("realm-join"):
             ksdata.realm.execute(storage, ksdata, instClass)
 
-    with progress_report(N_("Running post-installation scripts")):
+    with progress_report(N_("Running post-installation scripts")), progress_phase("post-scripts"):
         runPostScripts(ksdata.scripts)
 
+    _finishProgressModel(model, hwid)
+
     # setup kexec reboot if requested
     if flags.flags.kexec:
         setup_kexec()
@@ -130,6 +225,8 @@ def doConfiguration(storage, payload, ksdata, instClass):
     else:
         _writeKS(ksdata)
 
+    _writeRecords()
+
     progress_complete()
 
 def doInstall(storage, payload, ksdata, instClass):
@@ -148,8 +245,9 @@ def doInstall(storage, payload, ksdata, instClass):
 
     # We really only care about actions that affect filesystems, since
     # those are the ones that take the most time.
-    steps = len(storage.devicetree.findActions(action_type="create", object_type="format")) + \
-            len(storage.devicetree.findActions(action_type="resize", object_type="format"))
+    format_actions = storage.devicetree.findActions(action_type="create", object_type="format") + \
+                     storage.devicetree.findActions(action_type="resize", object_type="format")
+    steps = len(format_actions)
 
     # Update every 10% of packages installed.  We don't know how many packages
     # we are installing until it's too late (see realmd later on) so this is
@@ -178,18 +276,43 @@ def doInstall(storage, payload, ksdata, instClass):
     else:
         progress_init(steps)
 
-    with progress_report(N_("Setting up the installation environment")):
-        ksdata.firstboot.setup(storage, ksdata, instClass)
-        ksdata.addons.setup(storage, ksdata, instClass)
-
-    storage.updateKSData()  # this puts custom storage info into ksdata
-
-    # Do partitioning.
-    payload.preStorage()
-
-    # callbacks for blivet
-    message_clbk = lambda clbk_data: progress_message(clbk_data.msg)
-    step_clbk = lambda clbk_data: progress_step(clbk_data.msg)
+    # The bar follows a model of the phases weighted by the work they do
+    format_bytes = sum(int(action.device.size) for action in format_actions)
+    phases = [("setup", {UNIT_STEPS: 1}),
+              ("storage", {UNIT_FORMATS: len(format_actions), UNIT_FORMAT_BYTES: format_bytes}),
+              ("pre-scripts", {UNIT_STEPS: 1})]
+    if willRunRealmd:
+        phases.append(("realm-discovery", {UNIT_STEPS: 2}))
+    phases.append(("payload", payload.progressUnits()))
+    if willInstallBootloader:
+        phases.append(("bootloader", {UNIT_STEPS: 3}))
+    phases.append(("post-install", {UNIT_STEPS: 2}))
+    (model, hwid) = _startProgressModel(phases)
+
+    with progress_phase("setup"):
+        with progress_report(N_("Setting up the installation environment")):
+            ksdata.firstboot.setup(storage, ksdata, instClass)
+            ksdata.addons.setup(storage, ksdata, instClass)
+
+        storage.updateKSData()  # this puts custom storage info into ksdata
+
+        # Do partitioning.
+        with timeline.span("preStorage", SPAN_PAYLOAD):
+            payload.preStorage()
+
+    # callbacks for blivet, the format actions are run one by one
+    format_spans = []
+    formats_done = [0]
+    def message_clbk(clbk_data):
+        progress_message(clbk_data.msg)
+        format_spans.append(timeline.start(clbk_data.msg, SPAN_STORAGE))
+    def step_clbk(clbk_data):
+        if format_spans:
+            format_spans.pop().finish()
+        formats_done[0] += 1
+        progress_advance(**{UNIT_FORMATS: formats_done[0],
+                            UNIT_FORMAT_BYTES: format_bytes * formats_done[0] // max(1, len(format_actions))})
+        progress_step(clbk_data.msg)
     entropy_wait_clbk = lambda clbk_data: wait_for_entropy(clbk_data.msg,
                                                            clbk_data.min_entropy, ksdata)
     callbacks_reg = callbacks.create_new_callbacks_register(create_format_pre=message_clbk,
@@ -198,11 +321,14 @@ def doInstall(storage, payload, ksdata, instClass):
                                                             resize_format_post=step_clbk,
                                                             wait_for_entropy=entropy_wait_clbk)
 
-    turnOnFilesystems(storage, mountOnly=flags.flags.dirInstall, callbacks=callbacks_reg)
-    payload.writeStorageEarly()
+    with progress_phase("storage"):
+        with timeline.span("turnOnFilesystems", SPAN_STORAGE):
+            turnOnFilesystems(storage, mountOnly=flags.flags.dirInstall, callbacks=callbacks_reg)
+        with timeline.span("writeStorageEarly", SPAN_PAYLOAD):
+            payload.writeStorageEarly()
 
     # Run %pre-install scripts with the filesystem mounted and no packages
-    with progress_report(N_("Running pre-installation scripts")):
+    with progress_report(N_("Running pre-installation scripts")), progress_phase("pre-scripts"):
         runPreInstallScripts(ksdata.scripts)
 
     # Do packaging.
@@ -210,7 +336,7 @@ def doInstall(storage, payload, ksdata, instClass):
     # Discover information about realms to join,
     # to determine additional packages
     if willRunRealmd:
-        with progress_report(N_("Discovering realm to join")):
+        with progress_report(N_("Discovering realm to join")), progress_phase("realm-discovery"):
             ksdata.realm.setup()
 
     # Check for additional packages
@@ -238,17 +364,25 @@ def doInstall(storage, payload, ksdata, instClass):
     # explicitly excluded ones (user takes the responsibility)
     packages = [p for p in packages
                 if p not in instClass.ignoredPackages and p not in ksdata.packages.excludedList]
-    payload.preInstall(packages=packages, groups=payload.languageGroups())
-    payload.install()
+    with progress_phase("payload"):
+        with timeline.span("preInstall", SPAN_PAYLOAD):
+            payload.preInstall(packages=packages, groups=payload.languageGroups())
+        with timeline.span("install", SPAN_PAYLOAD):
+            payload.install()
 
-    payload.writeStorageLate()
+        with timeline.span("writeStorageLate", SPAN_PAYLOAD):
+            payload.writeStorageLate()
 
     # Do bootloader.
     if willInstallBootloader:
-        with progress_report(N_("Installing boot loader")):
+        with progress_report(N_("Installing boot loader")), progress_phase("bootloader"):
             writeBootLoader(storage, payload, instClass, ksdata)
 
-    with progress_report(N_("Performing post-installation setup tasks")):
-        payload.postInstall()
+    with progress_report(N_("Performing post-installation setup tasks")), \
+         progress_phase("post-install"):
+        with timeline.span("postInstall", SPAN_PAYLOAD):
+            payload.postInstall()
+
+    _finishProgressModel(model, hwid)
 
     progress_complete()
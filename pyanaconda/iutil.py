@@ -20,6 +20,9 @@
 # Author(s): Erik Troan <ewt@redhat.com>
 #
 
+import codecs
+from collections import deque
+import errno
 import glob
 import os
 import stat
@@ -33,8 +36,11 @@ import tempfile
 import re
 from urllib.parse import quote, unquote
 import gettext
+import select
 import signal
 import sys
+import threading
+import time
 
 import requests
 from requests_file import FileAdapter
@@ -49,6 +55,8 @@ from pyanaconda.flags import flags
 from pyanaconda.constants import DRACUT_SHUTDOWN_EJECT, TRANSLATIONS_UPDATE_DIR, UNSUPPORTED_HW
 from pyanaconda.constants import SCREENSHOTS_DIRECTORY, SCREENSHOTS_TARGET_DIRECTORY
 from pyanaconda.regexes import URL_PARSE
+from pyanaconda.timeline import timeline, SPAN_PROGRAM
+from pyanaconda.chrootserver import ChrootClient, ChrootServerError
 
 from pyanaconda.i18n import _
 
@@ -123,6 +131,20 @@ def setSysroot(path):
     global _sysroot
     _sysroot = path
 
+def _child_environment(env_prune=None, reset_lang=True, env_add=None):
+    """ Return the environment of a child process. """
+    env = augmentEnv()
+    for var in env_prune or []:
+        env.pop(var, None)
+
+    if reset_lang:
+        env.update({"LC_ALL": "C"})
+
+    if env_add:
+        env.update(env_add)
+
+    return env
+
 def startProgram(argv, root='/', stdin=None, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
         env_prune=None, env_add=None, reset_handlers=True, reset_lang=True, **kwargs):
     """ Start an external program and return the Popen object.
@@ -182,15 +204,7 @@ def startProgram(argv, root='/', stdin=None, stdout=subprocess.PIPE, stderr=subp
     with program_log_lock:
         program_log.info("Running... %s", " ".join(argv))
 
-    env = augmentEnv()
-    for var in env_prune:
-        env.pop(var, None)
-
-    if reset_lang:
-        env.update({"LC_ALL": "C"})
-
-    if env_add:
-        env.update(env_add)
+    env = _child_environment(env_prune, reset_lang, env_add)
 
     return subprocess.Popen(argv,
                             stdin=stdin,
@@ -252,10 +266,105 @@ def startX(argv, output_redirect=None):
         signal.signal(signal.SIGUSR1, old_sigusr1_handler)
         signal.signal(signal.SIGALRM, old_sigalrm_handler)
 
+# Longest piece of program output read at once, longer lines are split
+_OUTPUT_CHUNK_SIZE = 64 * 1024
+
+class _ProgramOutput(object):
+    """ Output of an external program, logged and kept as it comes.
+
+        The lines are logged as they arrive and only what the caller asked
+        for is kept, so that long outputs don't have to be held in memory.
+    """
+
+    def __init__(self, log_output=True, limit=None, stdout=None, binary_output=False):
+        """
+            :param bool log_output: whether to log the output
+            :param limit: bytes of the end of the output to keep, None to
+                          keep all of it, 0 to keep nothing
+            :param stdout: optional file object to write the output to
+            :param bool binary_output: whether the output is binary data
+        """
+        self._log_output = log_output
+        self._limit = limit
+        self._stdout = stdout
+        self._binary = binary_output
+        self._chunks = deque()
+        self._size = 0
+        self._last = b""
+        self._log_decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._stdout_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.truncated = False
+        self.error = None
+
+    def _log(self, text):
+        with program_log_lock:
+            for line in text.splitlines():
+                program_log.info(line.strip())
+
+    def _write(self, data, final=False):
+        if not self._stdout or self.error:
+            return
+        if self._binary:
+            self._stdout.write(data)
+            return
+        try:
+            text = self._stdout_decoder.decode(data, final)
+        except UnicodeDecodeError as e:
+            # raised once the program has finished
+            self.error = e
+            return
+        self._stdout.write(text)
+
+    def feed(self, data):
+        """ Process a line or a piece of a long line of the output. """
+        if self._log_output:
+            self._log(self._log_decoder.decode(data))
+        self._write(data)
+
+        self._last = data[-1:]
+        if self._limit == 0:
+            return
+        self._chunks.append(data)
+        self._size += len(data)
+        if self._limit is not None:
+            while self._size > self._limit and len(self._chunks) > 1:
+                self._size -= len(self._chunks.popleft())
+                self.truncated = True
+
+    def close(self):
+        """ Log the rest of the output once the program has finished. """
+        if self._log_output:
+            self._log(self._log_decoder.decode(b"", True))
+        self._write(b"", True)
+        if self._stdout and not self._binary and self._last not in (b"", b"\n"):
+            self._stdout.write("\n")
+
+    @property
+    def output(self):
+        """ The output kept, decoded unless it is binary. """
+        data = b"".join(self._chunks)
+        if self._binary:
+            return data
+
+        # the kept end of the output may start in the middle of a character
+        output_string = data.decode("utf-8", "replace" if self.truncated else "strict")
+        if output_string and output_string[-1] != "\n":
+            output_string = output_string + "\n"
+        return output_string
+
+def _read_output(pipe, output):
+    """ Feed the output from pipe until it's closed. """
+    for data in iter(lambda: pipe.readline(_OUTPUT_CHUNK_SIZE), b""):
+        output.feed(data)
+    pipe.close()
+
 def _run_program(argv, root='/', stdin=None, stdout=None, env_prune=None, log_output=True,
-        binary_output=False, filter_stderr=False):
+        binary_output=False, filter_stderr=False, output_limit=None):
     """ Run an external program, log the output and return it to the caller
 
+        The output is logged while the program runs and only as much of it
+        as output_limit says is kept for the caller.
+
         NOTE/WARNING: UnicodeDecodeError will be raised if the output of the of the
                       external command can't be decoded as UTF-8.
 
@@ -267,59 +376,160 @@ def _run_program(argv, root='/', stdin=None, stdout=None, env_prune=None, log_ou
         :param log_output: whether to log the output of command
         :param binary_output: whether to treat the output of command as binary data
         :param filter_stderr: whether to exclude the contents of stderr from the returned output
+        :param output_limit: bytes of the end of the output to return, None
+                             for all of it and 0 for none
         :return: The return code of the command and the output
     """
+    span = timeline.start(os.path.basename(argv[0]), SPAN_PROGRAM, argv=" ".join(argv), root=root)
+    start_time = time.time()
+    start = time.monotonic()
+    output = _ProgramOutput(log_output, output_limit, stdout, binary_output)
+    err_output = _ProgramOutput(log_output, 0)
     try:
         if filter_stderr:
             stderr = subprocess.PIPE
         else:
             stderr = subprocess.STDOUT
 
-        proc = startProgram(argv, root=root, stdin=stdin, stdout=subprocess.PIPE, stderr=stderr,
-                env_prune=env_prune)
-
-        (output_string, err_string) = proc.communicate()
-        if not binary_output:
-            output_string = output_string.decode("utf-8")
-            if output_string and output_string[-1] != "\n":
-                output_string = output_string + "\n"
-
-        if log_output:
-            with program_log_lock:
-                if binary_output:
-                    # try to decode as utf-8 and replace all undecodable data by
-                    # "safe" printable representations when logging binary output
-                    decoded_output_lines = output_string.decode("utf-8", "replace")
-                else:
-                    # output_string should already be a Unicode string
-                    decoded_output_lines = output_string.splitlines(True)
-
-                for line in decoded_output_lines:
-                    program_log.info(line.strip())
-
-        if stdout:
-            stdout.write(output_string)
-
-        # If stderr was filtered, log it separately
-        if filter_stderr and err_string and log_output:
-            # try to decode as utf-8 and replace all undecodable data by
-            # "safe" printable representations when logging binary output
-            decoded_err_string = err_string.decode("utf-8", "replace")
-            err_lines = decoded_err_string.splitlines(True)
-
-            with program_log_lock:
-                for line in err_lines:
-                    program_log.info(line.strip())
+        server = _acquire_chroot_server(root) if stdin is None else None
+        if server:
+            returncode = _run_in_chroot_server(server, argv, env_prune, output,
+                                               err_output if filter_stderr else None)
+        else:
+            proc = startProgram(argv, root=root, stdin=stdin, stdout=subprocess.PIPE, stderr=stderr,
+                    env_prune=env_prune)
+
+            # If stderr is filtered, it is read and logged separately
+            err_reader = None
+            if filter_stderr:
+                err_reader = threading.Thread(name="AnaProgramStderr", target=_read_output,
+                                              args=(proc.stderr, err_output))
+                err_reader.daemon = True
+                err_reader.start()
+
+            try:
+                _read_output(proc.stdout, output)
+            finally:
+                # a program still writing gets EPIPE if the output failed
+                proc.stdout.close()
+                returncode = proc.wait()
+                if err_reader:
+                    err_reader.join()
+
+        output.close()
+        err_output.close()
+        if output.error:
+            raise output.error
+        output_string = output.output
 
     except OSError as e:
+        span.finish(error=e.strerror)
         with program_log_lock:
             program_log.error("Error running %s: %s", argv[0], e.strerror)
         raise
 
+    span.finish(rc=returncode)
     with program_log_lock:
-        program_log.debug("Return code: %d", proc.returncode)
+        program_log.debug("Return code: %d (%s started at %s.%03d, took %.3f s)", returncode,
+                          os.path.basename(argv[0]),
+                          time.strftime("%H:%M:%S", time.localtime(start_time)),
+                          int(start_time * 1000) % 1000, time.monotonic() - start)
 
-    return (proc.returncode, output_string)
+    return (returncode, output_string)
+
+# Helpers running commands in the target system, see chrootserver.py. The
+# idle ones wait in the list, every thread running a command takes one.
+_CHROOT_SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chrootserver.py")
+_chroot_servers = []
+_chroot_servers_lock = threading.Lock()
+_chroot_server_root = None
+
+def start_chroot_server(root=None):
+    """ Run the commands in root through chroot server helpers.
+
+        Commands run with stdin are started the usual way. The helpers run
+        until stop_chroot_server is called.
+
+        :param str root: the chroot, the system root if None
+    """
+    global _chroot_server_root
+    with _chroot_servers_lock:
+        _chroot_server_root = root or getSysroot()
+
+def stop_chroot_server():
+    """ Stop the chroot server helpers. """
+    global _chroot_server_root
+    with _chroot_servers_lock:
+        _chroot_server_root = None
+        servers = list(_chroot_servers)
+        del _chroot_servers[:]
+
+    for server in servers:
+        server.close()
+
+def _acquire_chroot_server(root):
+    """ Return a helper running commands in root, or None. """
+    if root == _root_path:
+        root = getSysroot()
+
+    with _chroot_servers_lock:
+        if root == '/' or root != _chroot_server_root:
+            return None
+        while _chroot_servers:
+            server = _chroot_servers.pop()
+            if server.alive:
+                return server
+            server.close()
+
+    try:
+        proc = startProgram([sys.executable, "-I", _CHROOT_SERVER_SCRIPT, root],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        log.error("failed to start the chroot server: %s", e)
+        return None
+
+    server = ChrootClient(proc, root)
+    try:
+        server.wait_ready()
+    except ChrootServerError as e:
+        log.error("%s", e)
+        server.close()
+        return None
+    return server
+
+def _release_chroot_server(server):
+    with _chroot_servers_lock:
+        if server.root == _chroot_server_root and server.alive:
+            _chroot_servers.append(server)
+            return
+    server.close()
+
+def _run_in_chroot_server(server, argv, env_prune, output, err_output=None):
+    """ Run a command through a chroot server helper.
+
+        :param output: _ProgramOutput fed with the output as it comes
+        :param err_output: _ProgramOutput fed with stderr, None to feed it
+                           to output
+        :returns: the return code of the command
+        :raises: OSError if the command couldn't be started or the helper
+                 failed while running it
+    """
+    with program_log_lock:
+        program_log.info("Running... %s", " ".join(argv))
+
+    try:
+        returncode = server.run(argv, _child_environment(env_prune), output.feed,
+                                err_output.feed if err_output else None)
+    except ChrootServerError as e:
+        # the command may have run already, so it isn't run again
+        server.close()
+        raise OSError(errno.EIO, str(e))
+    except Exception:
+        _release_chroot_server(server)
+        raise
+
+    _release_chroot_server(server)
+    return returncode
 
 def execInSysroot(command, argv, stdin=None):
     """ Run an external program in the target root.
@@ -352,7 +562,7 @@ def execWithRedirect(command, argv, stdin=None, stdout=None,
 
     argv = [command] + argv
     return _run_program(argv, stdin=stdin, stdout=stdout, root=root, env_prune=env_prune,
-            log_output=log_output, binary_output=binary_output)[0]
+            log_output=log_output, binary_output=binary_output, output_limit=0)[0]
 
 def execWithCapture(command, argv, stdin=None, root='/', log_output=True, filter_stderr=False):
     """ Run an external program and capture standard out and err.
@@ -1179,6 +1389,87 @@ def get_mount_paths(devnode):
     mountinfo = (line.split() for line in open("/proc/self/mountinfo"))
     return [info[4] for info in mountinfo if info[2] == majmin]
 
+def _unescape_mountinfo(field):
+    """Decode the octal escapes (e.g. \\040 for a space) used in mountinfo."""
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), field)
+
+class MountTable(object):
+    """The list of mounted filesystems, read from /proc/self/mountinfo.
+
+       The list is only parsed again after the kernel reports a change in
+       the mount table, so asking for the free space of all filesystems
+       costs a few statvfs calls instead of running df.
+    """
+
+    def __init__(self, mountinfo="/proc/self/mountinfo"):
+        self._mountinfo = mountinfo
+        self._lock = threading.Lock()
+        self._file = None
+        self._poll = None
+        self._mountpoints = None
+
+    def _changed(self):
+        """Return True if the mount table changed since it was last read."""
+        if self._file is None:
+            return True
+
+        # mountinfo signals POLLPRI|POLLERR until it is read again after a change
+        return bool(self._poll.poll(0))
+
+    def _read(self):
+        if self._file is None:
+            self._file = open(self._mountinfo, "r")
+            self._poll = select.poll()
+            self._poll.register(self._file, select.POLLPRI | select.POLLERR)
+
+        self._file.seek(0)
+        mountpoints = []
+        for line in self._file.read().splitlines():
+            fields = line.split()
+            if len(fields) < 5:
+                continue
+            mountpoint = _unescape_mountinfo(fields[4])
+            if mountpoint in mountpoints:
+                # a later mount over the same path hides the earlier one
+                mountpoints.remove(mountpoint)
+            mountpoints.append(mountpoint)
+        self._mountpoints = mountpoints
+
+    @property
+    def mountpoints(self):
+        """List of the current mountpoints, in mount order."""
+        with self._lock:
+            if self._changed():
+                self._read()
+            return list(self._mountpoints)
+
+    def free_space(self):
+        """Return (mountpoint -> bytes available) of the mounted filesystems.
+
+           Like df, pseudo filesystems without any blocks are left out.
+        """
+        result = {}
+        for mountpoint in self.mountpoints:
+            try:
+                stat = os.statvfs(mountpoint)
+            except OSError:
+                continue
+            if stat.f_blocks == 0:
+                continue
+            result[mountpoint] = stat.f_frsize * stat.f_bavail
+        return result
+
+_mount_table = MountTable()
+
+def mount_free_space():
+    """Return (mountpoint -> bytes available) of the mounted filesystems."""
+    return _mount_table.free_space()
+
+def path_free_space(path):
+    """Return the number of bytes available to unprivileged users at path."""
+    stat = os.statvfs(path)
+    return stat.f_frsize * stat.f_bavail
+
 def have_word_match(str1, str2):
     """Tells if all words from str1 exist in str2 or not."""
 
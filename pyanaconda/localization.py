@@ -145,6 +145,50 @@ def langcode_matches_locale(langcode, locale):
 
     return True
 
+def langcode_key(langcode):
+    """
+    Function that returns a hashable key of the given langcode, for indexing
+    things by their langcodes. See langcode_match_keys.
+
+    :param langcode: a langcode (e.g. en, en_US, en_US@latin, etc.)
+    :type langcode: str
+    :return: the (language, territory, script, encoding) tuple with missing
+             parts set to None or None if the langcode is not valid
+    :rtype: tuple or None
+
+    """
+
+    parts = parse_langcode(langcode)
+    if not parts:
+        return None
+
+    return tuple(parts[part] or None for part in ("language", "territory", "script", "encoding"))
+
+def langcode_match_keys(locale):
+    """
+    Function that returns the keys (see langcode_key) of all the langcodes
+    matching the given locale, i.e. langcode_key(langcode) is in the result
+    if and only if langcode_matches_locale(langcode, locale).
+
+    :param locale: a valid locale (e.g. en_US.UTF-8 or sr_RS.UTF-8@latin, etc.)
+    :type locale: str
+    :return: keys of the langcodes matching the locale
+    :rtype: set of tuples
+
+    """
+
+    locale_key = langcode_key(locale)
+    if not locale_key:
+        return set()
+
+    # the language always has to match, every other part either matches
+    # or is missing in the langcode
+    (language, territory, script, encoding) = locale_key
+    return {(language, t, s, e)
+            for t in {None, territory}
+            for s in {None, script}
+            for e in {None, encoding}}
+
 def find_best_locale_match(locale, langcodes):
     """
     Find the best match for the locale in a list of langcodes. This is useful
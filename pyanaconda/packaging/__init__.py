@@ -36,6 +36,8 @@ from fnmatch import fnmatch
 import threading
 import re
 import functools
+import time
+import concurrent.futures
 
 from blivet.size import Size
 from pyanaconda.iutil import requests_session
@@ -57,6 +59,9 @@ from pyanaconda.image import findFirstIsoImage
 from pyanaconda.image import mountImage
 from pyanaconda.image import opticalInstallMedia, verifyMedia
 from pyanaconda.iutil import ProxyString, ProxyStringError
+from pyanaconda.packaging.treeinfo import TreeInfoCache
+from pyanaconda.progress import progress_advance
+from pyanaconda.progressmodel import UNIT_STEPS, UNIT_KERNELS
 from pyanaconda.threads import threadMgr, AnacondaThread
 from pyanaconda.regexes import VERSION_DIGITS
 
@@ -78,12 +83,57 @@ from distutils.version import LooseVersion
 
 REPO_NOT_SET = False
 
+# What a payload may have to wait for before it can be set up
+PAYLOAD_REQUIRES_STORAGE = "storage"
+PAYLOAD_REQUIRES_NETWORK = "network"
+
 def versionCmp(v1, v2):
     """ Compare two version number strings. """
     firstVersion = LooseVersion(v1)
     secondVersion = LooseVersion(v2)
     return (firstVersion > secondVersion) - (firstVersion < secondVersion)
 
+def runKernelJobs(kernels, job, description, max_jobs=None):
+    """ Run a job for each kernel, several of them at once.
+
+        Every finished job advances the kernels of the current progress phase.
+
+        :param list kernels: kernel versions
+        :param job: function called with a kernel version, returning the
+                    return code of the command it ran
+        :param str description: what the job does, for the logs
+        :param int max_jobs: maximal number of jobs running at once, the
+                             number of CPUs if None or 0
+        :returns: kernel versions the job failed for
+        :rtype: list of str
+    """
+    def _timed_job(kernel):
+        log.info("%s for %s", description, kernel)
+        start = time.monotonic()
+        try:
+            rc = job(kernel)
+        except (OSError, RuntimeError) as e:
+            log.error("%s for %s failed: %s", description, kernel, e)
+            rc = None
+        log.info("%s for %s took %.1f s", description, kernel, time.monotonic() - start)
+        return rc
+
+    if not kernels:
+        return []
+
+    results = {}
+    max_jobs = min(max_jobs or os.cpu_count() or 1, len(kernels))
+    with concurrent.futures.ThreadPoolExecutor(max_jobs) as executor:
+        futures = dict((executor.submit(_timed_job, kernel), kernel) for kernel in kernels)
+        for future in concurrent.futures.as_completed(futures):
+            results[futures[future]] = future.result()
+            progress_advance(**{UNIT_KERNELS: len(results)})
+
+    failed = [kernel for kernel in kernels if results[kernel] != 0]
+    if failed:
+        log.error("%s failed for: %s", description, ", ".join(failed))
+    return failed
+
 ###
 ### ERROR HANDLING
 ###
@@ -144,6 +194,9 @@ class Payload(object):
         self.verbose_errors = []
 
         self._session = requests_session()
+        self._treeinfo = TreeInfoCache(self._session)
+        # contents of the last treeinfo written to /tmp/.treeinfo
+        self._treeinfo_written = None
 
     def setup(self, storage, instClass):
         """ Do any payload-specific setup. """
@@ -156,6 +209,14 @@ class Payload(object):
         self.storage = None
         self.instclass = None
 
+    @property
+    def startupRequirements(self):
+        """ What has to be ready before the payload can be set up.
+
+            :returns: a set of PAYLOAD_REQUIRES_* constants
+        """
+        return {PAYLOAD_REQUIRES_STORAGE, PAYLOAD_REQUIRES_NETWORK}
+
     def preStorage(self):
         """ Do any payload-specific work necessary before writing the storage
             configuration.  This method need not be provided by all payloads.
@@ -236,10 +297,8 @@ class Payload(object):
 
     def _repoNeedsNetwork(self, repo):
         """ Returns True if the ksdata repo requires networking. """
-        urls = [repo.baseurl]
-        if repo.mirrorlist:
-            urls.extend(repo.mirrorlist)
-        network_protocols = ["http:", "ftp:", "nfs:", "nfsiso:"]
+        urls = [url for url in (repo.baseurl, repo.mirrorlist) if url]
+        network_protocols = ["http:", "https:", "ftp:", "nfs:", "nfsiso:"]
         for url in urls:
             if any(url.startswith(p) for p in network_protocols):
                 return True
@@ -343,11 +402,22 @@ class Payload(object):
         """ An iterable of the kernel versions installed by the payload. """
         raise NotImplementedError()
 
+    def progressUnits(self):
+        """ Return the amounts of work the install method has to do.
+
+            :returns: amounts by the UNIT_* units of progressmodel.py
+            :rtype: dict
+        """
+        return {UNIT_STEPS: 10}
+
     ##
     ## METHODS FOR TREE VERIFICATION
     ##
     def _getTreeInfo(self, url, proxy_url, sslverify):
-        """ Retrieve treeinfo and return the path to the local file.
+        """ Retrieve and parse the treeinfo of a tree.
+
+            The treeinfo is downloaded only once per URL, later calls get
+            the cached copy (revalidated with the server once in a while).
 
             :param baseurl: url of the repo
             :type baseurl: string
@@ -355,8 +425,8 @@ class Payload(object):
             :type proxy_url: string
             :param sslverify: True if SSL certificate should be verified
             :type sslverify: bool
-            :returns: Path to retrieved .treeinfo file or None
-            :rtype: string or None
+            :returns: the parsed treeinfo or None
+            :rtype: configparser.ConfigParser or None
         """
         if not url:
             return None
@@ -374,27 +444,24 @@ class Payload(object):
                 log.info("Failed to parse proxy for _getTreeInfo %s: %s",
                          proxy_url, e)
 
-        response = None
         headers = {"user-agent": USER_AGENT}
         try:
-            response = self._session.get("%s/.treeinfo" % url, headers=headers, proxies=proxies, verify=sslverify)
+            treeinfo = self._treeinfo.get(url, headers=headers, proxies=proxies, verify=sslverify)
         except requests.exceptions.RequestException as e:
-            try:
-                response = self._session.get("%s/treeinfo" % url, headers=headers, proxies=proxies, verify=sslverify)
-            except requests.exceptions.RequestException as e:
-                log.info("Error downloading treeinfo: %s", e)
-                self.verbose_errors.append(str(e))
-                response = None
+            log.info("Error downloading treeinfo: %s", e)
+            self.verbose_errors.append(str(e))
+            return None
+        except configparser.Error as e:
+            log.info("Error parsing treeinfo: %s", e)
+            return None
 
-        if response:
+        if treeinfo.text != self._treeinfo_written:
             # write the local treeinfo file
             with open("/tmp/.treeinfo", "w") as f:
-                f.write(response.text)
+                f.write(treeinfo.text)
+            self._treeinfo_written = treeinfo.text
 
-            # and also return the treeinfo contents as a string
-            return response.text
-        else:
-            return None
+        return treeinfo.config
 
     def _getReleaseVersion(self, url):
         """ Return the release version of the tree at the specified URL. """
@@ -411,11 +478,9 @@ class Payload(object):
             proxy = None
         treeinfo = self._getTreeInfo(url, proxy, not flags.noverifyssl)
         if treeinfo:
-            c = configparser.ConfigParser()
-            c.read(treeinfo)
             try:
                 # Trim off any -Alpha or -Beta
-                version = re.match(VERSION_DIGITS, c.get("general", "version")).group(1)
+                version = re.match(VERSION_DIGITS, treeinfo.get("general", "version")).group(1)
             except AttributeError:
                 version = "rawhide"
             except configparser.Error:
@@ -552,19 +617,40 @@ class Payload(object):
             log.error("new-kernel-pkg does not exist - grubby wasn't installed?  skipping")
             return
 
-        for kernel in self.kernelVersionList:
-            log.info("recreating initrd for %s", kernel)
-            if not flags.imageInstall:
-                iutil.execInSysroot("new-kernel-pkg",
-                                    ["--mkinitrd", "--dracut",
-                                    "--depmod", "--update", kernel])
-            else:
-                # hostonly is not sensible for disk image installations
-                # using /dev/disk/by-uuid/ is necessary due to disk image naming
-                iutil.execInSysroot("dracut",
-                                    ["-N",
-                                     "--persistent-policy", "by-uuid",
-                                     "-f", "/boot/initramfs-%s.img" % kernel,
+        kernels = self.kernelVersionList
+        if not flags.imageInstall:
+            # dracut can run for several kernels at once, updating the boot
+            # loader configuration can't
+            failed = runKernelJobs(kernels, self._makeInitrd, "recreating initrd", flags.initrdjobs)
+            # like new-kernel-pkg, don't touch the boot entries of kernels
+            # without a new initrd; --dracut makes it look for the initramfs
+            # image dracut wrote
+            for kernel in kernels:
+                if kernel not in failed:
+                    iutil.execInSysroot("new-kernel-pkg", ["--dracut", "--update", kernel])
+        else:
+            runKernelJobs(kernels, self._makeImageInitrd, "recreating initrd", flags.initrdjobs)
+
+    @staticmethod
+    def _makeInitrd(kernel):
+        """ Do what new-kernel-pkg --mkinitrd --dracut --depmod does. """
+        args = ["-a"]
+        system_map = "/boot/System.map-%s" % kernel
+        if os.path.exists(iutil.getSysroot() + system_map):
+            args += ["-e", "-F", system_map]
+        rc = iutil.execInSysroot("depmod", args + [kernel])
+        if rc == 0:
+            rc = iutil.execInSysroot("dracut", ["-f", "/boot/initramfs-%s.img" % kernel, kernel])
+        return rc
+
+    @staticmethod
+    def _makeImageInitrd(kernel):
+        # hostonly is not sensible for disk image installations
+        # using /dev/disk/by-uuid/ is necessary due to disk image naming
+        return iutil.execInSysroot("dracut",
+                                   ["-N",
+                                    "--persistent-policy", "by-uuid",
+                                    "-f", "/boot/initramfs-%s.img" % kernel,
                                     kernel])
 
     def _setDefaultBootTarget(self):
@@ -705,6 +791,29 @@ class PackagePayload(Payload):
         # environment.
         self._environmentAddons = {}
 
+    @property
+    def startupRequirements(self):
+        """ Only sources looked for on local devices need the storage, only
+            remote sources need the network.
+        """
+        method = self.data.method
+        if method.method == "url":
+            requirements = set()
+            if any(url and not url.startswith("file:") for url in (method.url, method.mirrorlist)):
+                requirements.add(PAYLOAD_REQUIRES_NETWORK)
+        elif method.method == "nfs":
+            requirements = {PAYLOAD_REQUIRES_NETWORK}
+        elif method.method in ("harddrive", "cdrom"):
+            requirements = {PAYLOAD_REQUIRES_STORAGE}
+        else:
+            # installation media are looked for on the devices, the default
+            # repos are used if there are none
+            return {PAYLOAD_REQUIRES_STORAGE, PAYLOAD_REQUIRES_NETWORK}
+
+        if self.needsNetwork:
+            requirements.add(PAYLOAD_REQUIRES_NETWORK)
+        return requirements
+
     def preInstall(self, packages=None, groups=None):
         super(PackagePayload, self).preInstall()
 
@@ -1187,6 +1296,17 @@ class PayloadManager(object):
     # Error
     STATE_ERROR = -1
 
+    # The states waiting for what a payload may require, in the order they
+    # are reached, and the threads providing it
+    REQUIREMENT_STATES = ((STATE_STORAGE, PAYLOAD_REQUIRES_STORAGE, THREAD_STORAGE),
+                          (STATE_NETWORK, PAYLOAD_REQUIRES_NETWORK, THREAD_WAIT_FOR_CONNECTING_NM))
+
+    # Per-repository metadata states, reported while in STATE_GROUP_MD
+    REPO_STATE_QUEUED = "queued"
+    REPO_STATE_LOADING = "loading"
+    REPO_STATE_LOADED = "loaded"
+    REPO_STATE_FAILED = "failed"
+
     # Error strings
     ERROR_SETUP = N_("Failed to set up installation source")
     ERROR_MD = N_("Error downloading package metadata")
@@ -1202,10 +1322,56 @@ class PayloadManager(object):
         for event_id in range(self.STATE_ERROR, self.STATE_FINISHED + 1):
             self._event_listeners[event_id] = []
 
+        # Repo metadata listeners and the last state reported for each repo
+        self._repo_listeners = []
+        self._repo_states = {}
+
     @property
     def error(self):
         return _(self._error)
 
+    @property
+    def repoStates(self):
+        """A dictionary of repo id -> (REPO_STATE_*, error string or None)."""
+        with self._event_lock:
+            return dict(self._repo_states)
+
+    def addRepoListener(self, func):
+        """Add a listener for per-repository metadata events.
+
+           The listener is called as func(repo_id, state, error) every time
+           the payload reports a new state for a repo. States already reported
+           for the current payload thread are replayed immediately.
+
+           :param function func: An object to call when a repo changes state
+        """
+        with self._event_lock:
+            self._repo_listeners.append(func)
+            states = list(self._repo_states.items())
+
+        # Listeners are run outside of the lock so that they can query
+        # repoStates themselves
+        for (repo_id, (state, error)) in states:
+            func(repo_id, state, error)
+
+    def setRepoState(self, repo_id, state, error=None):
+        """Report the metadata state of a single repository.
+
+           This may be called from any thread, the payload uses it to report
+           progress of the repositories it is loading in parallel.
+
+           :param str repo_id: The id of the repository
+           :param str state: One of the REPO_STATE_* constants
+           :param str error: Error description for REPO_STATE_FAILED
+        """
+        log.debug("Updating repo %s state: %s", repo_id, state)
+        with self._event_lock:
+            self._repo_states[repo_id] = (state, error)
+            listeners = list(self._repo_listeners)
+
+        for func in listeners:
+            func(repo_id, state, error)
+
     def addListener(self, event_id, func):
         """Add a listener for an event.
 
@@ -1281,17 +1447,19 @@ class PayloadManager(object):
         # This is the thread entry
         # Set the initial state
         self._error = None
+        with self._event_lock:
+            self._repo_states = {}
         self._setState(self.STATE_START)
 
-        # Wait for storage
-        self._setState(self.STATE_STORAGE)
-        threadMgr.wait(THREAD_STORAGE)
-
-        # Wait for network
-        self._setState(self.STATE_NETWORK)
-        # FIXME: condition for cases where we don't want network
-        # (set and use payload.needsNetwork ?)
-        threadMgr.wait(THREAD_WAIT_FOR_CONNECTING_NM)
+        # Only wait for what the payload needs, so that e.g. the metadata of
+        # a remote source is downloaded while the disks are still scanned
+        requirements = payload.startupRequirements
+        for (state, requirement, thread_name) in self.REQUIREMENT_STATES:
+            self._setState(state)
+            if requirement in requirements:
+                threadMgr.wait(thread_name)
+            else:
+                log.debug("payload does not need %s, not waiting for %s", requirement, thread_name)
 
         self._setState(self.STATE_PACKAGE_MD)
         payload.setup(storage, instClass)
@@ -0,0 +1,209 @@
+# blockimage.py
+# Deployment of filesystem images to block devices.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""
+    Writing a filesystem image to a block device.
+
+    The image is written sequentially in large blocks. Holes in the image
+    file and blocks of zeros are not written, the corresponding ranges of
+    the device are zeroed with BLKZEROOUT instead, which the kernel turns
+    into discards or WRITE SAME where the device supports them. Once
+    written, the filesystem is grown to the size of the device and given
+    the UUID the storage configuration expects.
+"""
+
+import errno
+import fcntl
+import os
+import stat
+import struct
+import tempfile
+
+import blivet.util
+
+from pyanaconda import iutil
+
+import logging
+log = logging.getLogger("packaging")
+
+# Size of the blocks the image is read and written in
+IMAGE_BLOCK_SIZE = 4 * 1024 * 1024
+# ioctl number of BLKZEROOUT from linux/fs.h
+BLKZEROOUT = 0x127f
+
+# Filesystems that can be deployed as images and grown afterwards
+BLOCK_IMAGE_FSTYPES = ("ext2", "ext3", "ext4", "xfs")
+
+class BlockImageError(Exception):
+    pass
+
+def blkid_value(path, tag):
+    """ Return the value of a blkid tag (TYPE, UUID, ...) of path, or None. """
+    try:
+        value = iutil.execWithCapture("blkid", ["-p", "-o", "value", "-s", tag, path]).strip()
+    except (OSError, RuntimeError) as e:
+        log.error("blkid failed on %s: %s", path, e)
+        return None
+    return value or None
+
+def _data_extents(fd, size):
+    """ Yield (start, end) of the ranges of the file that may hold data. """
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                # only a hole is left
+                return
+            if e.errno == errno.EINVAL:
+                # the filesystem doesn't know about holes
+                yield (offset, size)
+                return
+            raise
+        end = min(os.lseek(fd, start, os.SEEK_HOLE), size)
+        yield (start, end)
+        offset = end
+
+class BlockImageWriter(object):
+    """ Writes an image file to a block device (or a file). """
+
+    def __init__(self, image, device, callback=None):
+        """
+            :param str image: path of the image file
+            :param str device: path of the device to write the image to
+            :param callback: function called with the number of bytes done
+                             so far after every block
+        """
+        self.image = image
+        self.device = device
+        self.callback = callback
+        self.size = os.stat(image).st_size
+        self.bytes_done = 0
+        self.bytes_written = 0
+
+    def _zero(self, fd, start, end, is_blockdev):
+        if start >= end:
+            return
+        if is_blockdev:
+            fcntl.ioctl(fd, BLKZEROOUT, struct.pack("QQ", start, end - start))
+        # a regular file was truncated when opened, so holes read as zeros
+
+    def _progress(self, offset):
+        self.bytes_done = offset
+        if self.callback:
+            self.callback(offset)
+
+    def write(self):
+        """ Write the image.
+
+            :raises: OSError if reading or writing fails
+        """
+        is_blockdev = stat.S_ISBLK(os.stat(self.device).st_mode)
+        flags = os.O_WRONLY
+        if not is_blockdev:
+            flags |= os.O_CREAT | os.O_TRUNC
+
+        zeros = bytes(IMAGE_BLOCK_SIZE)
+        src = os.open(self.image, os.O_RDONLY)
+        try:
+            dst = os.open(self.device, flags, 0o600)
+            try:
+                # start of the range that has to be zeroed on the device
+                zero_start = 0
+                for (start, end) in _data_extents(src, self.size):
+                    offset = start
+                    while offset < end:
+                        buf = os.pread(src, min(IMAGE_BLOCK_SIZE, end - offset), offset)
+                        if not buf:
+                            raise BlockImageError("%s ended at %d bytes" % (self.image, offset))
+
+                        if buf != zeros[:len(buf)]:
+                            self._zero(dst, zero_start, offset, is_blockdev)
+                            written = 0
+                            while written < len(buf):
+                                written += os.pwrite(dst, buf[written:], offset + written)
+                            self.bytes_written += len(buf)
+                            zero_start = offset + len(buf)
+
+                        offset += len(buf)
+                        self._progress(offset)
+
+                self._zero(dst, zero_start, self.size, is_blockdev)
+                if not is_blockdev:
+                    os.ftruncate(dst, self.size)
+                os.fsync(dst)
+            finally:
+                os.close(dst)
+        finally:
+            os.close(src)
+
+        self._progress(self.size)
+        log.info("wrote %d of %d bytes of %s to %s", self.bytes_written, self.size,
+                 self.image, self.device)
+
+def _run(cmd, args, ok_codes=(0,)):
+    try:
+        rc = iutil.execWithRedirect(cmd, args)
+    except (OSError, RuntimeError) as e:
+        raise BlockImageError("%s failed: %s" % (cmd, e))
+    if rc not in ok_codes:
+        raise BlockImageError("%s exited with code %d" % (cmd, rc))
+
+def grow_filesystem(fstype, device):
+    """ Grow the filesystem on device to the size of the device. """
+    if fstype.startswith("ext"):
+        # resize2fs refuses to work on a filesystem that wasn't checked,
+        # e2fsck returns 1 when it fixed something
+        _run("e2fsck", ["-f", "-p", device], ok_codes=(0, 1))
+        _run("resize2fs", [device])
+    elif fstype == "xfs":
+        mountpoint = tempfile.mkdtemp(prefix="anaconda-xfs-")
+        try:
+            try:
+                rc = blivet.util.mount(device, mountpoint, fstype="xfs")
+            except OSError as e:
+                raise BlockImageError("failed to mount %s: %s" % (device, e))
+            if rc != 0:
+                raise BlockImageError("failed to mount %s" % device)
+            try:
+                _run("xfs_growfs", [mountpoint])
+            finally:
+                try:
+                    blivet.util.umount(mountpoint)
+                except OSError as e:
+                    raise BlockImageError("failed to unmount %s: %s" % (device, e))
+        finally:
+            os.rmdir(mountpoint)
+    else:
+        raise BlockImageError("growing %s is not supported" % fstype)
+
+def set_filesystem_uuid(fstype, device, uuid, label=None):
+    """ Give the filesystem on device a new UUID and, optionally, label. """
+    if fstype.startswith("ext"):
+        _run("tune2fs", ["-U", uuid, device])
+        if label is not None:
+            _run("e2label", [device, label])
+    elif fstype == "xfs":
+        _run("xfs_admin", ["-U", uuid, device])
+        if label is not None:
+            _run("xfs_admin", ["-L", label, device])
+    else:
+        raise BlockImageError("setting the UUID of %s is not supported" % fstype)
@@ -0,0 +1,134 @@
+# compsindex.py
+# Precomputed environment and group data of comps.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""
+    An immutable index of the environments and groups of comps.
+
+    Every group gets a bit, so the optional groups of an environment, the
+    ones it selects by default and the visible groups are plain integer
+    bitmaps. Questions the software spoke asks for each environment and
+    group pair become dictionary lookups and bit tests instead of pattern
+    searches through comps. A new index is built whenever comps is read,
+    so it can be shared between threads without locking.
+"""
+
+from collections import namedtuple, OrderedDict
+
+# Data of a comps group, bit is its bit in the bitmaps
+GroupEntry = namedtuple("GroupEntry", ["id", "name", "description", "visible", "bit"])
+
+# Data of a comps environment
+EnvironmentEntry = namedtuple("EnvironmentEntry",
+                              ["id", "name", "description", "groups", "options",
+                               "default_options", "option_mask", "default_mask"])
+
+class CompsIndex(object):
+    """ Environments and groups of a comps object. """
+
+    def __init__(self, comps=None):
+        """
+            :param comps: the comps to index, None for an empty index
+            :type comps: dnf.comps.Comps
+        """
+        groups = OrderedDict()
+        visible_mask = 0
+        for grp in (comps.groups_iter() if comps else []):
+            if grp.id in groups:
+                continue
+            entry = GroupEntry(grp.id, grp.ui_name, grp.ui_description, bool(grp.visible),
+                               1 << len(groups))
+            groups[grp.id] = entry
+            if entry.visible:
+                visible_mask |= entry.bit
+
+        environments = OrderedDict()
+        names = {}
+        for env in (comps.environments if comps else []):
+            option_mask = 0
+            default_mask = 0
+            for option in env.option_ids:
+                grp = groups.get(option.name)
+                if grp:
+                    option_mask |= grp.bit
+                    if option.default:
+                        default_mask |= grp.bit
+
+            environments[env.id] = EnvironmentEntry(
+                env.id, env.ui_name, env.ui_description,
+                tuple(id_.name for id_ in env.group_ids),
+                tuple(id_.name for id_ in env.option_ids),
+                frozenset(id_.name for id_ in env.option_ids if id_.default),
+                option_mask, default_mask)
+            if env.ui_name:
+                names.setdefault(env.ui_name, env.id)
+
+        self._groups = groups
+        self._group_list = tuple(groups.values())
+        self._visible_mask = visible_mask
+        self._environments = environments
+        self._environment_names = names
+
+    @property
+    def environments(self):
+        """ Ids of the environments, in comps order. """
+        return list(self._environments.keys())
+
+    @property
+    def groups(self):
+        """ Ids of the groups, in comps order. """
+        return list(self._groups.keys())
+
+    def environment(self, environment):
+        """ Return the entry of an environment given by id or name, or None. """
+        entry = self._environments.get(environment)
+        if entry is None and environment in self._environment_names:
+            entry = self._environments[self._environment_names[environment]]
+        return entry
+
+    def group(self, grpid):
+        """ Return the entry of a group, or None. """
+        return self._groups.get(grpid)
+
+    def _groups_in(self, mask):
+        return [grp.id for grp in self._group_list if grp.bit & mask]
+
+    def has_option(self, env, grpid):
+        """ Whether a group is an optional group of the environment entry env. """
+        grp = self._groups.get(grpid)
+        if grp is None:
+            return grpid in env.options
+        return bool(env.option_mask & grp.bit)
+
+    def option_is_default(self, env, grpid):
+        """ Whether a group is an optional group selected by default in env. """
+        grp = self._groups.get(grpid)
+        if grp is None:
+            return grpid in env.default_options
+        return bool(env.default_mask & grp.bit)
+
+    def addons(self, env):
+        """ Return the add-ons of the environment entry env.
+
+            :returns: the optional groups of the environment and the other
+                      visible groups, both in comps order
+            :rtype: tuple of (list, list)
+        """
+        return (self._groups_in(env.option_mask),
+                self._groups_in(self._visible_mask & ~env.option_mask))
@@ -0,0 +1,121 @@
+# depsolvecache.py
+# Memo of resolved dnf transactions.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+
+"""
+    Resolved transactions of the software selections checked before.
+
+    dnf has no public API to keep a resolved transaction aside and put it
+    back later, so the memo saves and restores the attributes of dnf.Base
+    holding one. Those are dnf internals: if any of them is missing, or the
+    restored state isn't what dnf.Base.transaction returns afterwards, the
+    memo disables itself and the selection is resolved again.
+"""
+
+from collections import OrderedDict
+
+import logging
+log = logging.getLogger("packaging")
+
+# Number of resolved transactions remembered
+DEPSOLVE_CACHE_SIZE = 8
+# dnf.Base attributes holding the state of a resolved transaction
+DNF_TRANSACTION_ATTRS = ('_goal', '_transaction', '_comps_trans', '_group_persistor')
+
+def selection_fingerprint(packages, environment, langs, kernel_packages,
+                          required_packages, required_groups, repos):
+    """ Return a hashable summary of everything the depsolve depends on.
+
+        :param packages: the %packages section of the kickstart
+        :param environment: the environment selected when the section
+                            selects the default one
+        :param langs: languages of the installation
+        :param kernel_packages: names of the kernel packages to try
+        :param required_packages: packages required by anaconda
+        :param required_groups: groups required by anaconda
+        :param repos: (id, baseurls, mirrorlist, metalink) of the enabled repos
+    """
+    return (packages.default,
+            packages.environment,
+            (environment,) if packages.default and environment else (),
+            tuple((group.name, group.include) for group in packages.groupList),
+            tuple(group.name for group in packages.excludedGroupList),
+            tuple(sorted(set(packages.packageList))),
+            tuple(sorted(set(packages.excludedList))),
+            packages.nocore,
+            packages.multiLib,
+            packages.handleMissing,
+            tuple(kernel_packages),
+            tuple(langs),
+            tuple(required_packages),
+            tuple(required_groups or []),
+            tuple(sorted(repos)))
+
+class DepsolveCache(object):
+    """ LRU memo of resolved transactions by selection fingerprints. """
+
+    def __init__(self, size=DEPSOLVE_CACHE_SIZE):
+        self.size = size
+        self.enabled = True
+        self._states = OrderedDict()
+
+    def clear(self):
+        self._states.clear()
+
+    def _disable(self, reason):
+        log.warning("not reusing resolved transactions: %s", reason)
+        self.enabled = False
+        self._states.clear()
+
+    def save(self, base, fingerprint):
+        """ Remember the transaction resolved by base for the fingerprint. """
+        if not self.enabled:
+            return
+
+        missing = [attr for attr in DNF_TRANSACTION_ATTRS if not hasattr(base, attr)]
+        if missing:
+            self._disable("dnf.Base has no %s" % ", ".join(missing))
+            return
+
+        self._states[fingerprint] = tuple(getattr(base, attr) for attr in DNF_TRANSACTION_ATTRS)
+        self._states.move_to_end(fingerprint)
+        while len(self._states) > self.size:
+            self._states.popitem(last=False)
+
+    def restore(self, base, fingerprint):
+        """ Put the transaction resolved for the fingerprint back into base.
+
+            :returns: True if it was restored, False if the selection has
+                      to be resolved
+            :rtype: bool
+        """
+        state = self._states.get(fingerprint)
+        if state is None:
+            return False
+
+        self._states.move_to_end(fingerprint)
+        for (attr, value) in zip(DNF_TRANSACTION_ATTRS, state):
+            setattr(base, attr, value)
+
+        # make sure dnf sees the restored transaction
+        if base.transaction is not state[DNF_TRANSACTION_ATTRS.index('_transaction')]:
+            self._disable("the restored transaction is not used by dnf")
+            return False
+        return True
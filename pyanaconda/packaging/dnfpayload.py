@@ -24,14 +24,21 @@ import os
 
 from blivet.size import Size
 import blivet.arch
+import blivet.util
 from pyanaconda.flags import flags
 from pyanaconda.i18n import _, N_
-from pyanaconda.progress import progressQ, progress_message
+from pyanaconda.progress import progressQ, progress_message, progress_advance, progress_units
+from pyanaconda.progressmodel import UNIT_DOWNLOAD_BYTES, UNIT_PACKAGES, UNIT_PACKAGE_BYTES
+from pyanaconda.threads import threadMgr, AnacondaThread
 
+import binascii
+import bz2
 import configparser
 import collections
-import itertools
+import concurrent.futures
+import gzip
 import logging
+import lzma
 import multiprocessing
 import operator
 from pyanaconda import constants
@@ -40,11 +47,21 @@ import pyanaconda.errors as errors
 import pyanaconda.iutil
 import pyanaconda.localization
 import pyanaconda.packaging as packaging
+from pyanaconda.packaging.mdcache import RepoMDCache, REPOMD_PATH, repomd_checksum
+from pyanaconda.packaging.solvcache import install_solv_cache, remove_solv_cache
+from pyanaconda.packaging.compsindex import CompsIndex
+from pyanaconda.packaging.depsolvecache import DepsolveCache, selection_fingerprint
+from pyanaconda.packaging.mirrors import MirrorRanker
+from pyanaconda.packaging.pkgcache import PackageCache
+from pyanaconda.packaging.telemetry import DownloadTelemetry
+import requests
 import shutil
 import sys
 import time
 import threading
+import urllib.parse
 from pyanaconda.iutil import ProxyString, ProxyStringError
+from xml.etree import ElementTree
 
 log = logging.getLogger("packaging")
 
@@ -52,11 +69,21 @@ import dnf
 import dnf.exceptions
 import dnf.repo
 import dnf.callback
+import hawkey
 import rpm
 
 DNF_CACHE_DIR = '/tmp/dnf.cache'
 DNF_PLUGINCONF_DIR = '/tmp/dnf.pluginconf'
 DNF_PACKAGE_CACHE_DIR_SUFFIX = 'dnf.package.cache'
+# Statistics of the package downloads, see telemetry.py
+DNF_DOWNLOAD_STATS = '/tmp/dnf.download.json'
+# Mountpoint of an NFS inst.pkgcache
+DNF_PKGCACHE_MOUNT_DIR = constants.MOUNT_DIR + '/pkgcache'
+# Packages downloaded ahead of the installation with inst.prefetch
+DNF_PREFETCH_DIR = '/tmp/dnf.package.prefetch'
+# Repo metadata kept across payload resets, see mdcache.py
+DNF_METADATA_CACHE_DIR = '/tmp/dnf.metadata.cache'
+DNF_METADATA_CACHE_SIZE = Size("512 MiB")
 DOWNLOAD_MPOINTS = {'/tmp',
                     '/',
                     '/var/tmp',
@@ -71,6 +98,24 @@ REPO_DIRS = ['/etc/yum.repos.d',
              '/tmp/product/anaconda.repos.d']
 YUM_REPOS_DIR = "/etc/yum.repos.d/"
 
+# Maximum number of repositories whose metadata is downloaded at the same time
+DNF_METADATA_WORKERS = 4
+
+# Number of packages prefetched before checking whether to go on
+DNF_PREFETCH_BATCH = 20
+# Memory that has to stay available when prefetching packages
+DNF_PREFETCH_MEMORY_RESERVE = Size("1 GiB")
+
+# The transaction process sends its progress in batches of at most this
+# many packages, or whatever was collected in this many seconds
+RPM_PROGRESS_BATCH = 64
+RPM_PROGRESS_INTERVAL = 0.25
+
+# Repos with ranked mirrors move on to the next mirror if a download is
+# slower than DNF_MIRROR_MINRATE bytes/s for DNF_MIRROR_TIMEOUT seconds
+DNF_MIRROR_MINRATE = 4096
+DNF_MIRROR_TIMEOUT = 20
+
 # Bonus to required free space which depends on block size and rpm database size estimation.
 # Every file could be aligned to fragment size so 4KiB * number_of_files should be a worst
 # case scenario. 2KiB for RPM DB was acquired by testing.
@@ -85,24 +130,57 @@ def _failure_limbo():
 
 def _df_map():
     """Return (mountpoint -> size available) mapping."""
-    output = pyanaconda.iutil.execWithCapture('df', ['--output=target,avail'])
-    output = output.rstrip()
-    lines = output.splitlines()
-    structured = {}
-    for line in lines:
-        items = line.split()
-        key = items[0]
-        val = items[1]
-        if not key.startswith('/'):
-            continue
-        structured[key] = Size(int(val)*1024)
+    structured = {key: Size(val)
+                  for (key, val) in pyanaconda.iutil.mount_free_space().items()
+                  if key.startswith('/')}
 
     # Add /var/tmp/ if this is a directory or image installation
     if flags.dirInstall or flags.imageInstall:
-        var_tmp = os.statvfs("/var/tmp")
-        structured["/var/tmp"] = Size(var_tmp.f_frsize * var_tmp.f_bfree)
+        structured["/var/tmp"] = Size(pyanaconda.iutil.path_free_space("/var/tmp"))
     return structured
 
+def _mem_available():
+    """Return the amount of memory available without swapping."""
+    with open("/proc/meminfo", "r") as f:
+        for line in f:
+            fields = line.split()
+            if fields[0] == "MemAvailable:":
+                return Size("%s KiB" % fields[1])
+    return Size(0)
+
+def _open_metadata(path):
+    """Open a possibly compressed repo metadata file for reading."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    elif path.endswith(".xz"):
+        return lzma.open(path, "rb")
+    elif path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+def _file_counts(filelists_fn, cancel=None):
+    """Return (pkgid -> number of files) mapping for a repo.
+
+       The filelists metadata is streamed once instead of having dnf
+       materialize the file list of every package in the transaction.
+       Returns None if cancel is set while the file is being read.
+    """
+    counts = {}
+    root = None
+    with _open_metadata(filelists_fn) as f:
+        for (event, elem) in ElementTree.iterparse(f, events=("start", "end")):
+            if root is None:
+                root = elem
+            if event != "end" or not (elem.tag.endswith("}package") or elem.tag == "package"):
+                continue
+
+            counts[elem.get("pkgid")] = sum(1 for child in elem if child.tag.endswith("file"))
+            # drop the parsed packages, root would keep all of them
+            root.clear()
+            if cancel is not None and cancel.is_set():
+                return None
+    return counts
+
 def _paced(fn):
     """Execute `fn` no more often then every 2 seconds."""
     def paced_fn(self, *args):
@@ -142,9 +220,39 @@ class PayloadRPMDisplay(dnf.callback.LoggingTransactionDisplay):
         self._last_ts = None
         self.cnt = 0
 
+        # progress not sent to anaconda yet
+        self._install_msg = None
+        self._log_msgs = []
+        self._last_flush = time.time()
+
+        # progress is also sent by a timer, in case the next event takes
+        # long to come
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def flush(self):
+        """Send the collected progress to anaconda.
+
+           Only the last 'install' message is sent, the ones before it would
+           be replaced on the screen right away anyway. All the log messages
+           are sent.
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._install_msg is not None or self._log_msgs:
+            self._queue.put(('progress', (self._install_msg, self._log_msgs)))
+        self._install_msg = None
+        self._log_msgs = []
+        self._last_flush = time.time()
+
     def event(self, package, action, te_current, te_total, ts_current, ts_total):
         # Process DNF actions, communicating with anaconda via the queue
-        # A normal installation consists of 'install' messages followed by
+        # A normal installation consists of 'progress' messages followed by
         # the 'post' message.
         if action == self.PKG_INSTALL and te_current == 0:
             # do not report same package twice
@@ -152,59 +260,85 @@ class PayloadRPMDisplay(dnf.callback.LoggingTransactionDisplay):
                 return
             self._last_ts = ts_current
 
-            msg = '%s.%s (%d/%d)' % \
+            install_msg = '%s.%s (%d/%d)' % \
                 (package.name, package.arch, ts_current, ts_total)
             self.cnt += 1
-            self._queue.put(('install', msg))
 
             # Log the exact package nevra, build time and checksum
             nevra = "%s-%s.%s" % (package.name, package.evr, package.arch)
             log_msg = "Installed: %s %s %s" % (nevra, package.buildtime, package.returnIdSum()[1])
-            self._queue.put(('log', log_msg))
+
+            with self._lock:
+                self._install_msg = install_msg
+                self._log_msgs.append(log_msg)
+
+                if len(self._log_msgs) >= RPM_PROGRESS_BATCH or \
+                   time.time() - self._last_flush >= RPM_PROGRESS_INTERVAL:
+                    self._flush()
+                elif self._timer is None:
+                    self._timer = threading.Timer(RPM_PROGRESS_INTERVAL, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
         elif action == self.TRANS_POST:
+            self.flush()
             self._queue.put(('post', None))
 
+def _payload_mirror(pkg):
+    """Return the mirror a package is downloaded from, as well as we know it."""
+    repo = pkg.repo
+    if repo.baseurl:
+        return urllib.parse.urlsplit(repo.baseurl[0]).netloc or repo.baseurl[0]
+    return repo.mirrorlist or repo.metalink or repo.id
+
 class DownloadProgress(dnf.callback.DownloadProgress):
     def __init__(self):
-        self.downloads = collections.defaultdict(int)
+        self.telemetry = DownloadTelemetry()
         self.last_time = time.time()
-        self.total_files = 0
-        self.total_size = Size(0)
 
     @_paced
     def _update(self):
-        msg = _('Downloading %(total_files)s RPMs, '
-                '%(downloaded)s / %(total_size)s (%(percent)d%%) done.')
-        downloaded = Size(sum(self.downloads.values()))
+        telemetry = self.telemetry
         vals = {
-            'downloaded'  : downloaded,
-            'percent'     : int(100 * downloaded/self.total_size),
-            'total_files' : self.total_files,
-            'total_size'  : self.total_size
+            'downloaded'  : Size(telemetry.downloaded),
+            'percent'     : telemetry.percent,
+            'total_files' : telemetry.total_files,
+            'total_size'  : Size(telemetry.total_size)
         }
+        eta = telemetry.eta
+        if eta is None:
+            msg = _('Downloading %(total_files)s RPMs, '
+                    '%(downloaded)s / %(total_size)s (%(percent)d%%) done.')
+        else:
+            msg = _('Downloading %(total_files)s RPMs, '
+                    '%(downloaded)s / %(total_size)s (%(percent)d%%) done, '
+                    '%(speed)s/s, %(eta)s remaining.')
+            vals['speed'] = Size(int(telemetry.throughput))
+            vals['eta'] = "%d:%02d" % divmod(int(eta), 60)
         progressQ.send_message(msg % vals)
+        progress_advance(**{UNIT_DOWNLOAD_BYTES: telemetry.downloaded})
 
     def end(self, payload, status, err_msg):
         nevra = str(payload)
-        if status is dnf.callback.STATUS_OK:
-            self.downloads[nevra] = payload.download_size
+        success = status is dnf.callback.STATUS_OK
+        self.telemetry.end(nevra, payload.download_size, payload.pkg.reponame,
+                           _payload_mirror(payload.pkg), success)
+        if success:
             self._update()
             return
         log.warning("Failed to download '%s': %d - %s", nevra, status, err_msg)
 
     def progress(self, payload, done):
-        nevra = str(payload)
-        self.downloads[nevra] = done
+        self.telemetry.progress(str(payload), done)
         self._update()
 
     def start(self, total_files, total_size):
-        self.total_files = total_files
-        self.total_size = Size(total_size)
+        self.telemetry.start(total_files, total_size)
 
 def do_transaction(base, queue_instance):
     # Execute the DNF transaction and catch any errors. An error doesn't
     # always raise a BaseException, so presence of 'quit' without a preceeding
     # 'post' message also indicates a problem.
+    display = None
     try:
         display = PayloadRPMDisplay(queue_instance)
         base.do_transaction(display=display)
@@ -215,6 +349,11 @@ def do_transaction(base, queue_instance):
         import traceback
         exit_reason = str(e) + traceback.format_exc()
     finally:
+        if display is not None:
+            try:
+                display.flush()
+            except BaseException as e:
+                log.error("Failed to send the transaction progress: %s", e)
         queue_instance.put(('quit', str(exit_reason)))
 
 class DNFPayload(packaging.PackagePayload):
@@ -223,6 +362,24 @@ class DNFPayload(packaging.PackagePayload):
 
         self._base = None
         self._download_location = None
+        self._md_cache = RepoMDCache(DNF_METADATA_CACHE_DIR, DNF_METADATA_CACHE_SIZE)
+        self._mirror_ranker = MirrorRanker(self._session)
+        # repo id -> mirrorlist of the repos using its ranked mirrors
+        self._ranked_mirrorlists = {}
+        # selection fingerprint -> saved transaction state, most recent last
+        self._depsolve_cache = DepsolveCache()
+        # repo id -> (filelists path, pkgid -> number of files)
+        self._file_count_index = {}
+        self._file_count_cancel = threading.Event()
+        # (txID, space required by that transaction)
+        self._space_required = (None, None)
+        # langcode key -> ids of the comps groups for that language
+        self._language_groups = {}
+        # environments and groups of comps, rebuilt whenever it's read
+        self._comps_index = CompsIndex()
+        # set to stop the running package prefetch
+        self._prefetch_cancel = threading.Event()
+        self._installing = False
         self._configure()
 
         # Protect access to _base.repos to ensure that the dictionary is not
@@ -233,6 +390,8 @@ class DNFPayload(packaging.PackagePayload):
 
     def unsetup(self):
         super(DNFPayload, self).unsetup()
+        self._stop_prefetch()
+        self._depsolve_cache.clear()
         self._base = None
         self._configure()
 
@@ -273,10 +432,6 @@ class DNFPayload(packaging.PackagePayload):
 
             url = "file://" + mountpoint
 
-        if url:
-            repo.baseurl = [url]
-        if mirrorlist:
-            repo.mirrorlist = mirrorlist
         repo.sslverify = not (ksrepo.noverifyssl or flags.noverifyssl)
         if ksrepo.proxy:
             try:
@@ -285,6 +440,22 @@ class DNFPayload(packaging.PackagePayload):
                 log.error("Failed to parse proxy for _add_repo %s: %s",
                           ksrepo.proxy, e)
 
+        self._ranked_mirrorlists.pop(repo.id, None)
+        if url:
+            repo.baseurl = [url]
+        elif mirrorlist:
+            mirrors = self._rank_mirrors(mirrorlist, repo)
+            if mirrors:
+                log.info("using %d ranked mirrors of %s for %s", len(mirrors),
+                         mirrorlist, repo.id)
+                repo.baseurl = mirrors
+                repo.minrate = DNF_MIRROR_MINRATE
+                repo.timeout = DNF_MIRROR_TIMEOUT
+                # the installed system gets the mirrorlist, not the mirrors
+                self._ranked_mirrorlists[repo.id] = mirrorlist
+        if mirrorlist and not repo.baseurl:
+            repo.mirrorlist = mirrorlist
+
         if ksrepo.cost:
             repo.cost = ksrepo.cost
 
@@ -317,12 +488,23 @@ class DNFPayload(packaging.PackagePayload):
 
         # Load the metadata to verify that the repo is valid
         try:
-            self._base.repos[repo.id].load()
+            self._load_repo(self._base.repos[repo.id])
         except dnf.exceptions.RepoError as e:
             raise packaging.MetadataError(e)
 
         log.info("added repo: '%s' - %s", ksrepo.name, url or mirrorlist)
 
+    def _rank_mirrors(self, mirrorlist, repo):
+        """Return the mirrors of a mirrorlist ordered by their latency."""
+        if not mirrorlist.startswith(("http:", "https:")):
+            return []
+
+        proxies = {}
+        if repo.proxy:
+            proxies = {"http": repo.proxy, "https": repo.proxy}
+
+        return self._mirror_ranker.ranked_mirrors(mirrorlist, proxies, repo.sslverify)
+
     def addRepo(self, ksrepo):
         """Add a repo to dnf and kickstart repo lists
 
@@ -397,6 +579,21 @@ class DNFPayload(packaging.PackagePayload):
             except packaging.NoSuchGroup as e:
                 self._miss(e)
 
+    def _selection_fingerprint(self):
+        """Return a hashable summary of everything the depsolve depends on."""
+        packages = self.data.packages
+        with self._repos_lock:
+            repos = [(repo.id, tuple(repo.baseurl), repo.mirrorlist, repo.metalink)
+                     for repo in self._base.repos.iter_enabled()]
+        environment = None
+        if packages.default and self.environments:
+            environment = self.environments[0]
+
+        return selection_fingerprint(packages, environment,
+                                     [self.data.lang.lang] + self.data.lang.addsupport,
+                                     self.kernelPackages, self.requiredPackages,
+                                     self.requiredGroups, repos)
+
     def _bump_tx_id(self):
         if self.txID is None:
             self.txID = 1
@@ -444,6 +641,8 @@ class DNFPayload(packaging.PackagePayload):
         # check automatically
         conf.reposdir = []
         self._base.read_comps()
+        self._comps_index = CompsIndex(self._base.comps)
+        self._index_language_groups()
 
         conf.reposdir = REPO_DIRS
 
@@ -493,6 +692,128 @@ class DNFPayload(packaging.PackagePayload):
 
         return pkgdir
 
+    def _start_prefetch(self):
+        """Start downloading the resolved transaction in the background.
+
+           Packages are downloaded in batches into DNF_PREFETCH_DIR, which is
+           in RAM, for as long as there is enough memory left. Staged packages
+           that are not part of the new transaction are removed.
+        """
+        self._stop_prefetch()
+
+        pkgs = [pkg for pkg in self._base.transaction.install_set
+                if not pkg.repo.local]
+
+        # The repos are only changed while no prefetch is running, the
+        # thread doesn't touch them.
+        with self._repos_lock:
+            for repo in self._base.repos.iter_enabled():
+                repo.pkgdir = DNF_PREFETCH_DIR
+
+        self._prefetch_cancel = threading.Event()
+        threadMgr.add(AnacondaThread(name=constants.THREAD_PACKAGE_PREFETCH,
+                                     target=self._prefetch,
+                                     args=(pkgs, self._prefetch_cancel)))
+
+    def _stop_prefetch(self):
+        """Stop the package prefetch, waiting for the current batch."""
+        self._prefetch_cancel.set()
+        threadMgr.wait(constants.THREAD_PACKAGE_PREFETCH)
+
+    def _prefetch(self, pkgs, cancel):
+        try:
+            self._prefetch_packages(pkgs, cancel)
+        except Exception as e:    # pylint: disable=broad-except
+            # the packages will be downloaded during the installation
+            log.exception("prefetch: failed: %s", e)
+
+    def _prefetch_packages(self, pkgs, cancel):
+        wanted = {os.path.basename(pkg.location) for pkg in pkgs}
+        try:
+            os.makedirs(DNF_PREFETCH_DIR, exist_ok=True)
+            for name in os.listdir(DNF_PREFETCH_DIR):
+                if name not in wanted:
+                    log.debug("prefetch: evicting %s", name)
+                    os.unlink(os.path.join(DNF_PREFETCH_DIR, name))
+        except OSError as e:
+            log.warning("prefetch: failed to set up %s: %s", DNF_PREFETCH_DIR, e)
+            return
+
+        todo = [pkg for pkg in pkgs if not os.path.exists(pkg.localPkg())]
+        log.info("prefetch: %d of %d packages to download", len(todo), len(pkgs))
+        for i in range(0, len(todo), DNF_PREFETCH_BATCH):
+            if cancel.is_set():
+                log.info("prefetch: cancelled")
+                return
+
+            batch = todo[i:i + DNF_PREFETCH_BATCH]
+            batch_size = Size(sum(pkg.downloadsize for pkg in batch))
+            available = min(_mem_available(),
+                            Size(pyanaconda.iutil.path_free_space(DNF_PREFETCH_DIR)))
+            if available < batch_size + DNF_PREFETCH_MEMORY_RESERVE:
+                log.info("prefetch: stopping, only %s of memory available", available)
+                return
+
+            try:
+                self._base.download_packages(batch, dnf.callback.NullDownloadProgress())
+            except dnf.exceptions.DownloadError as e:
+                # the packages will be downloaded again during the installation
+                log.info("prefetch: download failed: %s", e)
+                return
+
+        log.info("prefetch: finished")
+
+    def _use_prefetched_packages(self, pkgdir):
+        """Move the prefetched packages of the transaction to pkgdir."""
+        if not os.path.isdir(DNF_PREFETCH_DIR):
+            return
+
+        wanted = {os.path.basename(pkg.location) for pkg in self._base.transaction.install_set}
+        moved = 0
+        try:
+            os.makedirs(pkgdir, exist_ok=True)
+            for name in os.listdir(DNF_PREFETCH_DIR):
+                if name in wanted:
+                    shutil.move(os.path.join(DNF_PREFETCH_DIR, name), os.path.join(pkgdir, name))
+                    moved += 1
+        except OSError as e:
+            # whatever is missing gets downloaded
+            log.warning("Failed to move prefetched packages to %s: %s", pkgdir, e)
+        shutil.rmtree(DNF_PREFETCH_DIR, ignore_errors=True)
+        log.info("Using %d prefetched packages.", moved)
+
+    def _setup_package_cache(self):
+        """Return the package cache given by inst.pkgcache, or None."""
+        if not flags.pkgcache:
+            return None
+
+        path = flags.pkgcache
+        if path.startswith("nfs:"):
+            (options, server, nfs_path) = pyanaconda.iutil.parseNfsUrl(path)
+            path = DNF_PKGCACHE_MOUNT_DIR
+            try:
+                self._setupNFS(path, server, nfs_path, options)
+            except packaging.PayloadSetupError as e:
+                log.error("Failed to mount package cache %s: %s", flags.pkgcache, e)
+                return None
+
+        log.info("Using package cache %s", path)
+        return PackageCache(path)
+
+    def _fetch_cached_packages(self, pkg_cache, pkgs):
+        """Copy packages from the package cache, return the missing ones.
+
+           Packages already in the download location, e.g. the prefetched
+           ones, are left for dnf to check.
+        """
+        missing = []
+        os.makedirs(self._download_location, exist_ok=True)
+        for pkg in pkgs:
+            if pkg.repo.local or os.path.exists(pkg.localPkg()) or \
+               not pkg_cache.fetch(pkg.returnIdSum(), pkg.localPkg()):
+                missing.append(pkg)
+        return missing
+
     def _select_group(self, group_id, default=True, optional=False, required=False):
         grp = self._base.comps.group_by_pattern(group_id)
         if grp is None:
@@ -544,14 +865,116 @@ class DNFPayload(packaging.PackagePayload):
             log.info("Installing langpacks-%s", loc)
             self._base.install("langpacks-" + loc)
 
+    def _cacheable_url(self, dnf_repo):
+        """Return the URL the metadata cache should use for a repo, or None.
+
+           Only repos with a single remote baseurl are cached, metalinks and
+           mirrorlists can hand out a different mirror every time and local
+           repos don't need the cache.
+        """
+        if dnf_repo.metalink or dnf_repo.mirrorlist or len(dnf_repo.baseurl) != 1:
+            return None
+
+        url = dnf_repo.baseurl[0]
+        if not url.startswith(("http:", "https:", "ftp:")):
+            return None
+
+        return url
+
+    def _remote_repomd_checksum(self, dnf_repo, url):
+        """Download just the repomd.xml of a repo and return its checksum."""
+        proxies = {}
+        if dnf_repo.proxy:
+            proxies = {"http": dnf_repo.proxy, "https": dnf_repo.proxy}
+
+        try:
+            response = self._session.get("%s/%s" % (url.rstrip("/"), REPOMD_PATH),
+                                         headers={"user-agent": packaging.USER_AGENT},
+                                         proxies=proxies, verify=dnf_repo.sslverify)
+        except requests.exceptions.RequestException as e:
+            log.debug("failed to get repomd.xml of %s: %s", dnf_repo.id, e)
+            return None
+
+        if response.status_code != 200:
+            return None
+
+        return repomd_checksum(response.content)
+
+    def _load_repo(self, dnf_repo):
+        """Load the metadata of a repo, using the persistent metadata cache.
+
+           If a repo's repomd.xml is unchanged since its metadata was last
+           downloaded, the cached repodata is put back into the dnf cache
+           directory and dnf only has to revalidate it.
+        """
+        url = self._cacheable_url(dnf_repo)
+        if url:
+            checksum = self._remote_repomd_checksum(dnf_repo, url)
+            if checksum:
+                self._md_cache.restore(url, checksum, dnf_repo.cachedir)
+
+        dnf_repo.load()
+
+        if url:
+            self._md_cache.store(url, dnf_repo.cachedir)
+
     def _sync_metadata(self, dnf_repo):
+        """Load the metadata of a repo, reporting its state to payloadMgr.
+
+           This runs in the metadata worker threads, so it must not touch
+           anything but the repo itself. Errors are re-raised and handled
+           by the caller.
+        """
+        packaging.payloadMgr.setRepoState(dnf_repo.id, packaging.payloadMgr.REPO_STATE_LOADING)
         try:
-            dnf_repo.load()
+            self._load_repo(dnf_repo)
         except dnf.exceptions.RepoError as e:
-            id_ = dnf_repo.id
-            log.info('_sync_metadata: addon repo error: %s', e)
-            self.disableRepo(id_)
-            self.verbose_errors.append(str(e))
+            packaging.payloadMgr.setRepoState(dnf_repo.id, packaging.payloadMgr.REPO_STATE_FAILED,
+                                              str(e))
+            raise
+        packaging.payloadMgr.setRepoState(dnf_repo.id, packaging.payloadMgr.REPO_STATE_LOADED)
+
+    def _use_prebuilt_solv(self, repos):
+        """Put the prebuilt solv files of local repos into the sack's cache.
+
+           hawkey then loads them instead of parsing the metadata of the
+           installation media, see solvcache.py.
+
+           :returns: ids of the repos with prebuilt solv files
+           :rtype: list of str
+        """
+        used = []
+        for repo in repos:
+            if not repo.enabled or len(repo.baseurl) != 1 or not repo.baseurl[0].startswith("file://"):
+                continue
+            try:
+                if install_solv_cache(repo.baseurl[0][7:], repo.metadata.repomd_fn, repo.id, DNF_CACHE_DIR):
+                    used.append(repo.id)
+            except (IOError, OSError, AttributeError) as e:
+                log.debug("no prebuilt solv files for %s: %s", repo.id, e)
+        return used
+
+    def _fill_sack(self, prebuilt_repos):
+        """Load the repos into the sack.
+
+           If hawkey can't read the prebuilt solv files, they are removed
+           and the metadata is parsed instead.
+        """
+        try:
+            self._base.fill_sack(load_system_repo=False)
+        except hawkey.Exception as e:
+            if not prebuilt_repos:
+                raise
+            log.warning("failed to load the sack with prebuilt solv files, parsing the metadata: %s", e)
+            for repo_id in prebuilt_repos:
+                remove_solv_cache(repo_id, DNF_CACHE_DIR)
+            self._base.fill_sack(load_system_repo=False)
+
+    def _sync_metadata_failed(self, dnf_repo, exn):
+        id_ = dnf_repo.id
+        log.info('_sync_metadata: addon repo error: %s', exn)
+        self.disableRepo(id_)
+        self.verbose_errors.append(str(exn))
 
     @property
     def baseRepo(self):
@@ -565,12 +988,11 @@ class DNFPayload(packaging.PackagePayload):
 
     @property
     def environments(self):
-        return [env.id for env in self._base.comps.environments]
+        return self._comps_index.environments
 
     @property
     def groups(self):
-        groups = self._base.comps.groups_iter()
-        return [g.id for g in groups]
+        return self._comps_index.groups
 
     @property
     def mirrorEnabled(self):
@@ -582,6 +1004,17 @@ class DNFPayload(packaging.PackagePayload):
         with self._repos_lock:
             return [r.id for r in self._base.repos.values()]
 
+    def progressUnits(self):
+        transaction = self._base.transaction
+        if transaction is None:
+            return super(DNFPayload, self).progressUnits()
+
+        install_set = transaction.install_set
+        return {UNIT_DOWNLOAD_BYTES: sum(pkg.downloadsize for pkg in install_set
+                                         if not pkg.repo.local),
+                UNIT_PACKAGES: len(install_set),
+                UNIT_PACKAGE_BYTES: sum(pkg.installsize for pkg in install_set)}
+
     @property
     def spaceRequired(self):
         size = self._spaceRequired()
@@ -610,18 +1043,84 @@ class DNFPayload(packaging.PackagePayload):
             log.debug("Installation space required %s", size)
         return size
 
+    def _start_file_count_index(self):
+        """Start building the file count index of the loaded repos.
+
+           The index is built in the background, _spaceRequired asks dnf
+           for the file lists of the packages of repos not indexed yet.
+        """
+        self._stop_file_count_index()
+
+        filelists = []
+        with self._repos_lock:
+            for repo in self._base.repos.iter_enabled():
+                filelists_fn = getattr(repo.metadata, "filelists_fn", None)
+                if filelists_fn:
+                    filelists.append((repo.id, filelists_fn))
+
+        self._file_count_cancel = threading.Event()
+        threadMgr.add(AnacondaThread(name=constants.THREAD_FILE_COUNT_INDEX,
+                                     target=self._build_file_count_index,
+                                     args=(filelists, self._file_count_cancel)))
+
+    def _stop_file_count_index(self):
+        self._file_count_cancel.set()
+        threadMgr.wait(constants.THREAD_FILE_COUNT_INDEX)
+
+    def _build_file_count_index(self, filelists, cancel):
+        for (repo_id, filelists_fn) in filelists:
+            start = time.time()
+            try:
+                counts = _file_counts(filelists_fn, cancel)
+            except Exception as e:    # pylint: disable=broad-except
+                # the index is only an optimization, dnf has the file lists
+                log.warning("failed to index files of repo %s: %s", repo_id, e)
+                continue
+            if counts is None:
+                return
+
+            self._file_count_index[repo_id] = (filelists_fn, counts)
+            log.debug("indexed files of %d packages of repo %s in %.2f s",
+                      len(counts), repo_id, time.time() - start)
+
+    def _repo_file_counts(self, repo_id):
+        """Return the file count index of a repo, or None if not built yet."""
+        (indexed_fn, counts) = self._file_count_index.get(repo_id, (None, None))
+        if counts is None:
+            return None
+
+        try:
+            filelists_fn = self._base.repos[repo_id].metadata.filelists_fn
+        except (AttributeError, KeyError):
+            return None
+        return counts if indexed_fn == filelists_fn else None
+
+    def _package_file_count(self, pkg):
+        counts = self._repo_file_counts(pkg.reponame)
+        if counts is not None and pkg.chksum:
+            pkgid = binascii.hexlify(pkg.chksum[1]).decode("ascii")
+            if pkgid in counts:
+                return counts[pkgid]
+
+        # not indexed, ask dnf for the file list
+        return len(pkg.files)
+
     def _spaceRequired(self):
         transaction = self._base.transaction
         if transaction is None:
             return Size("3000 MB")
 
+        (tx_id, total_space) = self._space_required
+        if tx_id is not None and tx_id == self.txID:
+            return total_space
+
         size = 0
         files_nm = 0
         for tsi in transaction:
             # space taken by all files installed by the packages
             size += tsi.installed.installsize
             # number of files installed on the system
-            files_nm += len(tsi.installed.files)
+            files_nm += self._package_file_count(tsi.installed)
 
         # append bonus size depending on number of files
         bonus_size = files_nm * BONUS_SIZE_ON_FILE
@@ -631,36 +1130,69 @@ class DNFPayload(packaging.PackagePayload):
         log.debug("Size from DNF: %s", size)
         log.debug("Bonus size %s by number of files %s", bonus_size, files_nm)
         log.debug("Total size required %s", total_space)
+        self._space_required = (self.txID, total_space)
         return total_space
 
-    def _isGroupVisible(self, grpid):
-        grp = self._base.comps.group_by_pattern(grpid)
+    def _environment_entry(self, environmentid):
+        """Return the comps index entry of an environment id, name or pattern."""
+        env = self._comps_index.environment(environmentid)
+        if env is None:
+            comps_env = self._base.comps.environment_by_pattern(environmentid)
+            if comps_env is not None:
+                env = self._comps_index.environment(comps_env.id)
+        if env is None:
+            raise packaging.NoSuchGroup(environmentid)
+        return env
+
+    def _group_entry(self, grpid):
+        """Return the comps index entry of a group id or pattern."""
+        grp = self._comps_index.group(grpid)
+        if grp is None:
+            comps_grp = self._base.comps.group_by_pattern(grpid)
+            if comps_grp is not None:
+                grp = self._comps_index.group(comps_grp.id)
         if grp is None:
             raise packaging.NoSuchGroup(grpid)
-        return grp.visible
+        return grp
+
+    def _isGroupVisible(self, grpid):
+        return self._group_entry(grpid).visible
 
     def _groupHasInstallableMembers(self, grpid):
         return True
 
     def checkSoftwareSelection(self):
         log.info("checking software selection")
+        # dnf.Base can't be used by the prefetch while the goal changes
+        self._stop_prefetch()
         self._bump_tx_id()
-        self._base.reset(goal=True)
-        self._apply_selections()
 
-        try:
-            if self._base.resolve():
-                log.debug("checking dependencies: success.")
-            else:
-                log.debug("empty transaction")
-        except dnf.exceptions.DepsolveError as e:
-            msg = str(e)
-            log.warning(msg)
-            raise packaging.DependencyError(msg)
+        # Reuse the result of an earlier depsolve of the same selection
+        fingerprint = self._selection_fingerprint()
+        if self._depsolve_cache.restore(self._base, fingerprint):
+            log.info("reusing the resolved transaction for an unchanged selection")
+        else:
+            self._base.reset(goal=True)
+            self._apply_selections()
+
+            try:
+                if self._base.resolve():
+                    log.debug("checking dependencies: success.")
+                else:
+                    log.debug("empty transaction")
+            except dnf.exceptions.DepsolveError as e:
+                msg = str(e)
+                log.warning(msg)
+                raise packaging.DependencyError(msg)
+
+            self._depsolve_cache.save(self._base, fingerprint)
 
         log.info("%d packages selected totalling %s",
                  len(self._base.transaction), self.spaceRequired)
 
+        if flags.prefetch and not self._installing:
+            self._start_prefetch()
+
     def disableRepo(self, repo_id):
         try:
             self._base.repos[repo_id].disable()
@@ -678,58 +1210,73 @@ class DNFPayload(packaging.PackagePayload):
         super(DNFPayload, self).enableRepo(repo_id)
 
     def environmentDescription(self, environmentid):
-        env = self._base.comps.environment_by_pattern(environmentid)
-        if env is None:
-            raise packaging.NoSuchGroup(environmentid)
-        return (env.ui_name, env.ui_description)
+        env = self._environment_entry(environmentid)
+        return (env.name, env.description)
 
     def environmentId(self, environment):
         """ Return environment id for the environment specified by id or name."""
-        env = self._base.comps.environment_by_pattern(environment)
-        if env is None:
-            raise packaging.NoSuchGroup(environment)
-        return env.id
+        return self._environment_entry(environment).id
 
     def environmentGroups(self, environmentid, optional=True):
-        env = self._base.comps.environment_by_pattern(environmentid)
-        if env is None:
-            raise packaging.NoSuchGroup(environmentid)
-        group_ids = (id_.name for id_ in env.group_ids)
-        option_ids = (id_.name for id_ in env.option_ids)
+        env = self._environment_entry(environmentid)
         if optional:
-            return list(itertools.chain(group_ids, option_ids))
+            return list(env.groups + env.options)
         else:
-            return list(group_ids)
+            return list(env.groups)
 
     def environmentHasOption(self, environmentid, grpid):
-        env = self._base.comps.environment_by_pattern(environmentid)
-        if env is None:
-            raise packaging.NoSuchGroup(environmentid)
-        return grpid in (id_.name for id_ in env.option_ids)
+        return self._comps_index.has_option(self._environment_entry(environmentid), grpid)
 
     def environmentOptionIsDefault(self, environmentid, grpid):
-        env = self._base.comps.environment_by_pattern(environmentid)
-        if env is None:
-            raise packaging.NoSuchGroup(environmentid)
-
-        # Look for a group in the optionlist that matches the group_id and has
-        # default set
-        return any(grp for grp in env.option_ids if grp.name == grpid and grp.default)
+        return self._comps_index.option_is_default(self._environment_entry(environmentid), grpid)
 
     def groupDescription(self, grpid):
         """ Return name/description tuple for the group specified by id. """
-        grp = self._base.comps.group_by_pattern(grpid)
-        if grp is None:
-            raise packaging.NoSuchGroup(grpid)
-        return (grp.ui_name, grp.ui_description)
+        grp = self._group_entry(grpid)
+        return (grp.name, grp.description)
+
+    def _refreshEnvironmentAddons(self):
+        log.info("Refreshing environmentAddons")
+        index = self._comps_index
+        self._environmentAddons = dict((envid, index.addons(index.environment(envid)))
+                                       for envid in index.environments)
 
     def gatherRepoMetadata(self):
         with self._repos_lock:
-            for repo in self._base.repos.iter_enabled():
-                self._sync_metadata(repo)
-        self._base.fill_sack(load_system_repo=False)
+            repos = list(self._base.repos.iter_enabled())
+            for repo in repos:
+                packaging.payloadMgr.setRepoState(repo.id, packaging.payloadMgr.REPO_STATE_QUEUED)
+
+            # Download the metadata of several repos at once, the time spent
+            # here is mostly waiting for the network.
+            errors = {}
+            if repos:
+                workers = min(DNF_METADATA_WORKERS, len(repos))
+                with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = dict((executor.submit(self._sync_metadata, repo), repo)
+                                   for repo in repos)
+                    for future in concurrent.futures.as_completed(futures):
+                        try:
+                            future.result()
+                        except dnf.exceptions.RepoError as e:
+                            errors[futures[future].id] = e
+
+            # Handle the failures in the original order of the repos, so that
+            # the end result is the same as loading them one after another.
+            for repo in repos:
+                if repo.id in errors:
+                    self._sync_metadata_failed(repo, errors[repo.id])
+
+            prebuilt_repos = self._use_prebuilt_solv(repos)
+
+        self._fill_sack(prebuilt_repos)
         self._base.read_comps()
+        self._comps_index = CompsIndex(self._base.comps)
         self._refreshEnvironmentAddons()
+        self._index_language_groups()
+        # Transactions resolved against the old sack are no longer valid
+        self._depsolve_cache.clear()
+        self._start_file_count_index()
 
     def install(self):
         progress_message(N_('Starting package installation process'))
@@ -740,15 +1287,31 @@ class DNFPayload(packaging.PackagePayload):
 
         if self.install_device:
             self._setupMedia(self.install_device)
+
+        # The transaction and the repos are ours from now on
+        self._installing = True
+        self._stop_prefetch()
         try:
             self.checkSoftwareSelection()
             self._download_location = self._pick_download_location()
+            self._use_prefetched_packages(self._download_location)
         except packaging.PayloadError as e:
             if errors.errorHandler.cb(e) == errors.ERROR_RAISE:
                 log.error("Installation failed: %r", e)
                 _failure_limbo()
 
         pkgs_to_download = self._base.transaction.install_set
+        pkg_cache = self._setup_package_cache()
+        if pkg_cache:
+            pkgs_to_download = self._fetch_cached_packages(pkg_cache, pkgs_to_download)
+
+        install_set = self._base.transaction.install_set
+        package_bytes = sum(pkg.installsize for pkg in install_set)
+        progress_units(**{UNIT_DOWNLOAD_BYTES: sum(pkg.downloadsize for pkg in pkgs_to_download
+                                                   if not pkg.repo.local),
+                          UNIT_PACKAGES: len(install_set),
+                          UNIT_PACKAGE_BYTES: package_bytes})
+
         log.info('Downloading packages to %s.', self._download_location)
         progressQ.send_message(_('Downloading packages'))
         progress = DownloadProgress()
@@ -762,6 +1325,15 @@ class DNFPayload(packaging.PackagePayload):
                 _failure_limbo()
 
         log.info('Downloading packages finished.')
+        progress.telemetry.write_summary(DNF_DOWNLOAD_STATS)
+        for (mirror, stats) in progress.telemetry.mirrors.items():
+            log.info("Downloaded %s in %d files from %s, %d failures",
+                     Size(stats.bytes), stats.files, mirror, stats.failures)
+
+        if pkg_cache:
+            for pkg in pkgs_to_download:
+                if not pkg.repo.local and os.path.exists(pkg.localPkg()):
+                    pkg_cache.store(pkg.returnIdSum(), pkg.localPkg())
 
         pre_msg = (N_("Preparing transaction from installation source"))
         progress_message(pre_msg)
@@ -771,15 +1343,22 @@ class DNFPayload(packaging.PackagePayload):
                                           args=(self._base, queue_instance))
         process.start()
         (token, msg) = queue_instance.get()
-        # When the installation works correctly it will get 'install' updates
+        # When the installation works correctly it will get 'progress' updates
         # followed by a 'post' message and then a 'quit' message.
         # If the installation fails it will send 'quit' without 'post'
+        installed = 0
         while token not in ('post', 'quit'):
-            if token == 'install':
-                msg = _("Installing %s") % msg
-                progressQ.send_message(msg)
-            elif token == 'log':
-                log.info(msg)
+            if token == 'progress':
+                (install_msg, log_msgs) = msg
+                for log_msg in log_msgs:
+                    log.info(log_msg)
+                # there is a log message for every installed package
+                installed += len(log_msgs)
+                if install_set:
+                    progress_advance(**{UNIT_PACKAGES: installed,
+                                        UNIT_PACKAGE_BYTES: package_bytes * installed // len(install_set)})
+                if install_msg is not None:
+                    progressQ.send_message(_("Installing %s") % install_msg)
             (token, msg) = queue_instance.get()
 
         if token == 'quit':
@@ -799,6 +1378,9 @@ class DNFPayload(packaging.PackagePayload):
             # we don't have to care about clearing the download location ourselves.
             log.warning("Can't delete nonexistent download location: %s", self._download_location)
 
+        if pkg_cache:
+            pkg_cache.log_stats()
+
     def getRepo(self, repo_id):
         """ Return the yum repo object. """
         return self._base.repos[repo_id]
@@ -809,15 +1391,21 @@ class DNFPayload(packaging.PackagePayload):
         except (dnf.exceptions.RepoError, KeyError):
             return super(DNFPayload, self).isRepoEnabled(repo_id)
 
+    def _index_language_groups(self):
+        """Index the comps groups by the langcodes in their lang_only."""
+        index = collections.defaultdict(set)
+        for grp in self._base.comps.groups_iter():
+            key = pyanaconda.localization.langcode_key(grp.lang_only)
+            if key:
+                index[key].add(grp.id)
+        self._language_groups = index
+
     def languageGroups(self):
         locales = [self.data.lang.lang] + self.data.lang.addsupport
-        match_fn = pyanaconda.localization.langcode_matches_locale
         gids = set()
-        gl_tuples = ((g.id, g.lang_only) for g in self._base.comps.groups_iter())
-        for (gid, lang) in gl_tuples:
-            for locale in locales:
-                if match_fn(lang, locale):
-                    gids.add(gid)
+        for locale in locales:
+            for key in pyanaconda.localization.langcode_match_keys(locale):
+                gids.update(self._language_groups.get(key, ()))
         log.info('languageGroups: %s', gids)
         return list(gids)
 
@@ -830,9 +1418,18 @@ class DNFPayload(packaging.PackagePayload):
 
     def reset(self):
         super(DNFPayload, self).reset()
+        self._stop_prefetch()
+        shutil.rmtree(DNF_PREFETCH_DIR, ignore_errors=True)
+        # The repo metadata is kept in DNF_METADATA_CACHE_DIR, the next load
+        # of an unchanged repo will restore it from there.
         shutil.rmtree(DNF_CACHE_DIR, ignore_errors=True)
         shutil.rmtree(DNF_PLUGINCONF_DIR, ignore_errors=True)
         self.txID = None
+        self._depsolve_cache.clear()
+        self._stop_file_count_index()
+        self._file_count_index = {}
+        self._space_required = (None, None)
+        self._ranked_mirrorlists = {}
         self._base.reset(sack=True, repos=True)
 
     def updateBaseRepo(self, fallback=True, checkmount=True):
@@ -935,8 +1532,9 @@ class DNFPayload(packaging.PackagePayload):
             else:
                 f.write("enabled=0\n")
 
-            if repo.mirrorlist:
-                f.write("mirrorlist=%s\n" % repo.mirrorlist)
+            mirrorlist = repo.mirrorlist or self._ranked_mirrorlists.get(repo.id)
+            if mirrorlist:
+                f.write("mirrorlist=%s\n" % mirrorlist)
             elif repo.metalink:
                 f.write("metalink=%s\n" % repo.metalink)
             elif repo.baseurl:
@@ -992,6 +1590,10 @@ class DNFPayload(packaging.PackagePayload):
             except packaging.PayloadSetupError as e:
                 log.error(e)
 
+        # Unmount the NFS package cache
+        if os.path.ismount(DNF_PKGCACHE_MOUNT_DIR) and not flags.testing:
+            blivet.util.umount(DNF_PKGCACHE_MOUNT_DIR)
+
         super(DNFPayload, self).postInstall()
 
     def writeStorageLate(self):
@@ -30,6 +30,7 @@
 
 """
 import os
+import re
 import stat
 from time import sleep
 from threading import Lock
@@ -38,8 +39,12 @@ from pyanaconda.iutil import ProxyString, ProxyStringError, lowerASCII
 import hashlib
 import glob
 import functools
+import shutil
+import tempfile
+import uuid
 
 from pyanaconda.packaging import ImagePayload, PayloadSetupError, PayloadInstallError
+from pyanaconda.packaging import PAYLOAD_REQUIRES_STORAGE, PAYLOAD_REQUIRES_NETWORK
 
 from pyanaconda.constants import INSTALL_TREE, THREAD_LIVE_PROGRESS
 from pyanaconda.constants import IMAGE_DIR, TAR_SUFFIX
@@ -50,22 +55,34 @@ import logging
 log = logging.getLogger("packaging")
 
 from pyanaconda.errors import errorHandler, ERROR_RAISE
-from pyanaconda.progress import progressQ
+from pyanaconda.progress import progressQ, progress_advance, progress_units
+from pyanaconda.progressmodel import UNIT_DOWNLOAD_BYTES, UNIT_IMAGE_BYTES, UNIT_KERNELS
 from blivet.size import Size
 import blivet.util
 from pyanaconda.threads import threadMgr, AnacondaThread
 from pyanaconda.i18n import _
-from pyanaconda.packaging import versionCmp
+from pyanaconda.packaging import versionCmp, runKernelJobs
+from pyanaconda.packaging.treecopy import TreeCopy, TreeCopyError
+from pyanaconda.packaging.blockimage import BlockImageWriter, BlockImageError, BLOCK_IMAGE_FSTYPES
+from pyanaconda.packaging.tarextract import TarExtractor, TarExtractError
+from pyanaconda.packaging.blockimage import blkid_value, grow_filesystem, set_filesystem_uuid
+from pyanaconda.flags import flags
+
+# Size of the chunks the live image is downloaded and hashed in
+IMAGE_DOWNLOAD_CHUNK = 1024 * 1024
+# Number of times an interrupted image download is resumed
+IMAGE_DOWNLOAD_RETRIES = 5
+# Paths of the live tree not copied to the target system
+LIVE_COPY_EXCLUDES = ["/dev/", "/proc/", "/sys/", "/run/", "/boot/*rescue*", "/etc/machine-id"]
 
 class LiveImagePayload(ImagePayload):
     """ A LivePayload copies the source image onto the target system. """
     def __init__(self, *args, **kwargs):
         super(LiveImagePayload, self).__init__(*args, **kwargs)
-        # Used to adjust size of sysroot when files are already present
-        self._adj_size = 0
         self.pct = 0
         self.pct_lock = None
         self.source_size = 1
+        self._tree_copy = None
 
         self._kernelVersionList = []
 
@@ -91,6 +108,11 @@ class LiveImagePayload(ImagePayload):
         source = os.statvfs(INSTALL_TREE)
         self.source_size = source.f_frsize * (source.f_blocks - source.f_bfree)
 
+    @property
+    def startupRequirements(self):
+        # the live device is looked for among the storage devices
+        return {PAYLOAD_REQUIRES_STORAGE}
+
     def unsetup(self):
         super(LiveImagePayload, self).unsetup()
 
@@ -106,25 +128,19 @@ class LiveImagePayload(ImagePayload):
         progressQ.send_message(_("Installing software") + (" %d%%") % (0,))
 
     def progress(self):
-        """Monitor the amount of disk space used on the target and source and
-           update the hub's progress bar.
+        """Monitor the amount of data copied to the target and update the
+           hub's progress bar.
         """
-        mountpoints = self.storage.mountpoints.copy()
         last_pct = -1
         while self.pct < 100:
-            dest_size = 0
-            for mnt in mountpoints:
-                mnt_stat = os.statvfs(iutil.getSysroot()+mnt)
-                dest_size += mnt_stat.f_frsize * (mnt_stat.f_blocks - mnt_stat.f_bfree)
-            if dest_size >= self._adj_size:
-                dest_size -= self._adj_size
-
+            dest_size = self._tree_copy.bytes_copied
             pct = int(100 * dest_size / self.source_size)
             if pct != last_pct:
                 with self.pct_lock:
                     self.pct = pct
                 last_pct = pct
                 progressQ.send_message(_("Installing software") + (" %d%%") % (min(100, self.pct),))
+            progress_advance(**{UNIT_IMAGE_BYTES: dest_size})
             sleep(0.777)
 
     def install(self):
@@ -133,32 +149,50 @@ class LiveImagePayload(ImagePayload):
         if self.source_size <= 0:
             raise PayloadInstallError("Nothing to install")
 
+        self._setImageUnits(self.source_size)
+        self._install_tree()
+
+        # Live needs to create the rescue image before bootloader is written
+        if not os.path.exists(iutil.getSysroot() + "/usr/sbin/new-kernel-pkg"):
+            log.error("new-kernel-pkg does not exist - grubby wasn't installed?  skipping")
+            return
+
+        self._generateRescueImages()
+
+    def _generateRescueImages(self):
+        """ Run the kernel's posttrans scriptlet for each installed kernel. """
+        # The postinst.d hooks create the one rescue image shared by all the
+        # kernels and edit the boot loader configuration, so the kernels
+        # are done one after the other
+        def _rescue_image(kernel):
+            return iutil.execInSysroot("new-kernel-pkg", ["--rpmposttrans", kernel])
+
+        runKernelJobs(self.kernelVersionList, _rescue_image, "generating rescue image", max_jobs=1)
+
+    def _install_tree(self):
+        """ Copy the live tree to the target system. """
+        # copy the tree like rsync -pogAXtlHrDx would, preserving permissions,
+        # owners, groups, ACL's, xattrs, times, symlinks, hardlinks, devices
+        # and special files, without crossing file system boundaries
+        self._tree_copy = TreeCopy(INSTALL_TREE, iutil.getSysroot(), LIVE_COPY_EXCLUDES)
+
         self.pct_lock = Lock()
         self.pct = 0
         threadMgr.add(AnacondaThread(name=THREAD_LIVE_PROGRESS,
                                      target=self.progress))
 
-        cmd = "rsync"
-        # preserve: permissions, owners, groups, ACL's, xattrs, times,
-        #           symlinks, hardlinks
-        # go recursively, include devices and special files, don't cross
-        # file system boundaries
-        args = ["-pogAXtlHrDx", "--exclude", "/dev/", "--exclude", "/proc/",
-                "--exclude", "/sys/", "--exclude", "/run/", "--exclude", "/boot/*rescue*",
-                "--exclude", "/etc/machine-id", INSTALL_TREE+"/", iutil.getSysroot()]
         try:
-            rc = iutil.execWithRedirect(cmd, args)
-        except (OSError, RuntimeError) as e:
-            msg = None
+            self._tree_copy.run()
+        except (OSError, TreeCopyError) as e:
             err = str(e)
             log.error(err)
         else:
             err = None
-            msg = "%s exited with code %d" % (cmd, rc)
-            log.info(msg)
+            if self._tree_copy.errors:
+                log.warning("%d files could not be copied", len(self._tree_copy.errors))
 
-        if err or rc == 12:
-            exn = PayloadInstallError(err or msg)
+        if err:
+            exn = PayloadInstallError(err)
             if errorHandler.cb(exn) == ERROR_RAISE:
                 raise exn
 
@@ -167,16 +201,6 @@ class LiveImagePayload(ImagePayload):
             self.pct = 100
         threadMgr.wait(THREAD_LIVE_PROGRESS)
 
-        # Live needs to create the rescue image before bootloader is written
-        if not os.path.exists(iutil.getSysroot() + "/usr/sbin/new-kernel-pkg"):
-            log.error("new-kernel-pkg does not exist - grubby wasn't installed?  skipping")
-            return
-
-        for kernel in self.kernelVersionList:
-            log.info("Generating rescue image for %s", kernel)
-            iutil.execInSysroot("new-kernel-pkg",
-                                ["--rpmposttrans", kernel])
-
     def postInstall(self):
         """ Perform post-installation tasks. """
         progressQ.send_message(_("Performing post-installation setup tasks"))
@@ -188,13 +212,27 @@ class LiveImagePayload(ImagePayload):
         if not os.path.exists(iutil.getSysroot()+"/etc/machine-id"):
             iutil.execInSysroot("systemd-machine-id-setup", [])
 
+    def progressUnits(self):
+        if self.source_size <= 1:
+            return super(LiveImagePayload, self).progressUnits()
+
+        return {UNIT_IMAGE_BYTES: self.source_size,
+                UNIT_KERNELS: len(self.kernelVersionList)}
+
+    def _setImageUnits(self, image_bytes):
+        """ Set the size of the image the payload phase installs, keeping
+            the number of kernels progressUnits() counts on.
+        """
+        progress_units(**{UNIT_IMAGE_BYTES: image_bytes,
+                          UNIT_KERNELS: self.progressUnits().get(UNIT_KERNELS, 1)})
+
     @property
     def spaceRequired(self):
         return Size(iutil.getDirSize("/")*1024)
 
-    def _updateKernelVersionList(self):
-        files = glob.glob(INSTALL_TREE + "/boot/vmlinuz-*")
-        files.extend(glob.glob(INSTALL_TREE + "/boot/efi/EFI/%s/vmlinuz-*" % self.instclass.efi_dir))
+    def _updateKernelVersionList(self, root=INSTALL_TREE):
+        files = glob.glob(root + "/boot/vmlinuz-*")
+        files.extend(glob.glob(root + "/boot/efi/EFI/%s/vmlinuz-*" % self.instclass.efi_dir))
 
         self._kernelVersionList = sorted((f.split("/")[-1][8:] for f in files
            if os.path.isfile(f) and "-rescue-" not in f), key=functools.cmp_to_key(versionCmp))
@@ -229,6 +267,7 @@ class DownloadProgress(object):
         """
         if not bytes_read:
             return
+        progress_advance(**{UNIT_DOWNLOAD_BYTES: bytes_read})
         pct = min(100, int(100 * bytes_read / self.size))
 
         if pct == self._pct:
@@ -251,8 +290,14 @@ class LiveImageKSPayload(LiveImagePayload):
     def __init__(self, *args, **kwargs):
         super(LiveImageKSPayload, self).__init__(*args, **kwargs)
         self._min_size = 0
+        # size of the image, once setup has seen it
+        self._image_size = 0
         self._proxies = {}
         self.image_path = iutil.getSysroot()+"/disk.img"
+        # sha256 of the downloaded image
+        self._image_checksum = None
+        # root filesystem image of a LiveOS image
+        self._rootfs_image = None
 
     @property
     def is_tarfile(self):
@@ -281,7 +326,8 @@ class LiveImageKSPayload(LiveImagePayload):
             # Make a guess as to minimum size needed:
             # Enough space for image and image * 3
             if response.headers.get('content-length'):
-                self._min_size = int(response.headers.get('content-length')) * 4
+                self._image_size = int(response.headers.get('content-length'))
+                self._min_size = self._image_size * 4
         except IOError as e:
             log.error("Error opening liveimg: %s", e)
             error = e
@@ -298,7 +344,8 @@ class LiveImageKSPayload(LiveImagePayload):
         if not os.path.exists(self.data.method.url[7:]):
             return "file does not exist: %s" % self.data.method.url
 
-        self._min_size = os.stat(self.data.method.url[7:])[stat.ST_SIZE] * 3
+        self._image_size = os.stat(self.data.method.url[7:])[stat.ST_SIZE]
+        self._min_size = self._image_size * 3
         return None
 
     def setup(self, storage, instClass):
@@ -319,10 +366,118 @@ class LiveImageKSPayload(LiveImagePayload):
 
         log.debug("liveimg size is %s", self._min_size)
 
+    @property
+    def startupRequirements(self):
+        if self.data.method.url.startswith("file://"):
+            return set()
+        return {PAYLOAD_REQUIRES_NETWORK}
+
     def unsetup(self):
         # Skip LiveImagePayload's unsetup method
         ImagePayload.unsetup(self)
 
+    def _download_image(self, f, progress):
+        """ Download the image to f, resuming it if the transfer breaks.
+
+            The image is hashed as it's written, so it doesn't have to be
+            read again to verify its checksum.
+
+            :param f: file object the image is written to
+            :param progress: download progress reporting
+            :type progress: :class:`DownloadProgress`
+            :returns: sha256 hex digest of the image
+            :rtype: str
+        """
+        url = self.data.method.url
+        ssl_verify = not self.data.method.noverifyssl
+        sha256 = hashlib.sha256()
+        bytes_read = 0
+        total_length = None
+        retries = 0
+        # ETag or Last-Modified of the image, resuming is only safe with it
+        validator = None
+
+        def _start_over():
+            nonlocal sha256, bytes_read
+            sha256 = hashlib.sha256()
+            bytes_read = 0
+            f.seek(0)
+            f.truncate()
+
+        while True:
+            headers = {}
+            if bytes_read and validator:
+                headers["Range"] = "bytes=%d-" % bytes_read
+                # the server sends the whole image if it has changed
+                headers["If-Range"] = validator
+            elif bytes_read:
+                log.info("image has no ETag or Last-Modified header, starting over")
+                _start_over()
+
+            try:
+                response = self._session.get(url, proxies=self._proxies, verify=ssl_verify,
+                                             stream=True, headers=headers)
+                response.raise_for_status()
+
+                if bytes_read and response.status_code != 206:
+                    log.info("server did not resume the download, starting over")
+                    _start_over()
+                    total_length = None
+                elif bytes_read:
+                    match = re.match(r"bytes (\d+)-", response.headers.get("content-range", ""))
+                    if not match or int(match.group(1)) != bytes_read:
+                        log.warning("server resumed the download at a wrong offset (%s), starting over",
+                                    response.headers.get("content-range"))
+                        response.close()
+                        _start_over()
+                        continue
+
+                if not bytes_read:
+                    etag = response.headers.get("etag")
+                    # If-Range takes strong ETags only
+                    if etag and not etag.startswith("W/"):
+                        validator = etag
+                    else:
+                        validator = response.headers.get("last-modified")
+
+                if total_length is None and response.headers.get('content-length'):
+                    # requests return headers as strings, so convert the length to int
+                    total_length = bytes_read + int(response.headers.get('content-length'))
+                    progress.start(url, total_length)
+
+                for buf in response.iter_content(IMAGE_DOWNLOAD_CHUNK):
+                    if buf:
+                        f.write(buf)
+                        sha256.update(buf)
+                        bytes_read += len(buf)
+                        if total_length:
+                            progress.update(bytes_read)
+
+                if total_length and bytes_read < total_length:
+                    raise requests.exceptions.ConnectionError("connection closed after %d of %d bytes"
+                                                              % (bytes_read, total_length))
+                break
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout) as e:
+                retries += 1
+                if retries > IMAGE_DOWNLOAD_RETRIES:
+                    raise
+                log.warning("image download interrupted at %d bytes, resuming: %s", bytes_read, e)
+                # throw away anything written but not hashed
+                f.seek(bytes_read)
+                f.truncate()
+                sleep(retries)
+
+        if total_length is None:
+            # no content-length header, fake the progress reporting once done
+            log.warning("content-length header is missing for the installation image, "
+                        "download progress reporting will not be available")
+            progress.start(url, bytes_read)
+        progress.end(bytes_read)
+
+        return sha256.hexdigest()
+
     def _preInstall_url_image(self):
         """ Download the image using Requests with progress reporting"""
 
@@ -331,29 +486,8 @@ class LiveImageKSPayload(LiveImagePayload):
         try:
             log.info("Starting image download")
             with open(self.image_path, "wb") as f:
-                ssl_verify = not self.data.method.noverifyssl
-                response = self._session.get(self.data.method.url, proxies=self._proxies, verify=ssl_verify, stream=True)
-                total_length = response.headers.get('content-length')
-                if total_length is None:  # no content length header
-                    # just download the file in one go and fake the progress reporting once done
-                    log.warning("content-length header is missing for the installation image, "
-                                "download progress reporting will not be available")
-                    f.write(response.content)
-                    size = f.tell()
-                    progress.start(self.data.method.url, size)
-                    progress.end(size)
-                else:
-                    # requests return headers as strings, so convert total_length to int
-                    progress.start(self.data.method.url, int(total_length))
-                    bytes_read = 0
-                    for buf in response.iter_content(1024 * 1024):  # 1 MB chunks
-                        if buf:
-                            f.write(buf)
-                            f.flush()
-                            bytes_read += len(buf)
-                            progress.update(bytes_read)
-                    progress.end(bytes_read)
-                log.info("Image download finished")
+                self._image_checksum = self._download_image(f, progress)
+            log.info("Image download finished")
         except requests.exceptions.RequestException as e:
             log.error("Error downloading liveimg: %s", e)
             error = e
@@ -362,6 +496,8 @@ class LiveImageKSPayload(LiveImagePayload):
                 error = "Failed to download %s, file doesn't exist" % self.data.method.url
                 log.error(error)
 
+        return error
+
     def preInstall(self, *args, **kwargs):
         """ Get image and loopback mount it.
 
@@ -383,19 +519,20 @@ class LiveImageKSPayload(LiveImagePayload):
             if errorHandler.cb(exn) == ERROR_RAISE:
                 raise exn
 
-        # Used to make install progress % look correct
-        self._adj_size = os.stat(self.image_path)[stat.ST_SIZE]
-
         if self.data.method.checksum:
-            progressQ.send_message(_("Checking image checksum"))
-            sha256 = hashlib.sha256()
-            with open(self.image_path, "rb") as f:
-                while True:
-                    data = f.read(1024*1024)
-                    if not data:
-                        break
-                    sha256.update(data)
-            filesum = sha256.hexdigest()
+            if self._image_checksum:
+                # computed while downloading the image
+                filesum = self._image_checksum
+            else:
+                progressQ.send_message(_("Checking image checksum"))
+                sha256 = hashlib.sha256()
+                with open(self.image_path, "rb") as f:
+                    while True:
+                        data = f.read(1024*1024)
+                        if not data:
+                            break
+                        sha256.update(data)
+                filesum = sha256.hexdigest()
             log.debug("sha256 of %s is %s", self.data.method.url, filesum)
 
             if lowerASCII(self.data.method.checksum) != filesum:
@@ -441,6 +578,7 @@ class LiveImageKSPayload(LiveImagePayload):
                     raise exn
 
             img_file = IMAGE_DIR+"/LiveOS/"+os.path.basename(sorted(img_files)[0])
+            self._rootfs_image = img_file
             rc = blivet.util.mount(img_file, INSTALL_TREE, fstype="auto", options="ro")
             if rc != 0:
                 log.error("mount error (%s) with %s", rc, img_file)
@@ -455,54 +593,161 @@ class LiveImageKSPayload(LiveImagePayload):
 
     def install(self):
         """ Install the payload if it is a tar.
-            Otherwise fall back to rsync of INSTALL_TREE
+            Otherwise fall back to copying INSTALL_TREE
         """
         # If it doesn't look like a tarfile use the super's install()
         if not self.is_tarfile:
             super(LiveImageKSPayload, self).install()
             return
 
-        # Use 2x the archive's size to estimate the size of the install
-        # This is used to drive the progress display
-        self.source_size = os.stat(self.image_path)[stat.ST_SIZE] * 2
-
-        self.pct_lock = Lock()
+        # Progress is the part of the archive fed to the extraction
         self.pct = 0
-        threadMgr.add(AnacondaThread(name=THREAD_LIVE_PROGRESS,
-                                     target=self.progress))
-
-        cmd = "tar"
-        # preserve: ACL's, xattrs, and SELinux context
-        args = ["--selinux", "--acls", "--xattrs", "--xattrs-include", "*",
-                "--exclude", "/dev/", "--exclude", "/proc/",
-                "--exclude", "/sys/", "--exclude", "/run/", "--exclude", "/boot/*rescue*",
-                "--exclude", "/etc/machine-id", "-xaf", self.image_path, "-C", iutil.getSysroot()]
+        def _progress(bytes_read):
+            pct = int(100 * bytes_read / archive_size) if archive_size else 100
+            if pct != self.pct:
+                self.pct = pct
+                progressQ.send_message(_("Installing software") + (" %d%%") % (pct,))
+            progress_advance(**{UNIT_IMAGE_BYTES: bytes_read})
+
+        archive_size = os.stat(self.image_path)[stat.ST_SIZE]
+        self._setImageUnits(archive_size)
+        extractor = TarExtractor(self.image_path, callback=_progress)
         try:
-            rc = iutil.execWithRedirect(cmd, args)
-        except (OSError, RuntimeError) as e:
-            msg = None
-            err = str(e)
-            log.error(err)
-        else:
-            err = None
-            msg = "%s exited with code %d" % (cmd, rc)
-            log.info(msg)
-
-        if err:
-            exn = PayloadInstallError(err or msg)
+            extractor.extract(iutil.getSysroot(), LIVE_COPY_EXCLUDES)
+        except (OSError, TarExtractError) as e:
+            log.error("extracting %s failed: %s", self.image_path, e)
+            exn = PayloadInstallError(str(e))
             if errorHandler.cb(exn) == ERROR_RAISE:
                 raise exn
 
-        # Wait for progress thread to finish
-        with self.pct_lock:
-            self.pct = 100
-        threadMgr.wait(THREAD_LIVE_PROGRESS)
+        # the kernels of the archive are known once it's extracted
+        self._updateKernelVersionList(iutil.getSysroot())
 
         # Live needs to create the rescue image before bootloader is written
-        for kernel in self.kernelVersionList:
-            log.info("Generating rescue image for %s", kernel)
-            iutil.execInSysroot("new-kernel-pkg",
-                                ["--rpmposttrans", kernel])
+        self._generateRescueImages()
+
+    def _install_tree(self):
+        """ Write the root filesystem image to the root device if asked to,
+            copy the tree otherwise.
+        """
+        if flags.blockdeploy:
+            reason = self._block_deploy_unsupported()
+            if not reason:
+                self._deploy_block_image()
+                return
+            log.info("not deploying the image to the root device: %s", reason)
+
+        super(LiveImageKSPayload, self)._install_tree()
+
+    def _block_deploy_unsupported(self):
+        """ Return why the image can't be written to the root device, or None. """
+        if flags.dirInstall:
+            return "installing to a directory"
+        if not self._rootfs_image:
+            return "not a LiveOS image"
+
+        root = self.storage.rootDevice
+        fstype = root.format.type
+        if fstype not in BLOCK_IMAGE_FSTYPES:
+            return "%s root filesystems are not supported" % fstype
+
+        image_fstype = blkid_value(self._rootfs_image, "TYPE")
+        if image_fstype != fstype:
+            return "the image is %s, the root filesystem is %s" % (image_fstype, fstype)
+
+        if os.stat(self._rootfs_image).st_size > int(root.size):
+            return "the image is larger than %s" % root.name
+
+        if os.stat(self.image_path).st_dev == os.stat(iutil.getSysroot()).st_dev:
+            return "the image is stored on the root filesystem"
+
+        return None
+
+    def _top_mountpoints(self):
+        """ Return the mountpoints other than / not below another one. """
+        mountpoints = [mnt for mnt in self.storage.mountpoints if mnt != "/"]
+        return sorted(mnt for mnt in mountpoints
+                      if not any(mnt.startswith(other + "/") for other in mountpoints))
+
+    def _clear_shadowed_dirs(self, root):
+        """ Remove what the other filesystems will be mounted over, and what
+            the tree copy would have excluded, from the written root filesystem.
+        """
+        mountpoint = tempfile.mkdtemp(prefix="anaconda-root-")
+        try:
+            rc = blivet.util.mount(root.path, mountpoint, fstype=root.format.type)
+            if rc != 0:
+                raise BlockImageError("mount error %s with %s" % (rc, root.path))
+            try:
+                for mnt in self._top_mountpoints():
+                    for path in glob.glob(mountpoint + mnt + "/*") + glob.glob(mountpoint + mnt + "/.*"):
+                        if os.path.isdir(path) and not os.path.islink(path):
+                            shutil.rmtree(path)
+                        else:
+                            os.unlink(path)
+
+                for pattern in LIVE_COPY_EXCLUDES:
+                    if pattern.endswith("/"):
+                        continue
+                    for path in glob.glob(mountpoint + pattern):
+                        os.unlink(path)
+            finally:
+                blivet.util.umount(mountpoint)
+        finally:
+            os.rmdir(mountpoint)
+
+    def _deploy_block_image(self):
+        """ Write the root filesystem image to the root device.
+
+            The filesystem is grown to the size of the device and gets the
+            UUID and label of the root format, so the storage configuration
+            written later matches it. The other filesystems are then filled
+            from the image tree as usual.
+        """
+        root = self.storage.rootDevice
+        fstype = root.format.type
+        fs_uuid = root.format.uuid or str(uuid.uuid4())
+        log.info("writing %s to %s", self._rootfs_image, root.path)
+
+        self.pct = 0
+        def _progress(done):
+            pct = int(100 * done / writer.size) if writer.size else 100
+            if pct != self.pct:
+                self.pct = pct
+                progressQ.send_message(_("Installing software") + (" %d%%") % (pct,))
+            progress_advance(**{UNIT_IMAGE_BYTES: done})
+
+        writer = BlockImageWriter(self._rootfs_image, root.path, callback=_progress)
+        self._setImageUnits(writer.size)
+
+        self.storage.umountFilesystems(swapoff=False)
+        try:
+            writer.write()
+            grow_filesystem(fstype, root.path)
+            set_filesystem_uuid(fstype, root.path, fs_uuid, root.format.label or None)
+            root.format.uuid = fs_uuid
+            self._clear_shadowed_dirs(root)
+        except (OSError, BlockImageError) as e:
+            log.error("failed to deploy %s: %s", self._rootfs_image, e)
+            exn = PayloadInstallError(str(e))
+            if errorHandler.cb(exn) == ERROR_RAISE:
+                raise exn
+        finally:
+            self.storage.mountFilesystems()
+
+        for mnt in self._top_mountpoints():
+            if not os.path.isdir(INSTALL_TREE + mnt):
+                continue
+            excludes = [pattern[len(mnt):] for pattern in LIVE_COPY_EXCLUDES
+                        if pattern.startswith(mnt + "/")]
+            tree_copy = TreeCopy(INSTALL_TREE + mnt, iutil.getSysroot() + mnt, excludes)
+            try:
+                tree_copy.run()
+            except (OSError, TreeCopyError) as e:
+                log.error("failed to copy %s: %s", mnt, e)
+                exn = PayloadInstallError(str(e))
+                if errorHandler.cb(exn) == ERROR_RAISE:
+                    raise exn
 
     def postInstall(self):
         """ Unmount and remove image
@@ -517,6 +762,19 @@ class LiveImageKSPayload(LiveImagePayload):
         if os.path.exists(self.image_path) and not self.data.method.url.startswith("file://"):
             os.unlink(self.image_path)
 
+    def progressUnits(self):
+        """ The image is only looked into once it is downloaded, so count
+            on its size and a single kernel.
+        """
+        if not self._image_size:
+            return super(LiveImageKSPayload, self).progressUnits()
+
+        units = {UNIT_IMAGE_BYTES: self._image_size,
+                 UNIT_KERNELS: 1}
+        if not self.data.method.url.startswith("file://"):
+            units[UNIT_DOWNLOAD_BYTES] = self._image_size
+        return units
+
     @property
     def spaceRequired(self):
         """ We don't know the filesystem size until it is downloaded.
@@ -528,17 +786,3 @@ class LiveImageKSPayload(LiveImagePayload):
             return Size(self._min_size)
         else:
             return Size(1024*1024*1024)
-
-    @property
-    def kernelVersionList(self):
-        # If it doesn't look like a tarfile use the super's kernelVersionList
-        if not self.is_tarfile:
-            return super(LiveImageKSPayload, self).kernelVersionList
-
-        import tarfile
-        with tarfile.open(self.image_path) as archive:
-            names = archive.getnames()
-
-            # Strip out vmlinuz- from the names
-            return sorted((n.split("/")[-1][8:] for n in names if "boot/vmlinuz-" in n),
-                    key=functools.cmp_to_key(versionCmp))
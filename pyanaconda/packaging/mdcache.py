@@ -0,0 +1,182 @@
+# mdcache.py
+# Persistent cache of downloaded repository metadata.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""
+    A content-addressed store for repodata directories.
+
+    The payload wipes its dnf cache directory every time the base repo is
+    set up again, which happens whenever the user switches the installation
+    source. Entries in this store survive that, they are keyed by the repo
+    URL and the checksum of the repomd.xml they were downloaded with, so an
+    unchanged repo can be restored from local disk instead of downloading
+    all of its metadata again.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+from blivet.size import Size
+
+import logging
+log = logging.getLogger("packaging")
+
+REPOMD_PATH = "repodata/repomd.xml"
+
+def repomd_checksum(data):
+    """ Return the checksum used to identify a repomd.xml.
+
+        :param bytes data: contents of the repomd.xml file
+        :returns: hex digest of the contents
+        :rtype: str
+    """
+    return hashlib.sha256(data).hexdigest()
+
+class RepoMDCache(object):
+    """ Size-bounded LRU store of repodata directories. """
+
+    def __init__(self, path, max_size):
+        """
+            :param str path: directory holding the cache entries
+            :param max_size: the cache is trimmed down to this size after
+                             every new entry
+            :type max_size: :class:`blivet.size.Size`
+        """
+        self.path = path
+        self.max_size = Size(max_size)
+
+        # Metadata of several repos may be stored at the same time
+        self._lock = threading.Lock()
+
+    def _entry_path(self, url, checksum):
+        key = hashlib.sha256(("%s\0%s" % (url, checksum)).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, key)
+
+    def restore(self, url, checksum, cachedir):
+        """ Copy a cached repodata directory into a repo cache directory.
+
+            :param str url: URL of the repo
+            :param str checksum: checksum of the current remote repomd.xml
+            :param str cachedir: cache directory of the dnf repo
+            :returns: True if the metadata was restored, False on a miss
+            :rtype: bool
+        """
+        entry = self._entry_path(url, checksum)
+        repodata = os.path.join(cachedir, "repodata")
+
+        with self._lock:
+            if not os.path.isdir(entry):
+                return False
+
+            try:
+                shutil.rmtree(repodata, ignore_errors=True)
+                shutil.copytree(entry, repodata)
+            except OSError as e:
+                log.warning("failed to restore cached metadata for %s: %s", url, e)
+                shutil.rmtree(repodata, ignore_errors=True)
+                return False
+
+            try:
+                with open(os.path.join(cachedir, REPOMD_PATH), "rb") as f:
+                    restored = repomd_checksum(f.read())
+            except IOError:
+                restored = None
+
+            # A damaged entry is dropped, the metadata is downloaded again
+            if restored != checksum:
+                log.warning("cached metadata for %s is corrupted, removing it", url)
+                shutil.rmtree(repodata, ignore_errors=True)
+                shutil.rmtree(entry, ignore_errors=True)
+                return False
+
+            # Mark the entry as recently used
+            os.utime(entry, None)
+
+        log.info("metadata for %s restored from the cache", url)
+        return True
+
+    def store(self, url, cachedir):
+        """ Add the repodata of a loaded repo to the cache.
+
+            The entry is keyed by the repomd.xml actually present in the
+            cache directory, so the stored content always matches its key.
+
+            :param str url: URL of the repo
+            :param str cachedir: cache directory of the dnf repo
+        """
+        repodata = os.path.join(cachedir, "repodata")
+        try:
+            with open(os.path.join(cachedir, REPOMD_PATH), "rb") as f:
+                checksum = repomd_checksum(f.read())
+        except IOError as e:
+            log.debug("no repomd.xml to cache for %s: %s", url, e)
+            return
+
+        entry = self._entry_path(url, checksum)
+        tmp_entry = "%s.tmp-%d-%d" % (entry, os.getpid(), threading.get_ident())
+
+        with self._lock:
+            if os.path.isdir(entry):
+                os.utime(entry, None)
+                return
+
+            try:
+                os.makedirs(self.path, 0o755, exist_ok=True)
+                shutil.copytree(repodata, tmp_entry)
+                os.rename(tmp_entry, entry)
+            except OSError as e:
+                log.warning("failed to cache metadata for %s: %s", url, e)
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+                return
+
+            log.debug("metadata for %s cached as %s", url, os.path.basename(entry))
+            self._evict()
+
+    def _entries(self):
+        """ Return a list of (last use, size, path) of the cache entries. """
+        entries = []
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            if ".tmp-" in name or not os.path.isdir(path):
+                continue
+
+            size = 0
+            for (dirpath, _dirnames, filenames) in os.walk(path):
+                for filename in filenames:
+                    try:
+                        size += os.lstat(os.path.join(dirpath, filename)).st_size
+                    except OSError:
+                        pass
+            entries.append((os.stat(path).st_mtime, size, path))
+        return entries
+
+    def _evict(self):
+        """ Remove least recently used entries until the cache fits. """
+        entries = sorted(self._entries())
+        total = Size(sum(size for (_mtime, size, _path) in entries))
+
+        while entries and total > self.max_size:
+            (mtime, size, path) = entries.pop(0)
+            log.debug("evicting cached metadata %s (last used %s)",
+                      os.path.basename(path), time.ctime(mtime))
+            shutil.rmtree(path, ignore_errors=True)
+            total -= Size(size)
@@ -0,0 +1,168 @@
+# mirrors.py
+# Ranking of repository mirrors by latency.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""
+    Mirror ranking.
+
+    Instead of letting dnf pick mirrors from a mirrorlist in the order the
+    mirror manager returned them, the mirrors are probed concurrently and
+    dnf is given the list ordered by how fast they answered. Probing a
+    mirror means opening a TCP connection to it and reading the first bytes
+    of its repomd.xml.
+"""
+
+import concurrent.futures
+import socket
+import threading
+import time
+import urllib.parse
+
+import requests
+
+import logging
+log = logging.getLogger("packaging")
+
+# Only the first mirrors of a list are probed, the mirror manager already
+# returns the ones close to us first
+MIRROR_PROBE_LIMIT = 16
+MIRROR_PROBE_WORKERS = 8
+# Seconds a mirror gets to answer a probe
+MIRROR_PROBE_TIMEOUT = 5
+# Number of bytes read from repomd.xml by a probe
+MIRROR_PROBE_BYTES = 1024
+MIRROR_PROBE_PATH = "repodata/repomd.xml"
+
+def parse_mirrorlist(text):
+    """ Return the URLs of a mirrorlist.
+
+        :param str text: contents of the mirrorlist
+        :returns: list of URLs
+    """
+    mirrors = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#") and "://" in line:
+            mirrors.append(line)
+    return mirrors
+
+class MirrorRanker(object):
+    """ Probes mirrors and remembers the results per mirrorlist URL. """
+
+    def __init__(self, session):
+        """
+            :param session: session used for downloading the mirrorlists and
+                            for the probes
+            :type session: requests.Session
+        """
+        self._session = session
+        self._lock = threading.Lock()
+        # mirrorlist URL -> ranked list of mirror URLs
+        self._ranked = {}
+
+    def _connect_time(self, url):
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or socket.getservbyname(parts.scheme, "tcp")
+        start = time.monotonic()
+        with socket.create_connection((parts.hostname, port), MIRROR_PROBE_TIMEOUT):
+            return time.monotonic() - start
+
+    def probe(self, url, proxies=None, verify=True):
+        """ Return how long the mirror at url took to answer, or None.
+
+            :param str url: base URL of the mirror
+            :param dict proxies: proxies to use for the ranged read
+            :param bool verify: whether to verify SSL certificates
+            :returns: seconds or None if the mirror doesn't work
+        """
+        try:
+            if proxies:
+                # the proxy's latency is all we could measure
+                connect_time = 0
+            else:
+                connect_time = self._connect_time(url)
+
+            start = time.monotonic()
+            response = self._session.get("%s/%s" % (url.rstrip("/"), MIRROR_PROBE_PATH),
+                                         headers={"Range": "bytes=0-%d" % (MIRROR_PROBE_BYTES - 1)},
+                                         proxies=proxies, verify=verify, stream=True,
+                                         timeout=MIRROR_PROBE_TIMEOUT)
+            try:
+                if response.status_code not in (200, 206):
+                    log.debug("mirror %s returned %d", url, response.status_code)
+                    return None
+                response.raw.read(MIRROR_PROBE_BYTES)
+            finally:
+                response.close()
+            read_time = time.monotonic() - start
+        except (OSError, ValueError, requests.exceptions.RequestException) as e:
+            log.debug("mirror %s failed: %s", url, e)
+            return None
+
+        return connect_time + read_time
+
+    def rank(self, mirrors, proxies=None, verify=True):
+        """ Return the working mirrors ordered from the fastest one.
+
+            :param list mirrors: base URLs of the mirrors
+            :param dict proxies: proxies to use for the probes
+            :param bool verify: whether to verify SSL certificates
+            :returns: list of base URLs
+        """
+        candidates = [url for url in mirrors if url.startswith(("http:", "https:"))]
+        candidates = candidates[:MIRROR_PROBE_LIMIT]
+
+        with concurrent.futures.ThreadPoolExecutor(MIRROR_PROBE_WORKERS) as executor:
+            times = list(executor.map(lambda url: self.probe(url, proxies, verify), candidates))
+
+        ranked = sorted((t, i, url) for (i, (t, url)) in enumerate(zip(times, candidates))
+                        if t is not None)
+        for (t, _i, url) in ranked:
+            log.debug("mirror %s answered in %.3f s", url, t)
+        return [url for (_t, _i, url) in ranked]
+
+    def ranked_mirrors(self, mirrorlist, proxies=None, verify=True):
+        """ Return the mirrors of a mirrorlist, fastest first.
+
+            The result is remembered, the mirrors are only probed the first
+            time a mirrorlist is used.
+
+            :param str mirrorlist: URL of the mirrorlist
+            :param dict proxies: proxies to use
+            :param bool verify: whether to verify SSL certificates
+            :returns: list of base URLs, empty if the mirrorlist couldn't be
+                      downloaded or no mirror answered
+        """
+        with self._lock:
+            if mirrorlist in self._ranked:
+                return list(self._ranked[mirrorlist])
+
+        try:
+            response = self._session.get(mirrorlist, proxies=proxies, verify=verify,
+                                         timeout=MIRROR_PROBE_TIMEOUT)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            log.info("failed to download mirrorlist %s: %s", mirrorlist, e)
+            return []
+
+        ranked = self.rank(parse_mirrorlist(response.text), proxies, verify)
+        log.info("%d mirrors of %s ranked", len(ranked), mirrorlist)
+        with self._lock:
+            self._ranked[mirrorlist] = ranked
+        return list(ranked)
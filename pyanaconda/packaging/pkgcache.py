@@ -0,0 +1,138 @@
+# pkgcache.py
+# Package cache shared between installations.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""
+    A directory of downloaded packages keyed by their checksum.
+
+    The directory can be shared by any number of installations, e.g. over
+    NFS. Entries are only ever added by renaming a fully written and
+    verified file into place, and they are verified again before use, so
+    a corrupted or half-written entry is never handed out.
+"""
+
+import hashlib
+import os
+import socket
+
+import logging
+log = logging.getLogger("packaging")
+
+# Size of the chunks read when copying and verifying packages
+CHUNK_SIZE = 1024 * 1024
+
+class PackageCache(object):
+    """ Checksum-addressed store of package files. """
+
+    def __init__(self, path):
+        """
+            :param str path: directory holding the cached packages
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def _entry_path(self, checksum):
+        (checksum_type, digest) = checksum
+        return os.path.join(self.path, checksum_type, digest[:2], digest)
+
+    @staticmethod
+    def _copy(src, dst, checksum_type):
+        """ Copy src to dst and return the hex digest of the contents. """
+        digest = hashlib.new(checksum_type)
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            for chunk in iter(lambda: fsrc.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                fdst.write(chunk)
+        return digest.hexdigest()
+
+    def _tmp_path(self, path):
+        return "%s.tmp-%s-%d" % (path, socket.gethostname(), os.getpid())
+
+    def fetch(self, checksum, dest):
+        """ Copy a cached package to dest.
+
+            :param checksum: checksum type and hex digest of the package
+            :type checksum: tuple of (str, str)
+            :param str dest: path the package should be copied to
+            :returns: True on a verified cache hit, False otherwise
+            :rtype: bool
+        """
+        entry = self._entry_path(checksum)
+        if not os.path.exists(entry):
+            self.misses += 1
+            return False
+
+        tmp_dest = self._tmp_path(dest)
+        try:
+            if self._copy(entry, tmp_dest, checksum[0]) != checksum[1]:
+                log.warning("pkgcache: %s does not match its checksum, removing it", entry)
+                os.unlink(entry)
+                os.unlink(tmp_dest)
+                self.misses += 1
+                return False
+            os.rename(tmp_dest, dest)
+        except (IOError, OSError) as e:
+            log.warning("pkgcache: failed to use %s: %s", entry, e)
+            if os.path.exists(tmp_dest):
+                os.unlink(tmp_dest)
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        return True
+
+    def store(self, checksum, src):
+        """ Add a downloaded package to the cache.
+
+            The package is only added if its contents match the checksum.
+
+            :param checksum: checksum type and hex digest of the package
+            :type checksum: tuple of (str, str)
+            :param str src: path of the downloaded package
+        """
+        entry = self._entry_path(checksum)
+        if os.path.exists(entry):
+            return
+
+        tmp_entry = self._tmp_path(entry)
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            if self._copy(src, tmp_entry, checksum[0]) != checksum[1]:
+                log.warning("pkgcache: %s does not match its checksum, not caching it", src)
+                os.unlink(tmp_entry)
+                return
+            # another installation may have stored the same package meanwhile,
+            # both copies are identical so it doesn't matter which one wins
+            os.rename(tmp_entry, entry)
+        except (IOError, OSError) as e:
+            log.warning("pkgcache: failed to store %s: %s", src, e)
+            if os.path.exists(tmp_entry):
+                os.unlink(tmp_entry)
+            return
+
+        self.stored += 1
+
+    def log_stats(self):
+        """ Log how much the cache was used. """
+        total = self.hits + self.misses
+        log.info("pkgcache %s: %d hits, %d misses (%d%% hit rate), %d packages stored",
+                 self.path, self.hits, self.misses,
+                 (100 * self.hits // total) if total else 0, self.stored)
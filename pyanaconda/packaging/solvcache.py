@@ -0,0 +1,125 @@
+# solvcache.py
+# Prebuilt libsolv caches of installation media repos.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""
+    Prebuilt solv files shipped next to a repo.
+
+    When hawkey loads a repo into the sack, it first looks for the
+    <repo id>.solv and <repo id>-filenames.solvx files in the sack's cache
+    directory and uses them instead of parsing the repo metadata if the
+    checksum stored at their end is the sha256 of the repo's repomd.xml.
+    A compose can generate these files once and put them in a solv/
+    directory of the repo as repo.solv and repo-filenames.solvx. They are
+    validated the same way here and copied to the cache directory under
+    the id the repo has in the installer; files that don't match are left
+    alone and hawkey parses the metadata as usual. Files in a format the
+    installer's libsolv can't read are not used either.
+"""
+
+import hashlib
+import os
+import shutil
+import struct
+
+import logging
+log = logging.getLogger("packaging")
+
+# Directory of a repo holding its prebuilt solv files
+SOLV_CACHE_DIR = "solv"
+# Names of the prebuilt files and of their copies in the sack's cache
+SOLV_CACHE_FILES = (("repo.solv", "%s.solv"),
+                    ("repo-filenames.solvx", "%s-filenames.solvx"))
+SOLV_MAGIC = b"SOLV"
+# The format version following the magic, the only one libsolv reads
+SOLV_VERSION = 8
+# hawkey appends the sha256 digest of repomd.xml to the files
+SOLV_CHECKSUM_SIZE = 32
+
+def solv_file_matches(path, repomd_digest):
+    """ Return whether the solv file at path was built from a repomd.xml.
+
+        :param str path: path of the .solv or .solvx file
+        :param bytes repomd_digest: sha256 digest of the repomd.xml
+        :rtype: bool
+    """
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(SOLV_MAGIC)) != SOLV_MAGIC:
+                return False
+            version = f.read(4)
+            if len(version) != 4 or struct.unpack(">I", version)[0] != SOLV_VERSION:
+                return False
+            f.seek(-SOLV_CHECKSUM_SIZE, os.SEEK_END)
+            return f.read(SOLV_CHECKSUM_SIZE) == repomd_digest
+    except (IOError, OSError):
+        return False
+
+def install_solv_cache(repo_dir, repomd_fn, repo_id, cachedir):
+    """ Copy valid prebuilt solv files of a repo to the sack's cache.
+
+        :param str repo_dir: local directory of the repo
+        :param str repomd_fn: the repomd.xml hawkey is going to load
+        :param str repo_id: id of the repo in the installer
+        :param str cachedir: cache directory of the sack
+        :returns: whether the main solv file was installed
+        :rtype: bool
+    """
+    solv_dir = os.path.join(repo_dir, SOLV_CACHE_DIR)
+    if not os.path.isdir(solv_dir):
+        return False
+
+    with open(repomd_fn, "rb") as f:
+        repomd_digest = hashlib.sha256(f.read()).digest()
+
+    installed = []
+    for (name, cache_name) in SOLV_CACHE_FILES:
+        src = os.path.join(solv_dir, name)
+        if not os.path.exists(src):
+            break
+        if not solv_file_matches(src, repomd_digest):
+            log.info("prebuilt %s of %s does not match its metadata, not using it", name, repo_id)
+            # the extensions depend on the main file
+            break
+
+        dest = os.path.join(cachedir, cache_name % repo_id)
+        try:
+            os.makedirs(cachedir, exist_ok=True)
+            shutil.copyfile(src, dest + ".tmp")
+            os.rename(dest + ".tmp", dest)
+        except (IOError, OSError) as e:
+            log.warning("failed to install prebuilt %s of %s: %s", name, repo_id, e)
+            break
+        installed.append(name)
+
+    if installed:
+        log.info("using prebuilt %s of %s", ", ".join(installed), repo_id)
+    return bool(installed)
+
+def remove_solv_cache(repo_id, cachedir):
+    """ Remove the solv files of a repo from the sack's cache.
+
+        :param str repo_id: id of the repo in the installer
+        :param str cachedir: cache directory of the sack
+    """
+    for (_name, cache_name) in SOLV_CACHE_FILES:
+        try:
+            os.unlink(os.path.join(cachedir, cache_name % repo_id))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,186 @@
+# tarextract.py
+# Extraction of compressed tar archives.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""
+    Streaming extraction of tar archives.
+
+    The archive is read by anaconda and fed through a decompressor,
+    picked by the magic bytes of the archive and multi-threaded where
+    possible, into tar. Progress is the number of compressed bytes fed
+    to the pipeline, so the size of the archive is all that's needed to
+    know how far the extraction got.
+"""
+
+import shutil
+import signal
+import subprocess
+import tempfile
+
+from pyanaconda import iutil
+
+import logging
+log = logging.getLogger("packaging")
+
+# Size of the chunks the archive is read in
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+
+# Magic bytes of compressed archives and the commands able to decompress
+# them to stdout, the preferred (parallel) ones first
+DECOMPRESSORS = ((b"\xfd7zXZ\x00", (["xz", "-d", "-c", "-T0"],)),
+                 (b"\x28\xb5\x2f\xfd", (["zstd", "-d", "-c", "-q"],)),
+                 (b"\x1f\x8b", (["pigz", "-d", "-c"], ["gzip", "-d", "-c"])),
+                 (b"BZh", (["lbzip2", "-d", "-c"], ["bzip2", "-d", "-c"])))
+
+# tar options preserving the SELinux contexts, ACLs and xattrs
+TAR_PRESERVE_ARGS = ["--selinux", "--acls", "--xattrs", "--xattrs-include=*"]
+
+class TarExtractError(Exception):
+    pass
+
+def decompressor_command(path):
+    """ Return the command decompressing the archive at path, or None.
+
+        :param str path: path of the archive
+        :returns: argv of the decompressor or None if the archive is not
+                  compressed
+        :raises: TarExtractError if no decompressor is available
+    """
+    with open(path, "rb") as f:
+        magic = f.read(8)
+
+    for (prefix, commands) in DECOMPRESSORS:
+        if magic.startswith(prefix):
+            for command in commands:
+                if shutil.which(command[0]):
+                    return command
+            raise TarExtractError("no %s command to decompress %s" % (commands[-1][0], path))
+
+    return None
+
+class TarExtractor(object):
+    """ Runs tar on the decompressed contents of an archive. """
+
+    def __init__(self, archive, callback=None):
+        """
+            :param str archive: path of the archive
+            :param callback: function called with the number of compressed
+                             bytes read so far
+        """
+        self.archive = archive
+        self.callback = callback
+        self.bytes_read = 0
+
+    def _run(self, tar_args, stdout):
+        """ Feed the archive to tar started with tar_args. """
+        decompressor = decompressor_command(self.archive)
+        log.info("extracting %s with %s", self.archive,
+                 " ".join(decompressor) if decompressor else "tar only")
+
+        self.bytes_read = 0
+        # whether the pipeline stopped reading before the end of the archive
+        stopped = False
+        with tempfile.TemporaryFile() as errors:
+            procs = []
+            try:
+                if decompressor:
+                    procs.append(iutil.startProgram(decompressor, stdin=subprocess.PIPE,
+                                                    stdout=subprocess.PIPE, stderr=errors))
+                    tar_stdin = procs[0].stdout
+                else:
+                    tar_stdin = subprocess.PIPE
+
+                procs.append(iutil.startProgram(["tar"] + tar_args + ["-f", "-"],
+                                                stdin=tar_stdin, stdout=stdout, stderr=errors))
+                if decompressor:
+                    # only tar reads the decompressed data
+                    procs[0].stdout.close()
+                # the archive goes to the first process of the pipeline
+                sink = procs[0].stdin
+
+                try:
+                    with open(self.archive, "rb") as f:
+                        for chunk in iter(lambda: f.read(ARCHIVE_CHUNK_SIZE), b""):
+                            sink.write(chunk)
+                            self.bytes_read += len(chunk)
+                            if self.callback:
+                                self.callback(self.bytes_read)
+                    sink.close()
+                except BrokenPipeError:
+                    # the return codes say what went wrong
+                    log.error("%s stopped reading %s", procs[0].args[0], self.archive)
+                    stopped = True
+            finally:
+                for proc in procs:
+                    if proc.stdin and not proc.stdin.closed:
+                        try:
+                            proc.stdin.close()
+                        except BrokenPipeError:
+                            pass
+                    proc.wait()
+
+            errors.seek(0)
+            messages = errors.read().decode("utf-8", "replace").strip()
+            if messages:
+                log.warning("extracting %s:\n%s", self.archive, messages)
+
+        tar = procs[-1]
+        decompressors = procs[:-1]
+        # tar stopped reading before the end of the archive: the decompressor
+        # got SIGPIPE or the archive couldn't be fed to tar, so tar's error is
+        # the one to report
+        if decompressors:
+            tar_stopped = any(proc.returncode == -signal.SIGPIPE for proc in decompressors)
+        else:
+            tar_stopped = stopped
+        if tar.returncode < 0 or (tar.returncode != 0 and tar_stopped):
+            raise TarExtractError("tar exited with code %d" % tar.returncode)
+        for proc in decompressors:
+            if proc.returncode != 0:
+                raise TarExtractError("%s exited with code %d" % (proc.args[0], proc.returncode))
+        # Like tarfile's extractall() and the tar command used before, tar
+        # failing to set the owner, mode or xattrs of some files, as it does
+        # on a vfat /boot/efi, is not a reason to stop the installation once
+        # it has read the whole archive. The errors are logged above.
+        if tar.returncode != 0:
+            log.warning("tar exited with code %d extracting %s", tar.returncode, self.archive)
+
+    def extract(self, dest, excludes=None):
+        """ Extract the archive.
+
+            :param str dest: directory to extract the archive to
+            :param excludes: tar patterns of paths not to extract
+            :type excludes: list of str
+            :raises: TarExtractError if extracting failed, OSError if the
+                     archive couldn't be read
+        """
+        args = list(TAR_PRESERVE_ARGS)
+        for pattern in excludes or []:
+            args += ["--exclude", pattern]
+        self._run(args + ["-x", "-C", dest], subprocess.DEVNULL)
+
+    def names(self):
+        """ Return the names of the members of the archive.
+
+            :raises: TarExtractError if listing the archive failed
+        """
+        with tempfile.TemporaryFile() as listing:
+            self._run(["-t"], listing)
+            listing.seek(0)
+            return listing.read().decode("utf-8", "replace").splitlines()
@@ -37,6 +37,7 @@ except ImportError:
     tarfile = None
 
 from pyanaconda.packaging import ArchivePayload, PayloadError, versionCmp
+from pyanaconda.packaging.tarextract import TarExtractor, TarExtractError
 from pyanaconda import iutil
 
 # TarPayload is not yet fully implemented
@@ -80,7 +81,7 @@ class TarPayload(ArchivePayload):
 
     def install(self):
         try:
-            self.archive.extractall(path=iutil.getSysroot())
-        except (tarfile.ExtractError, tarfile.CompressionError) as e:
+            TarExtractor(self.image_file).extract(iutil.getSysroot())
+        except (OSError, TarExtractError) as e:
             log.error("extracting tar archive %s: %s", self.image_file, e)
 
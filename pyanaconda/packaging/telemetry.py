@@ -0,0 +1,174 @@
+# telemetry.py
+# Statistics of package downloads.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+import collections
+import json
+import time
+
+import logging
+log = logging.getLogger("packaging")
+
+# Weight of the newest sample in the moving average of the throughput
+THROUGHPUT_SMOOTHING = 0.3
+# Minimal length of a throughput sample in seconds
+THROUGHPUT_SAMPLE_INTERVAL = 1.0
+
+class DownloadSourceStats(object):
+    """ Download statistics of a repo or a mirror. """
+
+    def __init__(self):
+        self.bytes = 0
+        self.files = 0
+        self.failures = 0
+        self.seconds = 0.0
+
+    def to_dict(self):
+        return {"bytes": self.bytes,
+                "files": self.files,
+                "failures": self.failures,
+                "seconds": round(self.seconds, 3),
+                "bytes_per_second": int(self.bytes / self.seconds) if self.seconds else None}
+
+class DownloadTelemetry(object):
+    """ Running totals, throughput and ETA of a set of downloads.
+
+        Downloads are identified by an arbitrary hashable key. All the
+        totals are updated incrementally, so every callback is O(1).
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self.total_files = 0
+        self.total_size = 0
+        self.downloaded = 0
+        self.finished_files = 0
+        self.failed_files = 0
+        self.repos = collections.defaultdict(DownloadSourceStats)
+        self.mirrors = collections.defaultdict(DownloadSourceStats)
+
+        # bytes done and start time of each running download
+        self._done = {}
+        self._started = {}
+
+        self._start_time = None
+        self._end_time = None
+        self._sample_time = None
+        self._sample_bytes = 0
+        self.throughput = None
+
+    def start(self, total_files, total_size):
+        """ Start a new set of downloads. """
+        self.total_files = total_files
+        self.total_size = total_size
+        self._start_time = self._sample_time = self._clock()
+
+    def progress(self, key, done):
+        """ Record that download key has done bytes so far. """
+        if key not in self._started:
+            self._started[key] = self._clock()
+
+        self.downloaded += done - self._done.get(key, 0)
+        self._done[key] = done
+        self._sample()
+
+    def end(self, key, size, repo, mirror, success):
+        """ Record the end of download key.
+
+            :param key: key of the download
+            :param int size: size of the downloaded file
+            :param str repo: id of the repo the file comes from
+            :param str mirror: the mirror the file was downloaded from
+            :param bool success: whether the download succeeded
+        """
+        now = self._clock()
+        seconds = now - self._started.pop(key, now)
+        done = self._done.pop(key, 0)
+
+        for stats in (self.repos[repo], self.mirrors[mirror]):
+            stats.seconds += seconds
+            if success:
+                stats.files += 1
+                stats.bytes += size
+            else:
+                stats.failures += 1
+                stats.bytes += done
+
+        if success:
+            self.downloaded += size - done
+            self.finished_files += 1
+        else:
+            # the file will have to be downloaded again
+            self.downloaded -= done
+            self.failed_files += 1
+
+        self._end_time = now
+        self._sample()
+
+    def _sample(self):
+        now = self._clock()
+        elapsed = now - self._sample_time
+        if elapsed < THROUGHPUT_SAMPLE_INTERVAL:
+            return
+
+        # failed downloads make the total go back
+        rate = max(0, self.downloaded - self._sample_bytes) / elapsed
+        if self.throughput is None:
+            self.throughput = rate
+        else:
+            self.throughput = THROUGHPUT_SMOOTHING * rate + \
+                              (1 - THROUGHPUT_SMOOTHING) * self.throughput
+        self._sample_time = now
+        self._sample_bytes = self.downloaded
+
+    @property
+    def percent(self):
+        if not self.total_size:
+            return 0
+        return int(100 * self.downloaded / self.total_size)
+
+    @property
+    def eta(self):
+        """ Estimated number of seconds until all downloads are done, or None. """
+        if not self.throughput:
+            return None
+        return max(0, self.total_size - self.downloaded) / self.throughput
+
+    def summary(self):
+        """ Return the statistics as a dictionary. """
+        elapsed = None
+        if self._start_time is not None:
+            elapsed = round((self._end_time or self._clock()) - self._start_time, 3)
+
+        return {"total_files": self.total_files,
+                "total_bytes": self.total_size,
+                "downloaded_bytes": self.downloaded,
+                "finished_files": self.finished_files,
+                "failed_files": self.failed_files,
+                "seconds": elapsed,
+                "repos": {repo: stats.to_dict() for (repo, stats) in self.repos.items()},
+                "mirrors": {mirror: stats.to_dict() for (mirror, stats) in self.mirrors.items()}}
+
+    def write_summary(self, path):
+        """ Write the statistics to path as JSON. """
+        try:
+            with open(path, "w") as f:
+                json.dump(self.summary(), f, indent=2, sort_keys=True)
+        except IOError as e:
+            log.warning("failed to write download statistics to %s: %s", path, e)
@@ -0,0 +1,332 @@
+# treecopy.py
+# Parallel copy of a directory tree.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""
+    Copy a directory tree the way rsync -pogAXtlHrDx does.
+
+    The tree is walked by a single thread, which creates the directories,
+    symlinks and special files right away and hands the regular files over
+    to a pool of workers. File data is copied in the kernel: by reflinking
+    the file if the filesystems allow it, with copy_file_range() or with
+    sendfile() otherwise. Owners, permissions, modification times and
+    extended attributes (which also carry the ACLs and SELinux contexts)
+    are preserved, hardlinks are recreated and filesystem boundaries are
+    not crossed.
+"""
+
+import concurrent.futures
+import errno
+import fcntl
+import fnmatch
+import os
+import stat
+import threading
+
+import logging
+log = logging.getLogger("packaging")
+
+# ioctl number of FICLONE from linux/fs.h
+FICLONE = 0x40049409
+# Size of the pieces files are copied in, for progress reporting
+COPY_CHUNK = 8 * 1024 * 1024
+# Default number of workers copying file data
+COPY_WORKERS = 8
+# Number of files queued for each worker before the walk waits for them
+QUEUED_PER_WORKER = 64
+
+# Errors that make it pointless to go on copying
+FATAL_ERRNOS = (errno.ENOSPC, errno.EDQUOT, errno.EROFS, errno.EIO)
+
+class TreeCopyError(Exception):
+    pass
+
+def _copy_xattrs(src, dst):
+    """ Copy the extended attributes of src to dst (a path or a fd). """
+    follow = not isinstance(dst, str)
+    try:
+        names = os.listxattr(src, follow_symlinks=False)
+    except OSError as e:
+        if e.errno in (errno.ENOTSUP, errno.EOPNOTSUPP):
+            return
+        raise
+
+    for name in names:
+        try:
+            os.setxattr(dst, name, os.getxattr(src, name, follow_symlinks=False),
+                        follow_symlinks=follow)
+        except OSError as e:
+            if e.errno in FATAL_ERRNOS:
+                raise
+            log.debug("failed to copy xattr %s of %s: %s", name, src, e)
+
+def _copy_data(src_fd, dst_fd, size, report):
+    """ Copy size bytes from src_fd to dst_fd, calling report(bytes) on the way. """
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        report(size)
+        return
+    except OSError:
+        pass
+
+    copied = 0
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range:
+        try:
+            while copied < size:
+                n = copy_file_range(src_fd, dst_fd, min(COPY_CHUNK, size - copied))
+                if n == 0:
+                    return
+                copied += n
+                report(n)
+            return
+        except OSError as e:
+            # not supported between these filesystems, try sendfile
+            if copied or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+
+    while copied < size:
+        n = os.sendfile(dst_fd, src_fd, copied, min(COPY_CHUNK, size - copied))
+        if n == 0:
+            return
+        copied += n
+        report(n)
+
+class TreeCopy(object):
+    """ A copy of a directory tree. """
+
+    def __init__(self, src, dst, excludes=None, workers=COPY_WORKERS):
+        """
+            :param str src: the directory to copy
+            :param str dst: the directory to copy the contents of src to
+            :param excludes: rsync-like patterns of paths not to copy, anchored
+                             at src; patterns ending with / only match
+                             directories and wildcards don't match /
+            :type excludes: list of str
+            :param int workers: number of threads copying file data
+        """
+        self.src = src.rstrip("/") or "/"
+        self.dst = dst
+        self.excludes = excludes or []
+        self.workers = workers
+
+        self._lock = threading.Lock()
+        self._failed = threading.Event()
+        # bounds the number of files submitted to the workers but not copied yet
+        self._queued = threading.BoundedSemaphore(workers * QUEUED_PER_WORKER)
+        # the first exception raised by a worker
+        self._worker_error = None
+        self.bytes_copied = 0
+        self.files_copied = 0
+        self.errors = []
+
+    def _report(self, nbytes, nfiles=0):
+        with self._lock:
+            self.bytes_copied += nbytes
+            self.files_copied += nfiles
+
+    def _error(self, path, e):
+        log.error("failed to copy %s: %s", path, e)
+        with self._lock:
+            self.errors.append((path, e))
+        if isinstance(e, OSError) and e.errno in FATAL_ERRNOS:
+            self._failed.set()
+            raise TreeCopyError("failed to copy %s: %s" % (path, e))
+
+    @staticmethod
+    def _match(relpath, pattern):
+        """ Match relpath against pattern one path component at a time. """
+        names = relpath.split("/")
+        parts = pattern.split("/")
+        if len(names) != len(parts):
+            return False
+        return all(fnmatch.fnmatchcase(name, part) for (name, part) in zip(names, parts))
+
+    def _excluded(self, relpath, is_dir):
+        for pattern in self.excludes:
+            if pattern.endswith("/"):
+                if is_dir and self._match(relpath, pattern[:-1]):
+                    return True
+            elif self._match(relpath, pattern):
+                return True
+        return False
+
+    @staticmethod
+    def _make_room(dst, st):
+        """ Remove whatever is at dst unless it's a directory we can reuse. """
+        try:
+            dst_st = os.lstat(dst)
+        except FileNotFoundError:
+            return
+        if stat.S_ISDIR(dst_st.st_mode) and stat.S_ISDIR(st.st_mode):
+            return
+        if stat.S_ISDIR(dst_st.st_mode):
+            os.rmdir(dst)
+        else:
+            os.unlink(dst)
+
+    @staticmethod
+    def _set_attrs(src, dst, st):
+        """ Set the owner, mode, xattrs and times of dst (not a symlink). """
+        os.lchown(dst, st.st_uid, st.st_gid)
+        os.chmod(dst, stat.S_IMODE(st.st_mode))
+        _copy_xattrs(src, dst)
+        os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    def _copy_file(self, src, dst, st):
+        if self._failed.is_set():
+            return
+        try:
+            self._make_room(dst, st)
+            with open(src, "rb") as fsrc:
+                fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                try:
+                    _copy_data(fsrc.fileno(), fd, st.st_size, self._report)
+                    # chown before chmod, it clears the setuid/setgid bits
+                    os.fchown(fd, st.st_uid, st.st_gid)
+                    os.fchmod(fd, stat.S_IMODE(st.st_mode))
+                    _copy_xattrs(src, fd)
+                    os.utime(fd, ns=(st.st_atime_ns, st.st_mtime_ns))
+                finally:
+                    os.close(fd)
+            self._report(0, 1)
+        except OSError as e:
+            self._error(src, e)
+
+    def _copy_done(self, future):
+        """ Let the walk queue another file, remember the first error. """
+        self._queued.release()
+        e = future.exception()
+        if e is not None:
+            with self._lock:
+                if self._worker_error is None:
+                    self._worker_error = e
+            self._failed.set()
+
+    def _copy_special(self, src, dst, st):
+        """ Copy a symlink, device, fifo or socket. """
+        self._make_room(dst, st)
+        if stat.S_ISLNK(st.st_mode):
+            os.symlink(os.readlink(src), dst)
+            os.lchown(dst, st.st_uid, st.st_gid)
+            _copy_xattrs(src, dst)
+            os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns), follow_symlinks=False)
+        else:
+            os.mknod(dst, st.st_mode, st.st_rdev)
+            self._set_attrs(src, dst, st)
+        self._report(0, 1)
+
+    def run(self):
+        """ Copy the tree.
+
+            Errors with single files are logged and collected in the errors
+            attribute, errors like running out of space stop the copy.
+
+            :raises: TreeCopyError if the copy couldn't be finished
+        """
+        root_dev = os.lstat(self.src).st_dev
+        # directories whose attributes are set after their contents are copied
+        dirs = []
+        # (dev, ino) -> destination of the first copy of a hardlinked file
+        inodes = {}
+        # (target, link) of hardlinks created once all the files are copied
+        links = []
+
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            self._walk(executor, root_dev, dirs, inodes, links)
+
+        # raise the first fatal error of the workers, if any
+        if self._worker_error is not None:
+            raise self._worker_error
+
+        for (target, link) in links:
+            try:
+                self._make_room(link, os.lstat(target))
+                os.link(target, link)
+                self._report(0, 1)
+            except OSError as e:
+                self._error(link, e)
+
+        # deepest first, so that creating entries doesn't change the times
+        for (src, dst, st) in reversed(dirs):
+            try:
+                self._set_attrs(src, dst, st)
+            except OSError as e:
+                self._error(src, e)
+
+        log.info("copied %d files, %d bytes from %s to %s, %d errors",
+                 self.files_copied, self.bytes_copied, self.src, self.dst, len(self.errors))
+
+    def _walk(self, executor, root_dev, dirs, inodes, links):
+        st = os.lstat(self.src)
+        os.makedirs(self.dst, exist_ok=True)
+        dirs.append((self.src, self.dst, st))
+
+        stack = [""]
+        while stack:
+            # a worker hit an error that stops the copy
+            if self._failed.is_set():
+                return
+
+            reldir = stack.pop()
+            srcdir = self.src + reldir if self.src != "/" else reldir or "/"
+            try:
+                entries = list(os.scandir(srcdir))
+            except OSError as e:
+                self._error(srcdir, e)
+                continue
+
+            for entry in entries:
+                if self._failed.is_set():
+                    return
+
+                relpath = reldir + "/" + entry.name
+                src = entry.path
+                dst = self.dst + relpath
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                    is_dir = stat.S_ISDIR(st.st_mode)
+                    if self._excluded(relpath, is_dir):
+                        continue
+
+                    if is_dir:
+                        self._make_room(dst, st)
+                        os.makedirs(dst, exist_ok=True)
+                        dirs.append((src, dst, st))
+                        # the mountpoint is copied, but not what's mounted on it
+                        if st.st_dev == root_dev:
+                            stack.append(relpath)
+                    elif stat.S_ISREG(st.st_mode):
+                        if st.st_nlink > 1:
+                            key = (st.st_dev, st.st_ino)
+                            if key in inodes:
+                                links.append((inodes[key], dst))
+                                continue
+                            inodes[key] = dst
+                        # don't let the walk get too far ahead of the workers
+                        self._queued.acquire()
+                        if self._failed.is_set():
+                            self._queued.release()
+                            return
+                        future = executor.submit(self._copy_file, src, dst, st)
+                        future.add_done_callback(self._copy_done)
+                    else:
+                        self._copy_special(src, dst, st)
+                except OSError as e:
+                    self._error(src, e)
@@ -0,0 +1,123 @@
+# treeinfo.py
+# Cached retrieval of .treeinfo files.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+import configparser
+import threading
+import time
+
+import requests
+
+import logging
+log = logging.getLogger("packaging")
+
+# Names the treeinfo file of a tree may have, in the order they are tried
+TREEINFO_NAMES = (".treeinfo", "treeinfo")
+# Seconds a downloaded treeinfo is used without asking the server again
+TREEINFO_MAX_AGE = 60
+
+class TreeInfoEntry(object):
+    """ A downloaded treeinfo file. """
+
+    def __init__(self, url, text, etag=None, last_modified=None):
+        self.url = url
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched = time.monotonic()
+
+        self.config = configparser.ConfigParser()
+        self.config.read_string(text, source=url)
+
+class TreeInfoCache(object):
+    """ Downloads the treeinfo of trees and keeps them parsed.
+
+        Once fetched, a treeinfo is revalidated with a conditional request
+        when it's older than TREEINFO_MAX_AGE and only downloaded again if
+        it changed on the server.
+    """
+
+    def __init__(self, session):
+        """
+            :param session: session used for the downloads
+            :type session: requests.Session
+        """
+        self._session = session
+        self._lock = threading.Lock()
+        # tree URL -> TreeInfoEntry
+        self._entries = {}
+
+    def _fetch(self, url, headers, proxies, verify, entry):
+        """ Return the entry for the treeinfo at url, fetching it if needed. """
+        headers = dict(headers)
+        if entry:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        response = self._session.get(url, headers=headers, proxies=proxies, verify=verify)
+        if entry and response.status_code == 304:
+            log.debug("treeinfo %s not modified", url)
+            entry.fetched = time.monotonic()
+            return entry
+
+        response.raise_for_status()
+        return TreeInfoEntry(url, response.text,
+                             response.headers.get("ETag"),
+                             response.headers.get("Last-Modified"))
+
+    def get(self, url, headers=None, proxies=None, verify=True):
+        """ Return the treeinfo of the tree at url.
+
+            :param str url: URL of the tree
+            :param dict headers: additional headers of the requests
+            :param dict proxies: proxies to use
+            :param bool verify: whether to verify SSL certificates
+            :returns: the treeinfo entry
+            :rtype: :class:`TreeInfoEntry`
+            :raises: requests.exceptions.RequestException if the treeinfo
+                     couldn't be downloaded, configparser.Error if it
+                     couldn't be parsed
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry and time.monotonic() - entry.fetched < TREEINFO_MAX_AGE:
+            return entry
+
+        if entry:
+            names = [entry.url]
+        else:
+            names = ["%s/%s" % (url, name) for name in TREEINFO_NAMES]
+
+        error = None
+        for name in names:
+            try:
+                new_entry = self._fetch(name, headers or {}, proxies, verify, entry)
+            except requests.exceptions.RequestException as e:
+                error = e
+                continue
+
+            with self._lock:
+                self._entries[url] = new_entry
+            return new_entry
+
+        with self._lock:
+            self._entries.pop(url, None)
+        raise error
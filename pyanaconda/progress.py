@@ -24,8 +24,11 @@ import logging
 log = logging.getLogger("anaconda")
 
 from contextlib import contextmanager
+import threading
+import time
 
 from pyanaconda.queuefactory import QueueFactory
+from pyanaconda.timeline import timeline, SPAN_PROGRESS
 
 # A queue to be used for communicating progress information between a subthread
 # doing all the hard work and the main thread that does the GTK updates.  This
@@ -41,6 +44,16 @@ progressQ.addMessage("step", 0)
 progressQ.addMessage("message", 1)          # message
 progressQ.addMessage("complete", 0)
 progressQ.addMessage("quit", 1)             # exit_code
+progressQ.addMessage("fraction", 2)         # fraction done, seconds remaining
+
+# Seconds between fraction messages sent while a phase advances
+PROGRESS_FRACTION_INTERVAL = 0.5
+
+# The ProgressModel the progress bar follows, see progressmodel.py
+_model = None
+_model_phase = None
+_model_lock = threading.Lock()
+_model_sent = 0.0
 
 # Surround a block of code with progress updating.  Before the code runs, the
 # message is updated so the user can tell what's about to take so long.
@@ -48,7 +61,8 @@ progressQ.addMessage("quit", 1)             # exit_code
 @contextmanager
 def progress_report(message):
     progress_message(message)
-    yield
+    with timeline.span(message, SPAN_PROGRESS):
+        yield
     progress_step("%s -- DONE" % message)
 
 def progress_message(message):
@@ -64,3 +78,65 @@ def progress_init(steps):
 
 def progress_complete():
     progressQ.send_complete()
+
+def progress_model_init(model):
+    """ Make the progress bar follow a ProgressModel, None to stop. """
+    global _model, _model_phase
+    with _model_lock:
+        _model = model
+        _model_phase = None
+    if model:
+        _send_fraction(force=True)
+
+def _send_fraction(force=False):
+    global _model_sent
+    with _model_lock:
+        if not _model:
+            return
+        now = time.monotonic()
+        if not force and now - _model_sent < PROGRESS_FRACTION_INTERVAL:
+            return
+        _model_sent = now
+        (fraction, eta) = (_model.fraction, _model.eta)
+    progressQ.send_fraction(fraction, eta)
+
+# Surround a phase of the progress model with this.  Work done in the phase
+# can be reported with progress_advance.
+@contextmanager
+def progress_phase(name):
+    global _model_phase
+    with _model_lock:
+        if _model:
+            _model.start(name)
+            _model_phase = name
+    yield
+    with _model_lock:
+        if _model:
+            _model.finish(name)
+            _model_phase = None
+    _send_fraction(force=True)
+
+def progress_advance(**done):
+    """ Report the amounts of work of the current phase done so far.
+
+        :param done: amounts by the UNIT_* units of progressmodel.py
+    """
+    with _model_lock:
+        if not _model or not _model_phase:
+            return
+        _model.advance(_model_phase, **done)
+    _send_fraction()
+
+def progress_units(**units):
+    """ Update amounts of work of the current phase once they are known better.
+
+        The progress bar doesn't go back if the work grows, it waits for
+        the work done to catch up.
+
+        :param units: amounts by the UNIT_* units of progressmodel.py
+    """
+    with _model_lock:
+        if not _model or not _model_phase:
+            return
+        _model.set_units(_model_phase, **units)
+    _send_fraction(force=True)
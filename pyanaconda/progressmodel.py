@@ -0,0 +1,270 @@
+# progressmodel.py
+# Weighted model of the installation progress.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""
+    Progress of the installation weighted by the work it has to do.
+
+    The installation is split into phases and every phase is given the
+    amounts of work it has to do in some units: bytes to format, packages
+    and their size, kernels to generate an initramfs for and so on. The
+    weight of a phase is the number of seconds the work is estimated to
+    take, computed from default per-unit rates and a calibration factor
+    of the phase. The factors are measured at the end of an installation
+    as the ratio of the real and the estimated duration and recorded per
+    hardware, so that later installations on the same hardware get a bar
+    moving at a steady pace and an ETA close to reality.
+"""
+
+from collections import OrderedDict
+import json
+import os
+import time
+
+import logging
+log = logging.getLogger("anaconda")
+
+# Units of work
+UNIT_STEPS = "steps"
+UNIT_FORMATS = "formats"
+UNIT_FORMAT_BYTES = "format_bytes"
+UNIT_DOWNLOAD_BYTES = "download_bytes"
+UNIT_PACKAGES = "packages"
+UNIT_PACKAGE_BYTES = "package_bytes"
+UNIT_IMAGE_BYTES = "image_bytes"
+UNIT_KERNELS = "kernels"
+
+# Seconds a unit of work is estimated to take without calibration
+DEFAULT_RATES = {
+    UNIT_STEPS: 2.0,
+    UNIT_FORMATS: 3.0,
+    UNIT_FORMAT_BYTES: 1.0 / (2 * 1024 ** 3),
+    UNIT_DOWNLOAD_BYTES: 1.0 / (10 * 1024 ** 2),
+    UNIT_PACKAGES: 0.1,
+    UNIT_PACKAGE_BYTES: 1.0 / (50 * 1024 ** 2),
+    UNIT_IMAGE_BYTES: 1.0 / (100 * 1024 ** 2),
+    UNIT_KERNELS: 20.0,
+}
+
+# Calibration data shipped in an updates or product image or in anaconda,
+# the first file with data of the hardware wins
+PROGRESS_CALIBRATION_FILES = ("/tmp/updates/progress-calibration.json",
+                              "/tmp/product/progress-calibration.json",
+                              "/usr/share/anaconda/progress-calibration.json")
+# Where the factors measured by this installation are recorded
+PROGRESS_CALIBRATION_RECORD = "/tmp/anaconda.progress-calibration.json"
+# Hardware id of the factors used when there are none for the hardware
+DEFAULT_HARDWARE_ID = "default"
+# Weight of a new measurement when merged with recorded factors
+CALIBRATION_SMOOTHING = 0.5
+# Calibration factors are kept within these bounds
+CALIBRATION_BOUNDS = (0.05, 20.0)
+# Seconds of work done before the ETA is corrected by the measured pace
+ETA_MIN_ELAPSED = 10.0
+
+def _estimate(units):
+    return sum(amount * DEFAULT_RATES.get(unit, 0.0) for (unit, amount) in units.items())
+
+class ProgressPhase(object):
+    """ A phase of the installation and the work it has to do. """
+
+    def __init__(self, name, units):
+        self.name = name
+        self.units = dict(units)
+        self.done = {}
+        self.start_time = None
+        self.end_time = None
+
+    @property
+    def estimate(self):
+        """ Seconds the work of the phase takes with the default rates. """
+        return _estimate(self.units)
+
+    @property
+    def fraction(self):
+        """ Part of the work of the phase done. """
+        if self.end_time is not None:
+            return 1.0
+        estimate = self.estimate
+        if not estimate:
+            return 0.0
+        done = {unit: min(amount, self.units.get(unit, 0)) for (unit, amount) in self.done.items()}
+        return min(1.0, _estimate(done) / estimate)
+
+class ProgressModel(object):
+    """ Phases of an installation weighted by their calibrated estimates. """
+
+    def __init__(self, factors=None, clock=time.monotonic):
+        """
+            :param factors: calibration factors of the phases by their names
+            :type factors: dict of str to float
+            :param clock: function returning the current time in seconds
+        """
+        self._factors = factors or {}
+        self._clock = clock
+        self._phases = OrderedDict()
+        # the bar never goes back, even if the work grows
+        self._fraction_shown = 0.0
+
+    def add_phase(self, name, **units):
+        """ Add a phase with the amounts of work it has to do.
+
+            :param str name: name of the phase
+            :param units: amounts of work by the UNIT_* units
+        """
+        self._phases[name] = ProgressPhase(name, units)
+
+    def set_units(self, name, **units):
+        """ Replace the amounts of work of a phase once they are known better.
+
+            Units the phase has already advanced in are kept unless given.
+        """
+        phase = self._phases[name]
+        phase.units = {unit: amount for (unit, amount) in phase.units.items() if unit in phase.done}
+        phase.units.update(units)
+
+    def weight(self, name):
+        phase = self._phases[name]
+        return phase.estimate * self._factors.get(name, 1.0)
+
+    def start(self, name):
+        self._phases[name].start_time = self._clock()
+
+    def advance(self, name, **done):
+        """ Set the amounts of work of a phase done so far. """
+        self._phases[name].done.update(done)
+
+    def finish(self, name):
+        phase = self._phases[name]
+        if phase.start_time is None:
+            phase.start_time = self._clock()
+        phase.end_time = self._clock()
+
+    def _weights(self):
+        total = 0.0
+        done = 0.0
+        for name in self._phases:
+            weight = self.weight(name)
+            total += weight
+            done += weight * self._phases[name].fraction
+        return (done, total)
+
+    @property
+    def fraction(self):
+        """ Part of the whole installation done, never less than before. """
+        (done, total) = self._weights()
+        if total:
+            self._fraction_shown = max(self._fraction_shown, min(1.0, done / total))
+        return self._fraction_shown
+
+    @property
+    def eta(self):
+        """ Seconds the rest of the installation is expected to take. """
+        (done, total) = self._weights()
+        remaining = max(0.0, total - done)
+        now = self._clock()
+        elapsed = sum((phase.end_time or now) - phase.start_time
+                      for phase in self._phases.values() if phase.start_time is not None)
+        # correct the estimate by the pace the phases so far went at
+        if elapsed >= ETA_MIN_ELAPSED and done:
+            remaining *= elapsed / done
+        return remaining
+
+    def measured_factors(self):
+        """ Return the calibration factors measured for the finished phases. """
+        factors = {}
+        (low, high) = CALIBRATION_BOUNDS
+        for phase in self._phases.values():
+            if phase.end_time is None or not phase.estimate:
+                continue
+            duration = phase.end_time - phase.start_time
+            factors[phase.name] = min(high, max(low, duration / phase.estimate))
+        return factors
+
+def hardware_id():
+    """ Return an id of the hardware anaconda runs on.
+
+        The CPU model, the number of CPUs and the amount of memory in GiB
+        are what the speed of an installation depends on the most.
+    """
+    model = "unknown"
+    memory = 0
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    model = " ".join(line.split(":", 1)[1].split())
+                    break
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    memory = int(line.split()[1]) // (1024 * 1024)
+                    break
+    except (IOError, ValueError) as e:
+        log.debug("failed to read the hardware details: %s", e)
+
+    return "%s/%d/%dG" % (model, os.cpu_count() or 1, memory)
+
+def _read_calibration(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (IOError, ValueError) as e:
+        if os.path.exists(path):
+            log.warning("failed to read progress calibration from %s: %s", path, e)
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def load_calibration(hwid, paths=PROGRESS_CALIBRATION_FILES):
+    """ Return the calibration factors of the hardware.
+
+        :param str hwid: id of the hardware
+        :param paths: files to look for the factors in
+        :returns: factors of the phases by their names
+        :rtype: dict of str to float
+    """
+    fallback = {}
+    for path in paths:
+        data = _read_calibration(path)
+        if hwid in data:
+            log.info("using progress calibration of %s from %s", hwid, path)
+            return data[hwid]
+        if not fallback and DEFAULT_HARDWARE_ID in data:
+            fallback = data[DEFAULT_HARDWARE_ID]
+    return fallback
+
+def record_calibration(hwid, factors, path=PROGRESS_CALIBRATION_RECORD):
+    """ Merge measured calibration factors of the hardware into a file.
+
+        :param str hwid: id of the hardware
+        :param factors: measured factors of the phases by their names
+        :param str path: the file to record the factors to
+    """
+    data = _read_calibration(path)
+    recorded = data.setdefault(hwid, {})
+    for (name, factor) in factors.items():
+        if name in recorded:
+            factor = (1 - CALIBRATION_SMOOTHING) * recorded[name] + CALIBRATION_SMOOTHING * factor
+        recorded[name] = round(factor, 4)
+
+    try:
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+    except IOError as e:
+        log.warning("failed to record progress calibration to %s: %s", path, e)
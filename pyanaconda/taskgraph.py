@@ -0,0 +1,134 @@
+# taskgraph.py
+# Concurrent execution of steps with declared resources.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""
+    Running a list of steps concurrently where it is safe.
+
+    Every step declares the resources it reads and the ones it writes.
+    Resources are paths (a path also covers everything below it) or plain
+    names of things like services the steps talk to. A step waits for all
+    the earlier steps of the list it conflicts with, i.e. the ones that
+    write something it reads or writes or read something it writes, so
+    the result is the same as if the steps ran one after another in the
+    order of the list.
+"""
+
+import concurrent.futures
+import time
+
+import logging
+log = logging.getLogger("anaconda")
+
+# Maximal number of steps running at once
+STEP_WORKERS = 4
+
+def _resources_overlap(first, second):
+    """ Whether two resources are the same or one path is below the other. """
+    if first == second:
+        return True
+    return first.startswith(second.rstrip("/") + "/") or \
+           second.startswith(first.rstrip("/") + "/")
+
+def _sets_overlap(first, second):
+    return any(_resources_overlap(a, b) for a in first for b in second)
+
+class Step(object):
+    """ A function together with the resources it uses. """
+
+    def __init__(self, name, func, reads=(), writes=()):
+        """
+            :param str name: name of the step, for the logs
+            :param func: function doing the step, called without arguments
+            :param reads: resources the step reads
+            :param writes: resources the step writes
+        """
+        self.name = name
+        self.func = func
+        self.reads = frozenset(reads)
+        self.writes = frozenset(writes)
+
+    def conflicts(self, other):
+        """ Whether this step and the other one can't run at the same time. """
+        return _sets_overlap(self.writes, other.reads | other.writes) or \
+               _sets_overlap(other.writes, self.reads)
+
+    def run(self):
+        start = time.monotonic()
+        log.debug("running step %s", self.name)
+        try:
+            self.func()
+        finally:
+            log.debug("step %s took %.2f s", self.name, time.monotonic() - start)
+
+    def __repr__(self):
+        return "Step(%s)" % self.name
+
+def run_steps(steps, max_workers=STEP_WORKERS):
+    """ Run the steps, the independent ones concurrently.
+
+        When a step raises an exception, no more steps are started, the
+        running ones are waited for and the exception of the failed step
+        that comes first in the list is raised again.
+
+        :param steps: the steps in the order they would run one by one
+        :type steps: list of Step
+        :param int max_workers: maximal number of steps running at once
+    """
+    steps = list(steps)
+    if not steps:
+        return
+
+    # earlier steps each step has to wait for
+    waits_for = [set(j for j in range(i) if steps[i].conflicts(steps[j]))
+                 for i in range(len(steps))]
+    pending = list(range(len(steps)))
+    finished = set()
+    running = {}
+    errors = {}
+
+    max_workers = max(1, min(max_workers, len(steps)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        while True:
+            if not errors:
+                for i in list(pending):
+                    if len(running) >= max_workers:
+                        break
+                    if waits_for[i] <= finished:
+                        pending.remove(i)
+                        running[executor.submit(steps[i].run)] = i
+
+            if not running:
+                break
+
+            (done, _not_done) = concurrent.futures.wait(running,
+                                    return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                exn = future.exception()
+                if exn is not None:
+                    log.error("step %s failed: %s", steps[i].name, exn)
+                    errors[i] = exn
+                else:
+                    finished.add(i)
+
+    if errors:
+        if pending:
+            log.error("steps not run: %s", ", ".join(steps[i].name for i in pending))
+        raise errors[min(errors)]
@@ -24,6 +24,8 @@ log = logging.getLogger("anaconda")
 
 import threading
 
+from pyanaconda.timeline import timeline, SPAN_THREAD
+
 _WORKER_THREAD_PREFIX = "AnaWorkerThread"
 
 class ThreadManager(object):
@@ -249,6 +251,7 @@ class AnacondaThread(threading.Thread):
         import sys
 
         log.info("Running Thread: %s (%s)", self.name, self.ident)
+        span = timeline.start(self.name, SPAN_THREAD)
         try:
             threading.Thread.run(self, *args, **kwargs)
         # pylint: disable=bare-except
@@ -258,6 +261,7 @@ class AnacondaThread(threading.Thread):
             else:
                 threadMgr.set_error(self.name, *sys.exc_info())
         finally:
+            span.finish()
             threadMgr.remove(self.name)
             log.info("Thread Done: %s (%s)", self.name, self.ident)
 
@@ -0,0 +1,169 @@
+# timeline.py
+# Timeline of the installation.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+"""
+    A record of where the installation spends its time.
+
+    Progress steps, threads, external programs, payload phases and storage
+    actions record spans with their start and end times, the thread they
+    ran in and the CPU time they used. The spans are written out in the
+    Chrome trace event format, so a timeline can be loaded into
+    chrome://tracing or any other viewer of the format and timelines of
+    installations on different hardware can be compared.
+
+    The CPU time of a span is the CPU time of its thread. Spans of external
+    programs get the CPU time of the child processes reaped while they ran
+    instead, which includes other programs finishing at the same time.
+"""
+
+from contextlib import contextmanager
+import json
+import os
+import resource
+import threading
+import time
+
+import logging
+log = logging.getLogger("anaconda")
+
+# Where the timeline is written at the end of the installation
+TIMELINE_FILE = "/tmp/anaconda.timeline.json"
+
+# Spans recorded at most, so that a runaway loop can't eat the memory
+TIMELINE_MAX_SPANS = 100000
+
+# Categories of the spans
+SPAN_PROGRESS = "progress"
+SPAN_THREAD = "thread"
+SPAN_PROGRAM = "program"
+SPAN_PAYLOAD = "payload"
+SPAN_STORAGE = "storage"
+
+def _thread_cpu_time():
+    return time.clock_gettime(time.CLOCK_THREAD_CPUTIME_ID)
+
+def _children_cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+class Span(object):
+    """ A started span, recorded in the timeline when finished. """
+
+    def __init__(self, timeline, name, category, args, cpu_clock):
+        self._timeline = timeline
+        self._cpu_clock = cpu_clock
+        self.name = name
+        self.category = category
+        self.args = args
+        self.thread = threading.current_thread()
+        self.start = time.monotonic()
+        self.cpu_start = cpu_clock()
+        self.finished = False
+
+    def finish(self, **args):
+        """ End the span, the arguments are added to the recorded ones. """
+        if self.finished:
+            return
+        self.finished = True
+        self.args.update(args)
+        self._timeline.record(self, time.monotonic(), self._cpu_clock())
+
+class Timeline(object):
+    """ Spans recorded by all the threads of anaconda. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._epoch = time.monotonic()
+        self._wall_epoch = time.time()
+        self._events = []
+        self._threads = {}
+        self.dropped = 0
+
+    def start(self, name, category, **args):
+        """ Start a span in the current thread.
+
+            :param str name: name of the span
+            :param str category: one of the SPAN_* categories
+            :param args: details shown with the span
+            :returns: the span, call its finish method when it ends
+            :rtype: Span
+        """
+        cpu_clock = _children_cpu_time if category == SPAN_PROGRAM else _thread_cpu_time
+        return Span(self, name, category, args, cpu_clock)
+
+    @contextmanager
+    def span(self, name, category, **args):
+        """ Record the code run in the with block as a span. """
+        span = self.start(name, category, **args)
+        try:
+            yield span
+        except BaseException as e:
+            span.finish(error=type(e).__name__)
+            raise
+        finally:
+            span.finish()
+
+    def record(self, span, end, cpu_end):
+        event = {"name": span.name,
+                 "cat": span.category,
+                 "ph": "X",
+                 "ts": int((span.start - self._epoch) * 1000000),
+                 "dur": int((end - span.start) * 1000000),
+                 "pid": os.getpid(),
+                 "tid": span.thread.ident,
+                 "args": dict(span.args, cpu_ms=round((cpu_end - span.cpu_start) * 1000, 3))}
+
+        with self._lock:
+            if len(self._events) >= TIMELINE_MAX_SPANS:
+                self.dropped += 1
+                return
+            self._events.append(event)
+            self._threads[span.thread.ident] = span.thread.name
+
+    def trace(self):
+        """ Return the timeline as a dictionary in the Chrome trace format. """
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+            dropped = self.dropped
+
+        pid = os.getpid()
+        metadata = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                     "args": {"name": "anaconda"}}]
+        for (tid, name) in sorted(threads.items()):
+            metadata.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                             "args": {"name": name}})
+
+        return {"traceEvents": metadata + sorted(events, key=lambda e: e["ts"]),
+                "displayTimeUnit": "ms",
+                "otherData": {"start_time": self._wall_epoch,
+                              "cpu_count": os.cpu_count(),
+                              "dropped_spans": dropped}}
+
+    def write(self, path):
+        """ Write the timeline to path, readable only by root like the logs. """
+        try:
+            with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+                json.dump(self.trace(), f)
+        except (IOError, OSError) as e:
+            log.warning("failed to write the timeline to %s: %s", path, e)
+
+# The timeline of this anaconda process
+timeline = Timeline()
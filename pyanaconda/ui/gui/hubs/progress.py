@@ -32,7 +32,7 @@ import os
 import sys
 import glob
 
-from pyanaconda.i18n import _, C_
+from pyanaconda.i18n import _, C_, P_
 from pyanaconda.localization import find_best_locale_match
 from pyanaconda.product import productName
 from pyanaconda.flags import flags
@@ -60,6 +60,7 @@ class ProgressHub(Hub):
 
         self._totalSteps = 0
         self._currentStep = 0
+        self._modelled = False
         self._configurationDone = False
 
         self._rnotes_id = None
@@ -111,6 +112,8 @@ class ProgressHub(Hub):
                 self._step_progress_bar()
             elif code == progressQ.PROGRESS_CODE_MESSAGE:
                 self._update_progress_message(args[0])
+            elif code == progressQ.PROGRESS_CODE_FRACTION:
+                self._set_progress_fraction(args[0], args[1])
             elif code == progressQ.PROGRESS_CODE_COMPLETE:
                 q.task_done()
 
@@ -276,15 +279,30 @@ class ProgressHub(Hub):
     def _init_progress_bar(self, steps):
         self._totalSteps = steps
         self._currentStep = 0
+        self._modelled = False
 
         gtk_call_once(self._progressBar.set_fraction, 0.0)
+        gtk_call_once(self._progressBar.set_show_text, False)
 
     def _step_progress_bar(self):
         if not self._totalSteps:
             return
 
         self._currentStep += 1
-        gtk_call_once(self._progressBar.set_fraction, self._currentStep/self._totalSteps)
+        # the fraction messages of a progress model move the bar instead
+        if not self._modelled:
+            gtk_call_once(self._progressBar.set_fraction, self._currentStep/self._totalSteps)
+
+    def _set_progress_fraction(self, fraction, eta):
+        self._modelled = True
+        gtk_call_once(self._progressBar.set_fraction, fraction)
+        if eta is not None and fraction < 1.0:
+            minutes = max(1, int(round(eta / 60)))
+            gtk_call_once(self._progressBar.set_text,
+                          P_("About %d minute remaining", "About %d minutes remaining", minutes) % minutes)
+            gtk_call_once(self._progressBar.set_show_text, True)
+        else:
+            gtk_call_once(self._progressBar.set_show_text, False)
 
     def _update_progress_message(self, message):
         if not self._totalSteps:
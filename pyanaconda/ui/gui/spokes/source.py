@@ -689,6 +689,7 @@ class SourceSpoke(NormalSpoke, GUISpokeInputCheckHandler):
         payloadMgr.addListener(payloadMgr.STATE_GROUP_MD, self._downloading_group_md)
         payloadMgr.addListener(payloadMgr.STATE_FINISHED, self._payload_finished)
         payloadMgr.addListener(payloadMgr.STATE_ERROR, self._payload_error)
+        payloadMgr.addRepoListener(self._repo_md_state)
 
     def _payload_refresh(self):
         hubQ.send_not_ready("SoftwareSelectionSpoke")
@@ -715,6 +716,16 @@ class SourceSpoke(NormalSpoke, GUISpokeInputCheckHandler):
     def _downloading_group_md(self):
         hubQ.send_message(self.__class__.__name__, _(constants.PAYLOAD_STATUS_GROUP_MD))
 
+    def _repo_md_state(self, repo_id, state, error):
+        if state == payloadMgr.REPO_STATE_FAILED:
+            log.info("metadata download failed for repo %s: %s", repo_id, error)
+
+        states = payloadMgr.repoStates
+        done = len([s for (s, _err) in states.values()
+                    if s in (payloadMgr.REPO_STATE_LOADED, payloadMgr.REPO_STATE_FAILED)])
+        hubQ.send_message(self.__class__.__name__,
+                          _(constants.PAYLOAD_STATUS_REPO_MD) % {"done": done, "total": len(states)})
+
     def _payload_finished(self):
         hubQ.send_ready("SoftwareSelectionSpoke", False)
         hubQ.send_ready(self.__class__.__name__, False)
@@ -18,7 +18,6 @@
 #
 # Red Hat Author(s): David Lehman <dlehman@redhat.com>
 #
-import os
 from blivet.size import Size
 from pyanaconda import iutil
 
@@ -103,8 +102,7 @@ class DirInstallSpaceChecker(FileSystemSpaceChecker):
                             in the info bar at the bottom of a Hub.
         """
         self.reset()
-        stat = os.statvfs(iutil.getSysroot())
-        free = Size(stat.f_bsize * stat.f_bfree)
+        free = Size(iutil.path_free_space(iutil.getSysroot()))
         needed = self.payload.spaceRequired
         log.info("fs space: %s  needed: %s", free, needed)
         self.success = (free > needed)
@@ -0,0 +1,51 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging.blockimage import BlockImageWriter, IMAGE_BLOCK_SIZE
+import os
+import shutil
+import tempfile
+import unittest
+
+class BlockImageWriterTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.image = os.path.join(self.tmpdir, "rootfs.img")
+        self.device = os.path.join(self.tmpdir, "device")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def sparse_write_test(self):
+        """Test writing a sparse image"""
+        with open(self.image, "wb") as f:
+            f.write(b"superblock")
+            f.seek(3 * IMAGE_BLOCK_SIZE)
+            f.write(bytes(IMAGE_BLOCK_SIZE))
+            f.write(b"inodes")
+        with open(self.device, "wb") as f:
+            f.write(b"garbage" * 1000)
+
+        progress = []
+        writer = BlockImageWriter(self.image, self.device, callback=progress.append)
+        writer.write()
+
+        with open(self.image, "rb") as image, open(self.device, "rb") as device:
+            self.assertEqual(image.read(), device.read())
+        self.assertLess(writer.bytes_written, writer.size)
+        self.assertEqual(progress[-1], writer.size)
@@ -0,0 +1,93 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda import chrootserver
+from pyanaconda.chrootserver import ChrootClient
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+@unittest.skipIf(os.geteuid() != 0, "chroot must be run as root")
+class ChrootServerTests(unittest.TestCase):
+    def setUp(self):
+        # a chroot with a shell and the libraries it needs
+        self.root = tempfile.mkdtemp()
+        shell = shutil.which("sh")
+        libs = subprocess.check_output(["ldd", shell]).decode("utf-8").split()
+        for path in [shell] + [lib for lib in libs if lib.startswith("/")]:
+            real = os.path.realpath(path)
+            for dest in (path, real):
+                os.makedirs(os.path.dirname(self.root + dest), exist_ok=True)
+                if not os.path.exists(self.root + dest):
+                    shutil.copy2(real, self.root + dest)
+        os.makedirs(self.root + "/bin", exist_ok=True)
+        if not os.path.exists(self.root + "/bin/sh"):
+            os.symlink(shell, self.root + "/bin/sh")
+
+        proc = subprocess.Popen([sys.executable, "-I", chrootserver.__file__, self.root],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.client = ChrootClient(proc, self.root)
+        self.client.wait_ready()
+
+    def tearDown(self):
+        self.client.close()
+        shutil.rmtree(self.root)
+
+    def _run(self, argv, env, filter_stderr=False):
+        out = []
+        err = []
+        rc = self.client.run(argv, env, out.append, err.append if filter_stderr else None)
+        return (rc, b"".join(out), b"".join(err) if filter_stderr else None)
+
+    def run_test(self):
+        """Test running commands in the chroot server."""
+        (rc, out, err) = self._run(["/bin/sh", "-c", "echo $FOO; test -e %s" % self.root],
+                                   {"FOO": "bar"})
+        self.assertEqual(rc, 1)
+        self.assertEqual(out, b"bar\n")
+        self.assertIsNone(err)
+
+        (rc, out, err) = self._run(["/bin/sh", "-c", "echo out; echo err >&2; exit 3"],
+                                   {}, filter_stderr=True)
+        self.assertEqual((rc, out, err), (3, b"out\n", b"err\n"))
+
+        (rc, out, err) = self._run(["/bin/sh", "-c", "echo out; echo err >&2"], {})
+        self.assertEqual(rc, 0)
+        self.assertEqual(sorted(out.splitlines()), [b"err", b"out"])
+
+        with self.assertRaises(FileNotFoundError):
+            self._run(["/usr/bin/missing"], {})
+        self.assertTrue(self.client.alive)
+
+    def stream_test(self):
+        """Test streaming the output line by line."""
+        lines = []
+        rc = self.client.run(["/bin/sh", "-c", "echo one; echo two"], {}, lines.append)
+        self.assertEqual((rc, lines), (0, [b"one\n", b"two\n"]))
+
+    def callback_error_test(self):
+        """Test a failing callback leaving the helper usable."""
+        def _fail(data):
+            raise IOError("write failed")
+
+        with self.assertRaises(IOError):
+            self.client.run(["/bin/sh", "-c", "echo one; echo two"], {}, _fail)
+        self.assertEqual(self._run(["/bin/sh", "-c", "echo three"], {}), (0, b"three\n", None))
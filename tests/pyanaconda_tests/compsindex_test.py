@@ -0,0 +1,71 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging.compsindex import CompsIndex
+from collections import namedtuple
+import unittest
+
+Group = namedtuple("Group", ["id", "ui_name", "ui_description", "visible"])
+GroupId = namedtuple("GroupId", ["name", "default"])
+Environment = namedtuple("Environment", ["id", "ui_name", "ui_description", "group_ids", "option_ids"])
+
+class Comps(object):
+    def __init__(self, groups, environments):
+        self._groups = groups
+        self.environments = environments
+
+    def groups_iter(self):
+        return iter(self._groups)
+
+class CompsIndexTests(unittest.TestCase):
+    def setUp(self):
+        groups = [Group("core", "Core", "", False),
+                  Group("gnome-desktop", "GNOME", "The GNOME desktop", True),
+                  Group("office", "Office", "", True),
+                  Group("games", "Games", "", True)]
+        environments = [Environment("workstation", "Workstation", "A workstation",
+                                    [GroupId("core", False), GroupId("gnome-desktop", False)],
+                                    [GroupId("office", True), GroupId("games", False),
+                                     GroupId("missing", True)])]
+        self.index = CompsIndex(Comps(groups, environments))
+
+    def lookup_test(self):
+        """Test looking up environments and groups"""
+        self.assertEqual(self.index.environments, ["workstation"])
+        self.assertEqual(self.index.groups, ["core", "gnome-desktop", "office", "games"])
+        self.assertEqual(self.index.environment("Workstation").id, "workstation")
+        self.assertIsNone(self.index.environment("server"))
+        self.assertEqual(self.index.group("gnome-desktop").description, "The GNOME desktop")
+
+    def options_test(self):
+        """Test the optional groups of an environment"""
+        env = self.index.environment("workstation")
+        self.assertTrue(self.index.has_option(env, "office"))
+        self.assertTrue(self.index.has_option(env, "missing"))
+        self.assertFalse(self.index.has_option(env, "core"))
+        self.assertTrue(self.index.option_is_default(env, "office"))
+        self.assertFalse(self.index.option_is_default(env, "games"))
+        self.assertTrue(self.index.option_is_default(env, "missing"))
+        self.assertFalse(self.index.option_is_default(env, "core"))
+        self.assertEqual(self.index.addons(env), (["office", "games"], ["gnome-desktop"]))
+
+    def empty_test(self):
+        """Test an index without comps"""
+        index = CompsIndex()
+        self.assertEqual(index.environments, [])
+        self.assertEqual(index.groups, [])
@@ -0,0 +1,131 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging.depsolvecache import DepsolveCache, selection_fingerprint
+from collections import namedtuple
+import unittest
+
+Group = namedtuple("Group", ["name", "include"])
+
+class Packages(object):
+    def __init__(self, **kwargs):
+        self.default = False
+        self.environment = "server"
+        self.groupList = [Group("core", 1)]
+        self.excludedGroupList = []
+        self.packageList = ["vim", "tmux"]
+        self.excludedList = []
+        self.nocore = False
+        self.multiLib = False
+        self.handleMissing = 0
+        self.__dict__.update(kwargs)
+
+class Base(object):
+    """A dnf.Base with only the transaction state."""
+    def __init__(self):
+        self._goal = None
+        self._transaction = None
+        self._comps_trans = None
+        self._group_persistor = None
+
+    def resolve(self, name):
+        self._goal = "goal-" + name
+        self._transaction = "transaction-" + name
+        self._comps_trans = "comps-" + name
+        self._group_persistor = "persistor-" + name
+
+    @property
+    def transaction(self):
+        return self._transaction
+
+class OldBase(object):
+    """A dnf.Base keeping the transaction elsewhere."""
+    transaction = None
+
+def _fingerprint(packages, repos=(("fedora", ("http://a/",), None, None),)):
+    return selection_fingerprint(packages, None, ["en_US.UTF-8"], ["kernel"], [], [], repos)
+
+class SelectionFingerprintTests(unittest.TestCase):
+    def same_selection_test(self):
+        """Test the fingerprint of an unchanged selection"""
+        self.assertEqual(_fingerprint(Packages()),
+                         _fingerprint(Packages(packageList=["tmux", "vim", "vim"])))
+
+    def changed_selection_test(self):
+        """Test the fingerprint of a changed selection"""
+        fingerprint = _fingerprint(Packages())
+        self.assertNotEqual(fingerprint, _fingerprint(Packages(packageList=["vim"])))
+        self.assertNotEqual(fingerprint, _fingerprint(Packages(excludedList=["tmux"])))
+        self.assertNotEqual(fingerprint, _fingerprint(Packages(groupList=[Group("core", 2)])))
+        self.assertNotEqual(fingerprint, _fingerprint(Packages(environment="workstation")))
+        self.assertNotEqual(fingerprint, _fingerprint(Packages(), repos=()))
+
+class DepsolveCacheTests(unittest.TestCase):
+    def restore_test(self):
+        """Test restoring transactions after the selection changed"""
+        cache = DepsolveCache()
+        base = Base()
+        first = _fingerprint(Packages())
+        second = _fingerprint(Packages(packageList=["vim"]))
+
+        base.resolve("first")
+        cache.save(base, first)
+        base.resolve("second")
+        cache.save(base, second)
+
+        self.assertTrue(cache.restore(base, first))
+        self.assertEqual((base._goal, base.transaction, base._comps_trans, base._group_persistor),
+                         ("goal-first", "transaction-first", "comps-first", "persistor-first"))
+        self.assertTrue(cache.restore(base, second))
+        self.assertEqual(base.transaction, "transaction-second")
+        self.assertFalse(cache.restore(base, _fingerprint(Packages(packageList=[]))))
+
+    def eviction_test(self):
+        """Test forgetting the least recently used transactions"""
+        cache = DepsolveCache(size=2)
+        base = Base()
+        for name in ("a", "b", "c"):
+            base.resolve(name)
+            cache.save(base, name)
+
+        self.assertFalse(cache.restore(base, "a"))
+        self.assertTrue(cache.restore(base, "b"))
+        self.assertTrue(cache.restore(base, "c"))
+
+    def changed_dnf_test(self):
+        """Test resolving again when dnf.Base has changed"""
+        cache = DepsolveCache()
+        cache.save(OldBase(), "a")
+        self.assertFalse(cache.enabled)
+        self.assertFalse(cache.restore(OldBase(), "a"))
+
+    def unused_state_test(self):
+        """Test resolving again when dnf ignores the restored state"""
+        class CopyingBase(Base):
+            @property
+            def transaction(self):
+                return str(self._transaction)
+
+        cache = DepsolveCache()
+        base = CopyingBase()
+        base.resolve("a")
+        base._transaction = ["a"]
+        cache.save(base, "a")
+
+        self.assertFalse(cache.restore(base, "a"))
+        self.assertFalse(cache.enabled)
@@ -0,0 +1,103 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging import dnfpayload
+from pyanaconda.packaging.dnfpayload import PayloadRPMDisplay, do_transaction
+from mock import patch
+import queue
+import unittest
+
+class Package(object):
+    def __init__(self, name):
+        self.name = name
+        self.arch = "x86_64"
+        self.evr = "1.0-1"
+        self.buildtime = 0
+
+    def returnIdSum(self):
+        return ("sha256", "0" * 64)
+
+class Base(object):
+    """A dnf.Base installing the given number of packages."""
+    def __init__(self, count, fail=False):
+        self.count = count
+        self.fail = fail
+
+    def do_transaction(self, display):
+        for i in range(self.count):
+            display.event(Package("pkg%d" % i), display.PKG_INSTALL, 0, 100, i + 1, self.count)
+        if self.fail:
+            raise RuntimeError("transaction failed")
+        display.event(None, display.TRANS_POST, 0, 0, 0, 0)
+
+def _messages(q):
+    messages = []
+    while not q.empty():
+        messages.append(q.get())
+    return messages
+
+class PayloadRPMDisplayTests(unittest.TestCase):
+    @patch("pyanaconda.packaging.dnfpayload.RPM_PROGRESS_INTERVAL", 3600)
+    def batching_test(self):
+        """Test sending the transaction progress in batches"""
+        q = queue.Queue()
+        do_transaction(Base(dnfpayload.RPM_PROGRESS_BATCH + 6), q)
+        messages = _messages(q)
+
+        self.assertEqual([token for (token, _msg) in messages],
+                         ["progress", "progress", "post", "quit"])
+        (install_msg, log_msgs) = messages[0][1]
+        self.assertEqual(len(log_msgs), dnfpayload.RPM_PROGRESS_BATCH)
+        self.assertEqual(install_msg, "pkg63.x86_64 (64/70)")
+        (install_msg, log_msgs) = messages[1][1]
+        self.assertEqual(len(log_msgs), 6)
+        self.assertEqual(install_msg, "pkg69.x86_64 (70/70)")
+
+    @patch("pyanaconda.packaging.dnfpayload.RPM_PROGRESS_INTERVAL", 0.05)
+    def timer_test(self):
+        """Test sending the progress while the next package takes long"""
+        q = queue.Queue()
+        display = PayloadRPMDisplay(q)
+
+        # no other event comes to flush the progress
+        display.event(Package("first"), display.PKG_INSTALL, 0, 100, 1, 2)
+        self.assertEqual(q.get(timeout=5), ("progress", ("first.x86_64 (1/2)", [
+            "Installed: first-1.0-1.x86_64 0 " + "0" * 64])))
+
+        display.event(Package("second"), display.PKG_INSTALL, 0, 100, 2, 2)
+        self.assertEqual(q.get(timeout=5)[1][0], "second.x86_64 (2/2)")
+
+    def failure_test(self):
+        """Test quitting without post when the transaction fails"""
+        q = queue.Queue()
+        do_transaction(Base(3, fail=True), q)
+        messages = _messages(q)
+
+        self.assertEqual([token for (token, _msg) in messages], ["progress", "quit"])
+        self.assertEqual(len(messages[0][1][1]), 3)
+        self.assertIn("transaction failed", messages[-1][1])
+
+    @patch("pyanaconda.packaging.dnfpayload.PayloadRPMDisplay", side_effect=RuntimeError("no display"))
+    def display_failure_test(self, _display):
+        """Test quitting when the display can't be created"""
+        q = queue.Queue()
+        do_transaction(Base(3), q)
+        messages = _messages(q)
+
+        self.assertEqual([token for (token, _msg) in messages], ["quit"])
+        self.assertIn("no display", messages[0][1])
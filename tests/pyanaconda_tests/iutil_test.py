@@ -25,6 +25,8 @@ import os
 import tempfile
 import signal
 import shutil
+import errno
+from mock import patch
 from .test_constants import ANACONDA_TEST_DIR
 
 from timer import timer
@@ -85,6 +87,33 @@ class RunProgramTests(unittest.TestCase):
         self.assertEqual(retcode, 0)
         self.assertEqual(output, b'\xa0\xa1\xa2')
 
+    def run_program_output_limit_test(self):
+        """Test _run_program keeping only the end of the output."""
+
+        retcode, output = iutil._run_program(['seq', '1', '100000'], output_limit=100)
+        self.assertEqual(retcode, 0)
+        self.assertTrue(output.endswith("99999\n100000\n"))
+        self.assertLessEqual(len(output), 100)
+
+        # nothing is kept
+        self.assertEqual(iutil._run_program(['seq', '1', '100000'], output_limit=0), (0, ""))
+
+    def program_output_log_test(self):
+        """Test logging every line of the output as it arrives."""
+        output = iutil._ProgramOutput(limit=0)
+        with patch("pyanaconda.iutil.program_log") as program_log:
+            output.feed(b"first\n")
+            program_log.info.assert_called_once_with("first")
+
+    def run_program_stdout_error_test(self):
+        """Test _run_program failing to write the output."""
+        class BrokenFile(object):
+            def write(self, data):
+                raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+
+        with self.assertRaises(OSError):
+            iutil._run_program(['seq', '1', '100000'], stdout=BrokenFile(), output_limit=0)
+
     def exec_with_redirect_test(self):
         """Test execWithRedirect."""
         # correct calling should return rc==0
@@ -820,3 +849,24 @@ class MiscTests(unittest.TestCase):
             self.assertEqual(os.stat(file_path).st_size, 0)
         finally:
             shutil.rmtree(test_dir)
+
+    def mount_table_test(self):
+        """Test reading the mount table from a mountinfo file"""
+        with tempfile.NamedTemporaryFile(mode="w+") as mountinfo:
+            mountinfo.write("17 0 8:1 / / rw,relatime - ext4 /dev/sda1 rw\n"
+                            "18 17 0:5 / /dev rw - devtmpfs devtmpfs rw\n"
+                            "19 17 8:2 / /mnt/with\\040space rw - ext4 /dev/sda2 rw\n"
+                            "20 17 0:6 / /dev rw - tmpfs tmpfs rw\n")
+            mountinfo.flush()
+
+            table = iutil.MountTable(mountinfo.name)
+            self.assertEqual(table.mountpoints, ["/", "/mnt/with space", "/dev"])
+
+            # the table is not parsed again without a change notification
+            mountinfo.write("21 17 8:3 / /home rw - ext4 /dev/sda3 rw\n")
+            mountinfo.flush()
+            self.assertEqual(table.mountpoints, ["/", "/mnt/with space", "/dev"])
+
+        free_space = iutil.mount_free_space()
+        self.assertIn("/", free_space)
+        self.assertGreaterEqual(free_space["/"], 0)
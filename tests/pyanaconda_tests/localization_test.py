@@ -125,6 +125,22 @@ class LangcodeLocaleMatchingTests(unittest.TestCase):
         self.assertFalse(localization.langcode_matches_locale("sr_RS@latin", "sr_RS@cyrilic"))
         self.assertFalse(localization.langcode_matches_locale("sr_RS@latin", "sr_ME@latin"))
 
+    def langcode_match_keys_test(self):
+        """Langcode keys matching a locale should agree with langcode_matches_locale."""
+
+        langcodes = ["sr", "sr_RS", "sr_ME", "sr.UTF-8", "sr_RS.UTF-8", "sr@latin",
+                     "sr_RS@latin", "sr_RS.UTF-8@latin", "sr_RS@cyrilic", "en", "en_US",
+                     "", None]
+        locales = ["sr", "sr_RS", "sr_RS.UTF-8", "sr_RS.UTF-8@latin", "sr_ME@latin",
+                   "en_US.UTF-8", "", None]
+
+        for locale in locales:
+            keys = localization.langcode_match_keys(locale)
+            for langcode in langcodes:
+                self.assertEqual(localization.langcode_key(langcode) in keys,
+                                 localization.langcode_matches_locale(langcode, locale),
+                                 msg="%s, %s" % (langcode, locale))
+
     def find_best_locale_match_test(self):
         """Finding best locale matches should work as expected."""
 
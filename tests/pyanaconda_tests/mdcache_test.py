@@ -0,0 +1,99 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging.mdcache import RepoMDCache, repomd_checksum, REPOMD_PATH
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+class RepoMDCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = RepoMDCache(os.path.join(self.tmpdir, "cache"), 10000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _repo(self, name, repomd, size=0):
+        """Create a repo cache directory with metadata of the given size."""
+        cachedir = os.path.join(self.tmpdir, name)
+        os.makedirs(os.path.join(cachedir, "repodata"))
+        with open(os.path.join(cachedir, REPOMD_PATH), "wb") as f:
+            f.write(repomd)
+        with open(os.path.join(cachedir, "repodata/primary.xml.gz"), "wb") as f:
+            f.write(b"\0" * size)
+        return cachedir
+
+    def _restore(self, url, repomd):
+        cachedir = os.path.join(self.tmpdir, "restored")
+        shutil.rmtree(cachedir, ignore_errors=True)
+        os.makedirs(cachedir)
+        return self.cache.restore(url, repomd_checksum(repomd), cachedir)
+
+    def restore_test(self):
+        """Test restoring stored metadata"""
+        self.cache.store("http://a/", self._repo("a", b"<repomd/>", 100))
+
+        self.assertTrue(self._restore("http://a/", b"<repomd/>"))
+        with open(os.path.join(self.tmpdir, "restored", REPOMD_PATH), "rb") as f:
+            self.assertEqual(f.read(), b"<repomd/>")
+
+    def checksum_key_test(self):
+        """Test the entries being keyed by the URL and the repomd.xml"""
+        self.cache.store("http://a/", self._repo("a", b"<repomd/>"))
+
+        # changed metadata
+        self.assertFalse(self._restore("http://a/", b"<repomd>new</repomd>"))
+        # same metadata of another repo
+        self.assertFalse(self._restore("http://b/", b"<repomd/>"))
+        self.assertTrue(self._restore("http://a/", b"<repomd/>"))
+
+    def eviction_test(self):
+        """Test evicting the least recently used entries"""
+        self.cache.store("http://a/", self._repo("a", b"a", 4000))
+        self.cache.store("http://b/", self._repo("b", b"b", 4000))
+
+        # make a the most recently used entry
+        for name in os.listdir(self.cache.path):
+            os.utime(os.path.join(self.cache.path, name), (time.time() - 100, time.time() - 100))
+        self.assertTrue(self._restore("http://a/", b"a"))
+
+        self.cache.store("http://c/", self._repo("c", b"c", 4000))
+        self.assertTrue(self._restore("http://a/", b"a"))
+        self.assertFalse(self._restore("http://b/", b"b"))
+        self.assertTrue(self._restore("http://c/", b"c"))
+
+    def corrupt_entry_test(self):
+        """Test dropping a damaged entry"""
+        self.cache.store("http://a/", self._repo("a", b"<repomd/>"))
+        entry = os.path.join(self.cache.path, os.listdir(self.cache.path)[0])
+        os.unlink(os.path.join(entry, "repomd.xml"))
+
+        self.assertFalse(self._restore("http://a/", b"<repomd/>"))
+        self.assertFalse(os.path.exists(entry))
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, "restored/repodata")))
+
+    def partial_entry_test(self):
+        """Test ignoring an entry left behind by an interrupted store"""
+        os.makedirs(os.path.join(self.cache.path, "entry.tmp-1-1"))
+        self.assertFalse(self._restore("http://a/", b"<repomd/>"))
+
+        self.cache.store("http://a/", self._repo("a", b"<repomd/>"))
+        self.assertTrue(self._restore("http://a/", b"<repomd/>"))
@@ -0,0 +1,98 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging.mirrors import MirrorRanker, parse_mirrorlist
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import requests
+import socket
+import threading
+import time
+import unittest
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/mirrorlist":
+            body = "\n".join(self.server.mirrors).encode("utf-8")
+        elif self.path.endswith("/repodata/repomd.xml") and not self.server.broken:
+            time.sleep(self.server.delay)
+            body = b"<repomd/>"
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class MirrorRankerTests(unittest.TestCase):
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def _server(self, delay=0, broken=False):
+        server = HTTPServer(("127.0.0.1", 0), MirrorHandler)
+        server.delay = delay
+        server.broken = broken
+        server.mirrors = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return server
+
+    def _url(self, server):
+        return "http://127.0.0.1:%d/fedora" % server.server_address[1]
+
+    def parse_mirrorlist_test(self):
+        """Test parsing mirrorlists"""
+        text = "# repo = fedora\nhttp://a/fedora/\n\nftp://b/fedora\nnot a url\n"
+        self.assertEqual(parse_mirrorlist(text), ["http://a/fedora/", "ftp://b/fedora"])
+
+    def rank_test(self):
+        """Test ranking mirrors by their latency"""
+        slow = self._url(self._server(delay=0.5))
+        fast = self._url(self._server())
+        broken = self._url(self._server(broken=True))
+
+        # nothing listens on a port that was just closed
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        dead = "http://127.0.0.1:%d/fedora" % sock.getsockname()[1]
+        sock.close()
+
+        ranker = MirrorRanker(requests.Session())
+        self.assertEqual(ranker.rank([slow, dead, broken, fast]), [fast, slow])
+
+    def ranked_mirrors_test(self):
+        """Test that ranked mirrorlists are remembered"""
+        mirrors = self._server()
+        mirrorlist = "http://127.0.0.1:%d/mirrorlist" % mirrors.server_address[1]
+        mirrors.mirrors = [self._url(mirrors)]
+
+        ranker = MirrorRanker(requests.Session())
+        self.assertEqual(ranker.ranked_mirrors(mirrorlist), [self._url(mirrors)])
+
+        # the mirror is not probed again
+        mirrors.broken = True
+        self.assertEqual(ranker.ranked_mirrors(mirrorlist), [self._url(mirrors)])
@@ -0,0 +1,63 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging import PackagePayload
+from mock import patch
+import unittest
+
+KERNELS = ["4.8.1-300.fc25.x86_64", "4.8.0-300.fc25.x86_64"]
+
+class Payload(PackagePayload):
+    @property
+    def kernelVersionList(self):
+        return KERNELS
+
+class RecreateInitrdsTests(unittest.TestCase):
+    def _recreate(self, failing=None):
+        """Recreate the initrds, dracut fails for the failing kernel."""
+        calls = []
+        def _exec(command, argv):
+            calls.append([command] + argv)
+            if command == "dracut" and failing in argv:
+                return 1
+            return 0
+
+        with patch("pyanaconda.packaging.iutil.execInSysroot", side_effect=_exec), \
+             patch("pyanaconda.packaging.os.path.exists", side_effect=lambda path: "System.map" not in path), \
+             patch("pyanaconda.packaging.flags.imageInstall", False), \
+             patch("pyanaconda.packaging.flags.initrdjobs", 1):
+            Payload(None).recreateInitrds()
+        return calls
+
+    def recreate_test(self):
+        """Test recreating the initrds of all the kernels"""
+        calls = self._recreate()
+
+        for kernel in KERNELS:
+            self.assertIn(["depmod", "-a", kernel], calls)
+            self.assertIn(["dracut", "-f", "/boot/initramfs-%s.img" % kernel, kernel], calls)
+        # the boot entries are updated one after the other, after dracut
+        self.assertEqual(calls[-2:], [["new-kernel-pkg", "--dracut", "--update", kernel]
+                                      for kernel in KERNELS])
+
+    def failure_test(self):
+        """Test not updating the boot entry of a kernel without an initrd"""
+        calls = self._recreate(failing=KERNELS[0])
+
+        self.assertNotIn(["new-kernel-pkg", "--dracut", "--update", KERNELS[0]], calls)
+        self.assertEqual(calls[-1], ["new-kernel-pkg", "--dracut", "--update", KERNELS[1]])
@@ -0,0 +1,93 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging import PackagePayload, PAYLOAD_REQUIRES_STORAGE, PAYLOAD_REQUIRES_NETWORK
+import unittest
+
+class Method(object):
+    def __init__(self, method, url=None, mirrorlist=None):
+        self.method = method
+        self.url = url
+        self.mirrorlist = mirrorlist
+
+class Repo(object):
+    def __init__(self, name, baseurl=None, mirrorlist=None):
+        self.name = name
+        self.baseurl = baseurl
+        self.mirrorlist = mirrorlist
+
+class RepoList(object):
+    def __init__(self, repos):
+        self.repos = repos
+
+    def dataList(self):
+        return self.repos
+
+class KSData(object):
+    def __init__(self, method, repos=None):
+        self.method = method
+        self.repo = RepoList(repos or [])
+
+class Payload(PackagePayload):
+    pass
+
+def _requirements(method, repos=None):
+    return Payload(KSData(method, repos)).startupRequirements
+
+class StartupRequirementsTests(unittest.TestCase):
+    def url_test(self):
+        """Test the requirements of url sources"""
+        self.assertEqual(_requirements(Method("url", url="file:///run/install/repo")), set())
+        self.assertEqual(_requirements(Method("url", url="http://example.com/os")),
+                         {PAYLOAD_REQUIRES_NETWORK})
+        self.assertEqual(_requirements(Method("url", mirrorlist="https://example.com/mirrors")),
+                         {PAYLOAD_REQUIRES_NETWORK})
+
+    def nfs_test(self):
+        """Test the requirements of nfs sources"""
+        self.assertEqual(_requirements(Method("nfs")), {PAYLOAD_REQUIRES_NETWORK})
+
+    def local_test(self):
+        """Test the requirements of sources on local devices"""
+        self.assertEqual(_requirements(Method("cdrom")), {PAYLOAD_REQUIRES_STORAGE})
+        self.assertEqual(_requirements(Method("harddrive")), {PAYLOAD_REQUIRES_STORAGE})
+
+    def no_method_test(self):
+        """Test the requirements without a source"""
+        self.assertEqual(_requirements(Method(None)),
+                         {PAYLOAD_REQUIRES_STORAGE, PAYLOAD_REQUIRES_NETWORK})
+
+    def network_repo_test(self):
+        """Test the requirements of local sources with a network repo"""
+        repos = [Repo("updates", baseurl="http://example.com/updates")]
+        self.assertEqual(_requirements(Method("cdrom"), repos),
+                         {PAYLOAD_REQUIRES_STORAGE, PAYLOAD_REQUIRES_NETWORK})
+        self.assertEqual(_requirements(Method("url", url="file:///run/install/repo"), repos),
+                         {PAYLOAD_REQUIRES_NETWORK})
+
+    def local_repo_test(self):
+        """Test the requirements of local sources with a local repo"""
+        repos = [Repo("extras", baseurl="file:///run/install/extras")]
+        self.assertEqual(_requirements(Method("cdrom"), repos), {PAYLOAD_REQUIRES_STORAGE})
+
+    def mirrorlist_repo_test(self):
+        """Test the requirements of local sources with a mirrorlist-only repo"""
+        repos = [Repo("updates", mirrorlist="https://example.com/mirrors")]
+        self.assertEqual(_requirements(Method("cdrom"), repos),
+                         {PAYLOAD_REQUIRES_STORAGE, PAYLOAD_REQUIRES_NETWORK})
+        self.assertTrue(Payload(KSData(Method("cdrom"), repos)).needsNetwork)
@@ -0,0 +1,67 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging.pkgcache import PackageCache
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+class PackageCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = PackageCache(os.path.join(self.tmpdir, "cache"))
+
+        self.pkg = os.path.join(self.tmpdir, "foo-1.0-1.noarch.rpm")
+        with open(self.pkg, "wb") as f:
+            f.write(b"not really an rpm")
+        self.checksum = ("sha256", hashlib.sha256(b"not really an rpm").hexdigest())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def store_fetch_test(self):
+        """Test storing and fetching a package"""
+        dest = os.path.join(self.tmpdir, "fetched.rpm")
+        self.assertFalse(self.cache.fetch(self.checksum, dest))
+        self.assertFalse(os.path.exists(dest))
+
+        self.cache.store(self.checksum, self.pkg)
+        self.assertTrue(self.cache.fetch(self.checksum, dest))
+        with open(dest, "rb") as f:
+            self.assertEqual(f.read(), b"not really an rpm")
+
+        self.assertEqual((self.cache.hits, self.cache.misses, self.cache.stored), (1, 1, 1))
+
+    def checksum_mismatch_test(self):
+        """Test that packages not matching their checksum are not used"""
+        bad_checksum = ("sha256", "0" * 64)
+        self.cache.store(bad_checksum, self.pkg)
+        self.assertEqual(self.cache.stored, 0)
+
+        # corrupt a cached package
+        self.cache.store(self.checksum, self.pkg)
+        entry = self.cache._entry_path(self.checksum)
+        with open(entry, "wb") as f:
+            f.write(b"corrupted")
+
+        dest = os.path.join(self.tmpdir, "fetched.rpm")
+        self.assertFalse(self.cache.fetch(self.checksum, dest))
+        self.assertFalse(os.path.exists(dest))
+        self.assertFalse(os.path.exists(entry))
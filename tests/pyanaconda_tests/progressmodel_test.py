@@ -0,0 +1,119 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.progressmodel import ProgressModel, load_calibration, record_calibration
+from pyanaconda.progressmodel import UNIT_STEPS, UNIT_PACKAGES, UNIT_KERNELS, DEFAULT_HARDWARE_ID
+import json
+import os
+import tempfile
+import unittest
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class ProgressModelTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+
+    def _model(self, factors=None):
+        model = ProgressModel(factors, clock=self.clock)
+        # 2 s, 100 s and 20 s with the default rates
+        model.add_phase("setup", **{UNIT_STEPS: 1})
+        model.add_phase("payload", **{UNIT_PACKAGES: 1000})
+        model.add_phase("initramfs", **{UNIT_KERNELS: 1})
+        return model
+
+    def fraction_test(self):
+        """Test the weighted fraction of the progress."""
+        model = self._model()
+        self.assertEqual(model.fraction, 0.0)
+
+        model.start("setup")
+        model.finish("setup")
+        self.assertAlmostEqual(model.fraction, 2 / 122)
+
+        model.start("payload")
+        model.advance("payload", **{UNIT_PACKAGES: 500})
+        self.assertAlmostEqual(model.fraction, 52 / 122)
+        # more than planned doesn't move the bar past the phase
+        model.advance("payload", **{UNIT_PACKAGES: 5000})
+        self.assertAlmostEqual(model.fraction, 102 / 122)
+
+        # more work than planned holds the bar until the work catches up
+        model.set_units("payload", **{UNIT_PACKAGES: 10000})
+        self.assertAlmostEqual(model.fraction, 102 / 122)
+        model.advance("payload", **{UNIT_PACKAGES: 9000})
+        self.assertAlmostEqual(model.fraction, 902 / 1022)
+
+    def set_units_test(self):
+        """Test replacing the amounts of work of a phase."""
+        model = self._model()
+        model.add_phase("image", **{UNIT_STEPS: 10})
+        model.set_units("image", **{UNIT_PACKAGES: 100})
+        # the placeholder nothing advanced in is gone
+        self.assertEqual(model.weight("image"), 10.0)
+
+        model.advance("image", **{UNIT_PACKAGES: 100})
+        model.set_units("image", **{UNIT_STEPS: 5})
+        self.assertEqual(model.weight("image"), 20.0)
+
+    def eta_test(self):
+        """Test the ETA corrected by the measured pace."""
+        model = self._model()
+        self.assertAlmostEqual(model.eta, 122)
+
+        model.start("setup")
+        self.clock.now = 4.0
+        model.finish("setup")
+        # too early to trust the pace
+        self.assertAlmostEqual(model.eta, 120)
+
+        model.start("payload")
+        model.advance("payload", **{UNIT_PACKAGES: 100})
+        self.clock.now = 28.0
+        # 12 s of work took 28 s
+        self.assertAlmostEqual(model.eta, 110 * 28 / 12)
+
+    def calibration_test(self):
+        """Test measuring, recording and loading calibration factors."""
+        model = self._model()
+        for (name, seconds) in (("setup", 1.0), ("payload", 300.0)):
+            model.start(name)
+            self.clock.now += seconds
+            model.finish(name)
+        factors = model.measured_factors()
+        self.assertEqual(factors, {"setup": 0.5, "payload": 3.0})
+
+        calibrated = self._model(factors)
+        self.assertAlmostEqual(calibrated.eta, 1 + 300 + 20)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "calibration.json")
+            record_calibration("hw", factors, path)
+            record_calibration("hw", {"payload": 1.0}, path)
+            self.assertEqual(load_calibration("hw", [path]), {"setup": 0.5, "payload": 2.0})
+
+            self.assertEqual(load_calibration("other", [path]), {})
+            with open(path, "w") as f:
+                json.dump({DEFAULT_HARDWARE_ID: {"payload": 1.5}}, f)
+            self.assertEqual(load_calibration("other", [os.path.join(tmpdir, "missing"), path]),
+                             {"payload": 1.5})
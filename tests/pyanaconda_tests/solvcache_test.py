@@ -0,0 +1,72 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging.solvcache import install_solv_cache, remove_solv_cache
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+class SolvCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.repo = os.path.join(self.tmpdir, "repo")
+        self.cache = os.path.join(self.tmpdir, "cache")
+        os.makedirs(os.path.join(self.repo, "repodata"))
+        os.makedirs(os.path.join(self.repo, "solv"))
+
+        self.repomd = os.path.join(self.repo, "repodata/repomd.xml")
+        with open(self.repomd, "w") as f:
+            f.write("<repomd/>")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write_solv(self, name, repomd_data, version=8):
+        with open(os.path.join(self.repo, "solv", name), "wb") as f:
+            f.write(b"SOLV" + struct.pack(">I", version) + b"\0" * 100 +
+                    hashlib.sha256(repomd_data).digest())
+
+    def install_test(self):
+        """Test installing matching prebuilt solv files"""
+        self._write_solv("repo.solv", b"<repomd/>")
+        self._write_solv("repo-filenames.solvx", b"<repomd/>")
+
+        self.assertTrue(install_solv_cache(self.repo, self.repomd, "anaconda", self.cache))
+        self.assertEqual(sorted(os.listdir(self.cache)),
+                         ["anaconda-filenames.solvx", "anaconda.solv"])
+
+        remove_solv_cache("anaconda", self.cache)
+        self.assertEqual(os.listdir(self.cache), [])
+
+    def mismatch_test(self):
+        """Test ignoring prebuilt solv files of other metadata"""
+        self._write_solv("repo.solv", b"<repomd>old</repomd>")
+        self._write_solv("repo-filenames.solvx", b"<repomd/>")
+
+        self.assertFalse(install_solv_cache(self.repo, self.repomd, "anaconda", self.cache))
+        self.assertFalse(os.path.exists(self.cache))
+
+    def version_test(self):
+        """Test ignoring prebuilt solv files of another libsolv version"""
+        self._write_solv("repo.solv", b"<repomd/>", version=9)
+
+        self.assertFalse(install_solv_cache(self.repo, self.repomd, "anaconda", self.cache))
+        self.assertFalse(os.path.exists(self.cache))
@@ -0,0 +1,97 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging.tarextract import TarExtractor, TarExtractError, decompressor_command
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+class TarExtractorTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dest = os.path.join(self.tmpdir, "dest")
+        os.mkdir(self.dest)
+
+        src = os.path.join(self.tmpdir, "src")
+        os.makedirs(os.path.join(src, "boot"))
+        os.makedirs(os.path.join(src, "dev"))
+        with open(os.path.join(src, "boot/vmlinuz-4.8.0"), "w") as f:
+            f.write("kernel")
+        with open(os.path.join(src, "dev/null"), "w") as f:
+            f.write("not a device")
+
+        self.archive = os.path.join(self.tmpdir, "image.tar.gz")
+        with tarfile.open(self.archive, "w:gz") as archive:
+            archive.add(src, arcname=".")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def extract_test(self):
+        """Test extracting a compressed archive"""
+        self.assertIn(decompressor_command(self.archive)[0], ("pigz", "gzip"))
+
+        progress = []
+        extractor = TarExtractor(self.archive, callback=progress.append)
+        extractor.extract(self.dest, excludes=["./dev/*"])
+
+        with open(os.path.join(self.dest, "boot/vmlinuz-4.8.0")) as f:
+            self.assertEqual(f.read(), "kernel")
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "dev/null")))
+        self.assertEqual(progress[-1], os.path.getsize(self.archive))
+
+        self.assertIn("./boot/vmlinuz-4.8.0", extractor.names())
+
+    def corrupt_test(self):
+        """Test extracting a corrupted archive"""
+        with open(self.archive, "r+b") as f:
+            f.seek(20)
+            f.write(b"garbage" * 10)
+
+        with self.assertRaises(TarExtractError):
+            TarExtractor(self.archive).extract(self.dest)
+
+    def tar_failure_test(self):
+        """Test reporting the error of tar rather than of the decompressor"""
+        with open(os.path.join(self.tmpdir, "zeros"), "wb") as f:
+            f.write(bytes(16 * 1024 * 1024))
+        with tarfile.open(self.archive, "w:gz") as archive:
+            archive.add(os.path.join(self.tmpdir, "zeros"), arcname="./zeros")
+
+        # tar can't change to the destination and exits right away
+        with self.assertRaisesRegex(TarExtractError, "^tar exited with code 2"):
+            TarExtractor(self.archive).extract(os.path.join(self.tmpdir, "missing"))
+
+    def file_failure_test(self):
+        """Test extracting an archive with a file tar can't create"""
+        with tarfile.open(self.archive, "w:gz") as archive:
+            link = tarfile.TarInfo("./link")
+            link.type = tarfile.LNKTYPE
+            link.linkname = "./missing"
+            archive.addfile(link)
+            kernel = tarfile.TarInfo("./vmlinuz-4.8.0")
+            kernel.size = 6
+            archive.addfile(kernel, io.BytesIO(b"kernel"))
+
+        # tar exits with 2, but the rest of the archive is extracted
+        TarExtractor(self.archive).extract(self.dest)
+        with open(os.path.join(self.dest, "vmlinuz-4.8.0")) as f:
+            self.assertEqual(f.read(), "kernel")
@@ -0,0 +1,68 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.taskgraph import Step, run_steps
+import threading
+import unittest
+
+class TaskGraphTests(unittest.TestCase):
+    def conflicts_test(self):
+        """Test which steps conflict."""
+        selinux = Step("selinux", None, writes=["/etc/selinux/config"])
+        services = Step("services", None, reads=["/lib/systemd/system"], writes=["/etc/systemd"])
+        xconfig = Step("xconfig", None, writes=["/etc/systemd/system/default.target"])
+        reader = Step("reader", None, reads=["/etc/selinux"])
+
+        self.assertFalse(selinux.conflicts(services))
+        self.assertTrue(services.conflicts(xconfig))
+        self.assertTrue(xconfig.conflicts(services))
+        self.assertTrue(reader.conflicts(selinux))
+        self.assertFalse(reader.conflicts(Step("other reader", None, reads=["/etc"])))
+
+    def order_test(self):
+        """Test that conflicting steps run in the order of the list."""
+        order = []
+        steps = [Step(str(i), lambda i=i: order.append(i), writes=["/etc/systemd"])
+                 for i in range(6)]
+        run_steps(steps)
+        self.assertEqual(order, list(range(6)))
+
+    def concurrent_test(self):
+        """Test that independent steps run at the same time."""
+        barrier = threading.Barrier(2, timeout=10)
+        steps = [Step("lang", barrier.wait, writes=["/etc/locale.conf"]),
+                 Step("timezone", barrier.wait, writes=["/etc/localtime"])]
+        run_steps(steps, max_workers=2)
+
+    def error_test(self):
+        """Test that the first failure is raised and dependent steps don't run."""
+        ran = []
+        def fail(msg):
+            ran.append(msg)
+            raise RuntimeError(msg)
+
+        steps = [Step("first", lambda: fail("first"), writes=["/etc/systemd"]),
+                 Step("second", lambda: fail("second"), writes=["/etc/locale.conf"]),
+                 Step("third", lambda: ran.append("third"), writes=["/etc/systemd"])]
+        with self.assertRaisesRegex(RuntimeError, "first"):
+            run_steps(steps, max_workers=1)
+        self.assertEqual(ran, ["first"])
+
+        with self.assertRaisesRegex(RuntimeError, "first"):
+            run_steps(steps, max_workers=2)
+        self.assertNotIn("third", ran)
@@ -0,0 +1,98 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging.telemetry import DownloadTelemetry
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class DownloadTelemetryTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.telemetry = DownloadTelemetry(clock=self.clock)
+        self.telemetry.start(2, 3000)
+
+    def throughput_test(self):
+        """Test the throughput and ETA of downloads"""
+        telemetry = self.telemetry
+        self.assertIsNone(telemetry.eta)
+
+        self.clock.now += 1
+        telemetry.progress("a", 500)
+        self.assertEqual(telemetry.throughput, 500)
+        self.assertEqual(telemetry.percent, 16)
+        self.assertEqual(telemetry.eta, 5)
+
+        # samples shorter than a second are not used
+        self.clock.now += 0.5
+        telemetry.progress("a", 1000)
+        self.assertEqual(telemetry.throughput, 500)
+
+        # the throughput is a moving average
+        self.clock.now += 0.5
+        telemetry.progress("a", 1500)
+        self.assertAlmostEqual(telemetry.throughput, 0.3 * 1000 + 0.7 * 500)
+        self.assertAlmostEqual(telemetry.eta, 1500 / 650)
+
+    def failure_test(self):
+        """Test a failed download going back in the totals"""
+        telemetry = self.telemetry
+        self.clock.now += 1
+        telemetry.progress("a", 400)
+        telemetry.end("a", 1000, "fedora", "mirror-a", False)
+
+        self.assertEqual(telemetry.downloaded, 0)
+        self.assertEqual(telemetry.failed_files, 1)
+        self.assertEqual(telemetry.mirrors["mirror-a"].failures, 1)
+        self.assertEqual(telemetry.mirrors["mirror-a"].bytes, 400)
+
+    def summary_test(self):
+        """Test the JSON summary of the downloads"""
+        telemetry = self.telemetry
+        telemetry.progress("a", 1000)
+        self.clock.now += 2
+        telemetry.end("a", 1000, "fedora", "mirror-a", True)
+        telemetry.progress("b", 500)
+        self.clock.now += 2
+        telemetry.end("b", 2000, "updates", "mirror-b", True)
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "stats.json")
+            telemetry.write_summary(path)
+            with open(path) as f:
+                summary = json.load(f)
+        finally:
+            shutil.rmtree(tmpdir)
+
+        self.assertEqual(summary["downloaded_bytes"], 3000)
+        self.assertEqual(summary["finished_files"], 2)
+        self.assertEqual(summary["seconds"], 4)
+        self.assertEqual(summary["repos"]["fedora"],
+                         {"bytes": 1000, "files": 1, "failures": 0, "seconds": 2,
+                          "bytes_per_second": 500})
+        self.assertEqual(summary["mirrors"]["mirror-b"]["bytes_per_second"], 1000)
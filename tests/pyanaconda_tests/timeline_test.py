@@ -0,0 +1,67 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.timeline import Timeline, SPAN_PAYLOAD, SPAN_PROGRESS
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+class TimelineTests(unittest.TestCase):
+    def spans_test(self):
+        """Test recording spans."""
+        timeline = Timeline()
+        with timeline.span("install", SPAN_PAYLOAD, packages=10):
+            span = timeline.start("Installing", SPAN_PROGRESS)
+            span.finish(done=True)
+            span.finish()
+
+        thread = threading.Thread(name="AnaWorkerThread1",
+                                  target=lambda: timeline.start("worker", SPAN_PROGRESS).finish())
+        thread.start()
+        thread.join()
+
+        with self.assertRaises(ValueError):
+            with timeline.span("failing", SPAN_PAYLOAD):
+                raise ValueError("broken")
+
+        trace = timeline.trace()
+        events = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual([e["name"] for e in events], ["install", "Installing", "worker", "failing"])
+        self.assertEqual(events[0]["args"]["packages"], 10)
+        self.assertIn("cpu_ms", events[0]["args"])
+        self.assertTrue(events[1]["args"]["done"])
+        self.assertEqual(events[3]["args"]["error"], "ValueError")
+        self.assertGreaterEqual(events[0]["dur"], events[1]["dur"])
+
+        names = {e["args"]["name"] for e in trace["traceEvents"] if e["name"] == "thread_name"}
+        self.assertIn("AnaWorkerThread1", names)
+
+    def write_test(self):
+        """Test writing the timeline."""
+        timeline = Timeline()
+        timeline.start("install", SPAN_PAYLOAD).finish()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "timeline.json")
+            timeline.write(path)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+            with open(path) as f:
+                trace = json.load(f)
+        self.assertEqual(trace["displayTimeUnit"], "ms")
+        self.assertEqual(trace["traceEvents"][-1]["name"], "install")
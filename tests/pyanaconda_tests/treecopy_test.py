@@ -0,0 +1,140 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging.treecopy import TreeCopy, TreeCopyError
+import errno
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+import mock
+
+class TreeCopyTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, "src")
+        self.dst = os.path.join(self.tmpdir, "dst")
+
+        os.makedirs(os.path.join(self.src, "usr/bin"))
+        os.makedirs(os.path.join(self.src, "proc/1"))
+        os.makedirs(os.path.join(self.src, "boot/loader"))
+        with open(os.path.join(self.src, "usr/bin/foo"), "w") as f:
+            f.write("foo" * 1000)
+        os.chmod(os.path.join(self.src, "usr/bin/foo"), 0o4711)
+        os.link(os.path.join(self.src, "usr/bin/foo"), os.path.join(self.src, "usr/bin/bar"))
+        os.symlink("foo", os.path.join(self.src, "usr/bin/baz"))
+        os.mkfifo(os.path.join(self.src, "usr/fifo"))
+        for name in ("vmlinuz-1", "vmlinuz-0-rescue-1"):
+            open(os.path.join(self.src, "boot", name), "w").close()
+        open(os.path.join(self.src, "boot/loader/rescue.conf"), "w").close()
+        os.utime(os.path.join(self.src, "usr/bin"), (0, 1000000))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def copy_test(self):
+        """Test copying a tree"""
+        copy = TreeCopy(self.src, self.dst, ["/proc/", "/boot/*rescue*"])
+        copy.run()
+
+        self.assertEqual(copy.errors, [])
+        self.assertEqual(copy.bytes_copied, 3000)
+
+        foo = os.path.join(self.dst, "usr/bin/foo")
+        with open(foo) as f:
+            self.assertEqual(f.read(), "foo" * 1000)
+        self.assertEqual(stat.S_IMODE(os.stat(foo).st_mode), 0o4711)
+        self.assertTrue(os.path.samefile(foo, os.path.join(self.dst, "usr/bin/bar")))
+        self.assertEqual(os.readlink(os.path.join(self.dst, "usr/bin/baz")), "foo")
+        self.assertTrue(stat.S_ISFIFO(os.lstat(os.path.join(self.dst, "usr/fifo")).st_mode))
+        self.assertEqual(os.stat(os.path.join(self.dst, "usr/bin")).st_mtime, 1000000)
+
+        self.assertFalse(os.path.exists(os.path.join(self.dst, "proc")))
+        self.assertEqual(sorted(os.listdir(os.path.join(self.dst, "boot"))), ["loader", "vmlinuz-1"])
+        # * doesn't match /
+        self.assertTrue(os.path.exists(os.path.join(self.dst, "boot/loader/rescue.conf")))
+
+class SlowTreeCopy(TreeCopy):
+    """A copy keeping track of the files queued for the workers."""
+    def __init__(self, *args, **kwargs):
+        super(SlowTreeCopy, self).__init__(*args, **kwargs)
+        self.queued = 0
+        self.max_queued = 0
+
+    def _copy_file(self, src, dst, st):
+        time.sleep(0.001)
+        with self._lock:
+            self.queued -= 1
+        super(SlowTreeCopy, self)._copy_file(src, dst, st)
+
+    def _excluded(self, relpath, is_dir):
+        if not is_dir:
+            with self._lock:
+                self.queued += 1
+                self.max_queued = max(self.max_queued, self.queued)
+        return False
+
+class FailingTreeCopy(TreeCopy):
+    """A copy running out of space with the first file."""
+    def __init__(self, *args, **kwargs):
+        super(FailingTreeCopy, self).__init__(*args, **kwargs)
+        self.walked = []
+
+    def _copy_file(self, src, dst, st):
+        if self._failed.is_set():
+            return
+        self._error(src, OSError(errno.ENOSPC, os.strerror(errno.ENOSPC)))
+
+    def _excluded(self, relpath, is_dir):
+        # let the first file fail before walking on
+        if self.walked:
+            self._failed.wait(5)
+        self.walked.append(relpath)
+        return False
+
+class TreeCopyFailureTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, "src")
+        os.makedirs(self.src)
+        for i in range(20):
+            open(os.path.join(self.src, "file%d" % i), "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def fatal_error_test(self):
+        """Test stopping the walk after a fatal error"""
+        copy = FailingTreeCopy(self.src, os.path.join(self.tmpdir, "dst"), workers=1)
+        with self.assertRaises(TreeCopyError):
+            copy.run()
+
+        self.assertLessEqual(len(copy.walked), 2)
+        self.assertEqual(len(copy.errors), 1)
+
+    def queue_bound_test(self):
+        """Test bounding the number of files queued for the workers"""
+        with mock.patch("pyanaconda.packaging.treecopy.QUEUED_PER_WORKER", 2):
+            copy = SlowTreeCopy(self.src, os.path.join(self.tmpdir, "dst"), workers=1)
+        copy.run()
+
+        self.assertEqual(copy.files_copied, 20)
+        # the queued files and the one being looked at by the walk
+        self.assertLessEqual(copy.max_queued, 3)
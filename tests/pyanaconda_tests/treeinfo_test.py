@@ -0,0 +1,96 @@
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from pyanaconda.packaging import treeinfo
+from pyanaconda.packaging.treeinfo import TreeInfoCache
+import requests
+import time
+import unittest
+
+TREEINFO = """[general]
+family = Fedora
+version = 25
+arch = x86_64
+
+[variant-Server]
+id = Server
+"""
+
+class Response(object):
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError("%d error" % self.status_code)
+
+class Session(object):
+    """A session serving files of a dict."""
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+
+    def get(self, url, headers=None, proxies=None, verify=True):
+        self.requests.append((url, headers))
+        if url not in self.files:
+            return Response(404)
+        (text, etag) = self.files[url]
+        if headers.get("If-None-Match") == etag:
+            return Response(304)
+        return Response(200, text, {"ETag": etag})
+
+class TreeInfoCacheTests(unittest.TestCase):
+    def parse_test(self):
+        """Test downloading and parsing a treeinfo"""
+        session = Session({"http://tree/treeinfo": (TREEINFO, "1")})
+        entry = TreeInfoCache(session).get("http://tree")
+
+        # .treeinfo is tried first
+        self.assertEqual([url for (url, _headers) in session.requests],
+                         ["http://tree/.treeinfo", "http://tree/treeinfo"])
+        self.assertEqual(entry.url, "http://tree/treeinfo")
+        self.assertEqual(entry.config.get("general", "version"), "25")
+        self.assertEqual(entry.config.get("variant-Server", "id"), "Server")
+
+    def cache_test(self):
+        """Test reusing and revalidating a downloaded treeinfo"""
+        session = Session({"http://tree/.treeinfo": (TREEINFO, "1")})
+        cache = TreeInfoCache(session)
+        entry = cache.get("http://tree")
+
+        # a fresh treeinfo is not downloaded again
+        self.assertIs(cache.get("http://tree"), entry)
+        self.assertEqual(len(session.requests), 1)
+
+        # an old one is revalidated
+        entry.fetched = time.monotonic() - treeinfo.TREEINFO_MAX_AGE - 1
+        self.assertIs(cache.get("http://tree"), entry)
+        self.assertEqual(session.requests[-1], ("http://tree/.treeinfo", {"If-None-Match": "1"}))
+
+        # and downloaded again when changed
+        session.files["http://tree/.treeinfo"] = (TREEINFO.replace("25", "26"), "2")
+        entry.fetched = time.monotonic() - treeinfo.TREEINFO_MAX_AGE - 1
+        self.assertEqual(cache.get("http://tree").config.get("general", "version"), "26")
+
+    def missing_test(self):
+        """Test a tree without a treeinfo"""
+        cache = TreeInfoCache(Session({}))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            cache.get("http://tree")